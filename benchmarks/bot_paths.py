@@ -0,0 +1,224 @@
+"""
+Benchmark of the bot hot paths with a fake Telegram client, database and
+network, results are printed as JSON
+
+Usage: python -m benchmarks.bot_paths [--count N] [--seed N] [--output FILE]
+"""
+
+import argparse
+import asyncio
+import copy
+import json
+import platform
+import random
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from caligo import job, util
+from caligo.core import Bot
+from caligo.modules.core import CoreModule
+from caligo.modules.debug import DebugModule
+from caligo.modules.reddit import Reddit
+from caligo.modules.stats import StatsModule
+from caligo.modules.stylish import Stylish
+from caligo.modules.youtubedl import YouTube
+from caligo.util import text
+
+from .fakes import (
+    FakeClient,
+    FakeHTTP,
+    drain,
+    make_bot,
+    make_inline_query,
+    make_message,
+)
+from .text_transforms import make_input
+
+YT_ID = "dQw4w9WgXcQ"
+
+
+def reddit_payload(count: int) -> Dict[str, Any]:
+    return {
+        "memes": [{
+            "title": f"Post {num}",
+            "author": "someone",
+            "ups": num,
+            "spoiler": False,
+            "nsfw": False,
+            "postLink": f"https://redd.it/{num}",
+            "subreddit": "memes",
+            "url": f"https://i.redd.it/{num}.jpg",
+            "preview": [f"https://preview.redd.it/{num}.jpg?width=216"],
+        } for num in range(count)]
+    }
+
+
+def youtube_info() -> Dict[str, Any]:
+    formats = [{
+        "format_id": str(100 + num),
+        "format_note": note,
+        "ext": "mp4",
+        "filesize": 1024 * 1024 * (num + 1),
+        "acodec": "none",
+    } for num, note in enumerate(("144p", "360p", "720p", "1080p"))]
+    formats += [{
+        "format_id": str(200 + abr),
+        "ext": "m4a",
+        "filesize": 1024 * abr,
+        "acodec": "mp4a",
+        "abr": abr,
+    } for abr in (64, 128, 160)]
+
+    return {
+        "title": "Video",
+        "webpage_url": f"https://www.youtube.com/watch?v={YT_ID}",
+        "duration": 212,
+        "uploader": "Uploader",
+        "formats": formats,
+    }
+
+
+def sync(func: Callable[[], Any]) -> Callable[[int], Awaitable[None]]:
+
+    async def wrapper(_: int) -> None:
+        func()
+
+    return wrapper
+
+
+async def measure(name: str, count: int,
+                  func: Callable[[int], Awaitable[Any]]) -> Dict[str, Any]:
+    start = time.perf_counter()
+    for num in range(count):
+        await func(num)
+    await drain()
+    elapsed = time.perf_counter() - start
+
+    return {
+        "name": name,
+        "count": count,
+        "seconds": round(elapsed, 6),
+        "per_second": round(count / elapsed, 1) if elapsed else None,
+    }
+
+
+async def setup_bot() -> Tuple[Bot, FakeClient]:
+    """Bot with the benchmarked modules and their network answered."""
+
+    http = FakeHTTP({"https://meme-api": reddit_payload(50)})
+    bot, client = await make_bot(CoreModule,
+                                 DebugModule,
+                                 StatsModule,
+                                 Stylish,
+                                 Reddit,
+                                 YouTube,
+                                 http=http)
+
+    async def extract_info(_: str) -> Dict[str, Any]:
+        return youtube_info()
+
+    bot.modules["YouTube"].extract_info = extract_info
+    return bot, client
+
+
+def teardown_bot(bot: Bot) -> None:
+    for pool in bot.modules["Reddit"].pools.values():
+        if pool.task is not None:
+            pool.task.cancel()
+
+
+async def run(count: int) -> List[Dict[str, Any]]:
+    bot, client = await setup_bot()
+    youtube = bot.modules["YouTube"]
+    predicate = bot.command_predicate()
+
+    def command_message(cmd: str) -> Callable[[int], Awaitable[None]]:
+        template = make_message(client, cmd)
+
+        async def func(_: int) -> None:
+            msg = copy.copy(template)
+            if await predicate(client, msg):
+                await bot.on_command(client, msg)
+
+        return func
+
+    async def listener(_: int) -> None:
+        await bot.dispatch_event("message", make_message(client, "hello"))
+
+    def inline(query: str,
+               setup: Callable[[], None] = None
+              ) -> Callable[[int], Awaitable[None]]:
+
+        async def func(_: int) -> None:
+            if setup is not None:
+                setup()
+            await bot.dispatch_event("inline_query",
+                                     make_inline_query(client, query))
+
+        return func
+
+    progress_job = bot.job("upload", make_message(client, "Uploading"))
+
+    async def progress(num: int) -> None:
+        await util.progress(num % 100 + 1, 100, progress_job, "Uploading",
+                            "file.bin")
+
+    async def progress_render(num: int) -> None:
+        # Pretend the last edit is old enough so every call renders
+        progress_job.progress_start = progress_job.progress_update = 0
+        await progress(num)
+
+    long_text = make_input(4096)
+    results = [
+        await measure("command: echo", count, command_message(".echo hi")),
+        await measure("command: help", count, command_message(".help")),
+        await measure("command: unknown", count, command_message(".nope")),
+        await measure("listener: message + stats", count, listener),
+        await measure("inline: core help", count, inline("help")),
+        await measure("inline: stylish", count,
+                      inline("stylish The quick brown fox")),
+        await measure("inline: reddit", count, inline("reddit")),
+        await measure("inline: youtube (cached)", count,
+                      inline(f"ytdl https://youtu.be/{YT_ID}")),
+        await measure("inline: youtube (cold)", count,
+                      inline(f"ytdl https://youtu.be/{YT_ID}",
+                             youtube.info_cache.clear)),
+        await measure("text: mock 4096", count,
+                      sync(lambda: text.mock(long_text))),
+        await measure("text: clap 4096", count,
+                      sync(lambda: text.clap(long_text))),
+        await measure("progress: throttled", count, progress),
+        await measure("progress: render", count, progress_render),
+    ]
+
+    bot.finish_job(progress_job, job.DONE)
+    teardown_bot(bot)
+    return results
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="write the JSON here too")
+    args = parser.parse_args()
+
+    random.seed(args.seed)
+    results = asyncio.get_event_loop().run_until_complete(run(args.count))
+    report = {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "time": int(time.time()),
+        "count": args.count,
+        "results": results,
+    }
+
+    data = json.dumps(report, indent=2)
+    print(data)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(data + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Offline stand-ins for the Telegram client, MongoDB and aiohttp used by the
+benchmarks
+"""
+
+import asyncio
+import copy
+from typing import Any, Dict, Iterator, List, Mapping, Optional, Tuple
+
+from pyrogram.types import Chat, InlineQuery, Message, User
+
+from caligo.core import Bot
+
+USER_ID = 1000
+BOT_ID = 1001
+CHAT_ID = 2000
+
+
+def _matches(doc: Mapping[str, Any], filt: Mapping[str, Any]) -> bool:
+    return all(doc.get(key) == value for key, value in filt.items())
+
+
+class FakeCursor:
+
+    def __init__(self, docs: List[Dict[str, Any]]) -> None:
+        self._docs = docs
+
+    def __aiter__(self) -> "FakeCursor":
+        self._iter = iter(self._docs)
+        return self
+
+    async def __anext__(self) -> Dict[str, Any]:
+        try:
+            return next(self._iter)
+        except StopIteration:
+            raise StopAsyncIteration from None
+
+    async def to_list(self, length: Optional[int] = None) -> List[Dict]:
+        return self._docs[:length]
+
+
+class FakeCollection:
+    """In-memory collection with the subset of Motor the modules use."""
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self.docs: Dict[Any, Dict[str, Any]] = {}
+        self.calls = 0
+
+    def _find(self, filt: Mapping[str, Any]) -> Iterator[Dict[str, Any]]:
+        if "_id" in filt and not isinstance(filt["_id"], dict):
+            doc = self.docs.get(filt["_id"])
+            if doc is not None and _matches(doc, filt):
+                yield doc
+            return
+
+        for doc in self.docs.values():
+            if _matches(doc, filt):
+                yield doc
+
+    @staticmethod
+    def _apply(doc: Dict[str, Any], update: Mapping[str, Any]) -> None:
+        for key, value in update.get("$set", {}).items():
+            doc[key] = value
+        for key, value in update.get("$inc", {}).items():
+            doc[key] = doc.get(key, 0) + value
+        for key in update.get("$unset", {}):
+            doc.pop(key, None)
+        for key, value in update.get("$addToSet", {}).items():
+            values = doc.setdefault(key, [])
+            if value not in values:
+                values.append(value)
+
+    async def find_one(self, filt: Optional[Mapping[str, Any]] = None,
+                       **_: Any) -> Optional[Dict[str, Any]]:
+        self.calls += 1
+        return next(self._find(filt or {}), None)
+
+    def find(self, filt: Optional[Mapping[str, Any]] = None,
+             **_: Any) -> FakeCursor:
+        self.calls += 1
+        return FakeCursor(list(self._find(filt or {})))
+
+    async def find_one_and_update(self,
+                                  filt: Mapping[str, Any],
+                                  update: Mapping[str, Any],
+                                  upsert: bool = False,
+                                  **_: Any) -> Optional[Dict[str, Any]]:
+        self.calls += 1
+        doc = next(self._find(filt), None)
+        before = copy.deepcopy(doc)
+        if doc is None:
+            if not upsert:
+                return None
+            doc = dict(filt)
+            self.docs[doc.get("_id", len(self.docs))] = doc
+
+        self._apply(doc, update)
+        return before
+
+    async def update_one(self, filt: Mapping[str, Any],
+                         update: Mapping[str, Any], **kwargs: Any) -> None:
+        await self.find_one_and_update(filt, update, **kwargs)
+
+    async def find_one_and_delete(self, filt: Mapping[str, Any],
+                                  **_: Any) -> Optional[Dict[str, Any]]:
+        self.calls += 1
+        doc = next(self._find(filt), None)
+        if doc is not None:
+            del self.docs[doc["_id"]]
+        return doc
+
+    async def delete_one(self, filt: Mapping[str, Any], **kwargs: Any) -> None:
+        await self.find_one_and_delete(filt, **kwargs)
+
+    async def insert_one(self, doc: Dict[str, Any], **_: Any) -> None:
+        self.calls += 1
+        self.docs[doc.setdefault("_id", len(self.docs))] = doc
+
+    async def count_documents(self, filt: Mapping[str, Any], **_: Any) -> int:
+        self.calls += 1
+        return sum(1 for _ in self._find(filt))
+
+
+class FakeResponse:
+    """Response of an image that exists, or a canned JSON payload."""
+
+    def __init__(self, payload: Any = None) -> None:
+        self.status = 200
+        self.payload = payload
+        self.content_type = "image/jpeg"
+        self.content_length = 64 * 1024
+        self.headers = {"content-type": self.content_type}
+
+    async def __aenter__(self) -> "FakeResponse":
+        return self
+
+    async def __aexit__(self, *_: Any) -> None:
+        pass
+
+    async def json(self, **_: Any) -> Any:
+        return self.payload
+
+    async def text(self) -> str:
+        return str(self.payload)
+
+    async def read(self) -> bytes:
+        return b""
+
+
+class FakeHTTP:
+    """aiohttp session answering every request from memory."""
+
+    closed = False
+
+    def __init__(self, routes: Optional[Mapping[str, Any]] = None) -> None:
+        self.routes = dict(routes or {})
+        self.requests = 0
+
+    def _respond(self, url: str) -> FakeResponse:
+        self.requests += 1
+        for prefix, payload in self.routes.items():
+            if str(url).startswith(prefix):
+                return FakeResponse(payload)
+
+        return FakeResponse()
+
+    def get(self, url: str, **_: Any) -> FakeResponse:
+        return self._respond(url)
+
+    def head(self, url: str, **_: Any) -> FakeResponse:
+        return self._respond(url)
+
+    async def close(self) -> None:
+        pass
+
+
+class FakeClient:
+    """Telegram client whose API calls succeed without any network."""
+
+    def __init__(self, user_id: int = USER_ID, is_bot: bool = False) -> None:
+        self.me = User(id=user_id,
+                       is_self=True,
+                       is_bot=is_bot,
+                       first_name="Bench")
+        self.is_bot = is_bot
+        self.loop = asyncio.get_event_loop()
+        self.executor = None
+        self.calls: Dict[str, int] = {}
+        self._handlers: List[Tuple[Any, int]] = []
+
+    @property
+    def groups(self) -> List[List[Any]]:
+        """Handlers by group, in the order Pyrogram runs them."""
+
+        groups: Dict[int, List[Any]] = {}
+        for handler, group in self._handlers:
+            groups.setdefault(group, []).append(handler)
+
+        return [groups[group] for group in sorted(groups)]
+
+    def _count(self, name: str) -> None:
+        self.calls[name] = self.calls.get(name, 0) + 1
+
+    def add_handler(self, handler: Any, group: int = 0) -> Tuple[Any, int]:
+        self._handlers.append((handler, group))
+        return handler, group
+
+    def remove_handler(self, handler: Any, group: int = 0) -> None:
+        self._handlers.remove((handler, group))
+
+    async def edit_message_text(self, chat_id: int, message_id: int,
+                                text: str, **_: Any) -> Message:
+        self._count("edit_message_text")
+        return make_message(self, text, message_id=message_id)
+
+    async def send_message(self, chat_id: int, text: str, **_: Any) -> Message:
+        self._count("send_message")
+        return make_message(self, text)
+
+    def __getattr__(self, name: str) -> Any:
+        if name.startswith("_"):
+            raise AttributeError(name)
+
+        async def call(*_: Any, **__: Any) -> bool:
+            self._count(name)
+            return True
+
+        return call
+
+
+def make_message(client: FakeClient,
+                 text: str,
+                 *,
+                 message_id: int = 1,
+                 outgoing: bool = True) -> Message:
+    return Message(
+        client=client,
+        message_id=message_id,
+        chat=Chat(id=CHAT_ID, type="private"),
+        from_user=client.me,
+        text=text,
+        outgoing=outgoing,
+    )
+
+
+def make_inline_query(client: FakeClient, query: str) -> InlineQuery:
+    return InlineQuery(client=client,
+                       id="1",
+                       from_user=client.me,
+                       query=query,
+                       offset="")
+
+
+async def make_bot(*modules: type,
+                   http: Optional[FakeHTTP] = None) -> Tuple[Bot, FakeClient]:
+    """Builds a Bot with the given modules loaded and everything faked."""
+
+    bot = Bot()
+    client = FakeClient()
+    collections: Dict[str, FakeCollection] = {}
+
+    bot.client = client
+    bot.user = client.me
+    bot.uid = USER_ID
+    bot.prefix = "."
+    bot.sudoprefix = ">"
+    bot.start_time_us = 0
+    bot.get_db = lambda name: collections.setdefault(name,
+                                                     FakeCollection(name))
+    # Bot.http is backed by a name mangled attribute
+    bot._Bot__aiosession = http or FakeHTTP()
+
+    for cls in modules:
+        bot.load_module(cls)
+    await bot.dispatch_event("load")
+    bot.loaded = True
+    await bot.dispatch_event("start", bot.start_time_us)
+
+    return bot, client
+
+
+async def drain() -> None:
+    """Lets the tasks spawned without waiting, like stats, finish."""
+
+    for _ in range(3):
+        await asyncio.sleep(0)
+
@@ -0,0 +1,333 @@
+"""
+Replays an update log recorded with UPDATE_LOG against the benchmark bot and
+reports the latency of every handler and listener as JSON
+
+Usage: python -m benchmarks.replay LOG [--speed N] [--workers N]
+                                       [--max-pending N] [--timeout S]
+                                       [--output FILE]
+
+--speed 1 replays in real time, 10 ten times faster and 0 as fast as
+possible.
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple
+
+from pyrogram.errors import ContinuePropagation, StopPropagation
+from pyrogram.handlers import (
+    CallbackQueryHandler,
+    DeletedMessagesHandler,
+    InlineQueryHandler,
+    MessageHandler,
+)
+from pyrogram.types import CallbackQuery, Chat, InlineQuery, Message, User
+
+from caligo.core import Bot
+from caligo.util import record
+
+from .bot_paths import setup_bot, teardown_bot
+from .fakes import BOT_ID, USER_ID, FakeClient, drain
+
+# Same as the Pyrogram default
+DEFAULT_WORKERS = min(32, (os.cpu_count() or 1) + 4)
+PERCENTILES = (50, 90, 99)
+
+
+class Timings:
+    """Latencies and errors grouped by name."""
+
+    def __init__(self) -> None:
+        self.samples: Dict[str, List[float]] = {}
+        self.errors: Dict[str, int] = {}
+
+    def add(self, name: str, seconds: float) -> None:
+        self.samples.setdefault(name, []).append(seconds)
+
+    def error(self, name: str) -> None:
+        self.errors[name] = self.errors.get(name, 0) + 1
+
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        report = {}
+        for name, samples in sorted(self.samples.items()):
+            samples.sort()
+            stats = {"count": len(samples), "errors": self.errors.get(name, 0)}
+            for pct in PERCENTILES:
+                idx = min(len(samples) - 1, len(samples) * pct // 100)
+                stats[f"p{pct}_ms"] = round(samples[idx] * 1000, 3)
+            stats["max_ms"] = round(samples[-1] * 1000, 3)
+            report[name] = stats
+
+        return report
+
+
+class Replay:
+    """Feeds recorded updates to the bot through its registered handlers.
+
+    Updates go through a bounded queue consumed by a fixed number of workers,
+    like the Pyrogram dispatcher. Updates that find the queue full are dropped.
+    """
+
+    def __init__(self, bot: Bot, client: FakeClient, bot_client: FakeClient,
+                 workers: int, max_pending: int) -> None:
+        self.bot = bot
+        self.clients = {"user": client, "bot": bot_client}
+        self.workers = workers
+        self.queue: asyncio.Queue = asyncio.Queue(max_pending)
+
+        self.updates = Timings()
+        self.handlers = Timings()
+        self.listeners = Timings()
+        self.dropped = 0
+
+        self._names = {
+            id(handler): f"event:{event}"
+            for event, (handler, _) in bot._mevent_handlers.items()
+        }
+        self._wrap_listeners()
+
+    def _wrap_listeners(self) -> None:
+        for listeners in self.bot.listeners.values():
+            for lst in listeners:
+                lst.func = self._timed(
+                    f"{lst.module.name}.{lst.func.__name__}", lst.func)
+
+    def _timed(self, name: str, func: Callable) -> Callable:
+
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:  # skipcq: PYL-W0703
+                self.listeners.error(name)
+            finally:
+                self.listeners.add(name, time.perf_counter() - start)
+
+        return wrapper
+
+    def _handler_name(self, client: FakeClient, handler: Any) -> str:
+        name = self._names.get(id(handler), handler.callback.__name__)
+        return f"bot:{name}" if client.is_bot else name
+
+    @staticmethod
+    def _user(client: FakeClient, user_id: Optional[int],
+              is_bot: bool = False) -> Optional[User]:
+        if user_id is None:
+            return None
+        if user_id == 0:
+            return client.me
+
+        return User(id=user_id, is_bot=is_bot, first_name="User")
+
+    @staticmethod
+    def _chat(data: Dict[str, Any]) -> Optional[Chat]:
+        if "c" not in data:
+            return None
+
+        return Chat(id=data["c"] or USER_ID, type=data["ct"])
+
+    def _message(self, client: FakeClient, data: Dict[str, Any]) -> Message:
+        kwargs = {}
+        text = data.get("text")
+        if text is not None:
+            kwargs["caption" if data.get("caption") else "text"] = text
+        if "media" in data:
+            kwargs["media"] = True
+            kwargs[data["media"]] = SimpleNamespace(file_id="",
+                                                    file_unique_id="",
+                                                    file_size=data["size"])
+        if "joined" in data:
+            kwargs["new_chat_members"] = [
+                self._user(client, user_id) for user_id in data["joined"]
+            ]
+        if "left" in data:
+            kwargs["left_chat_member"] = self._user(client, data["left"])
+
+        return Message(client=client,
+                       message_id=data.get("id", 1),
+                       chat=self._chat(data),
+                       from_user=self._user(client, data.get("u"),
+                                            data.get("ub", False)),
+                       outgoing=data.get("out", False),
+                       edit_date=(int(time.time())
+                                  if data["k"] == "edit" else None),
+                       reply_to_message_id=data.get("reply"),
+                       **kwargs)
+
+    def build(self, data: Dict[str, Any]) -> Tuple[FakeClient, Any, type]:
+        """Rebuilds the Pyrogram update of a record."""
+
+        client = self.clients[data.get("cl", "user")]
+        kind = data["k"]
+        user = self._user(client, data.get("u"), data.get("ub", False))
+        if kind in ("message", "edit"):
+            return client, self._message(client, data), MessageHandler
+        if kind == "delete":
+            chat = self._chat(data)
+            return client, [
+                Message(client=client, message_id=message_id, chat=chat)
+                for message_id in data["ids"]
+            ], DeletedMessagesHandler
+        if kind == "inline":
+            return client, InlineQuery(client=client,
+                                       id="1",
+                                       from_user=user,
+                                       query=data["query"],
+                                       offset=""), InlineQueryHandler
+        if kind == "callback":
+            message = None if data.get("inline") else self._message(
+                client, {
+                    **data, "u": None
+                })
+            return client, CallbackQuery(
+                client=client,
+                id="1",
+                from_user=user,
+                chat_instance="1",
+                message=message,
+                inline_message_id="1" if message is None else None,
+                data=data["data"]), CallbackQueryHandler
+
+        raise ValueError(f"Unknown update kind '{kind}'")
+
+    async def handle(self, client: FakeClient, update: Any,
+                     handler_type: type) -> None:
+        """Runs the first matching handler of each group, like Pyrogram."""
+
+        try:
+            for group in client.groups:
+                for handler in group:
+                    if not isinstance(handler, handler_type):
+                        continue
+
+                    name = self._handler_name(client, handler)
+                    try:
+                        if not await handler.check(client, update):
+                            continue
+                    except Exception:  # skipcq: PYL-W0703
+                        self.handlers.error(name)
+                        continue
+
+                    start = time.perf_counter()
+                    try:
+                        await handler.callback(client, update)
+                    except ContinuePropagation:
+                        continue
+                    except StopPropagation:
+                        raise
+                    except Exception:  # skipcq: PYL-W0703
+                        self.handlers.error(name)
+                    finally:
+                        self.handlers.add(name, time.perf_counter() - start)
+
+                    break
+        except StopPropagation:
+            pass
+
+    async def worker(self) -> None:
+        while True:
+            kind, due, (client, update, handler_type) = await self.queue.get()
+            try:
+                await self.handle(client, update, handler_type)
+            finally:
+                self.updates.add(kind, time.perf_counter() - due)
+                self.queue.task_done()
+
+    async def run(self, records: Sequence[Dict[str, Any]], speed: float,
+                  timeout: float) -> Dict[str, Any]:
+        workers = [
+            self.bot.loop.create_task(self.worker())
+            for _ in range(self.workers)
+        ]
+
+        start = time.perf_counter()
+        for data in records:
+            due = start + data["t"] / speed if speed else time.perf_counter()
+            delay = due - time.perf_counter()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+            try:
+                self.queue.put_nowait((data["k"], due, self.build(data)))
+            except asyncio.QueueFull:
+                self.dropped += 1
+        fed = time.perf_counter() - start
+
+        try:
+            await asyncio.wait_for(self.queue.join(), timeout)
+        except asyncio.TimeoutError:
+            pass
+        unfinished = self.queue.qsize()
+        for task in workers:
+            task.cancel()
+        await drain()
+
+        return {
+            "updates": len(records),
+            "dropped": self.dropped,
+            "unfinished": unfinished,
+            "feed_seconds": round(fed, 3),
+            "total_seconds": round(time.perf_counter() - start, 3),
+            "kinds": self.updates.report(),
+            "handlers": self.handlers.report(),
+            "listeners": self.listeners.report(),
+        }
+
+
+async def run(path: Path, speed: float, workers: int, max_pending: int,
+              timeout: float) -> Dict[str, Any]:
+    records = list(record.read_log(path))
+    bot, client = await setup_bot()
+
+    bot_client = FakeClient(BOT_ID, is_bot=True)
+    client.bot = bot_client
+    bot.bot_uid = BOT_ID
+    bot.register_handlers()
+    # has_bot is False with the fake clients, add the bot events by hand
+    bot.update_bot_module_event("inline_query", InlineQueryHandler)
+    bot.update_bot_module_event("callback_query", CallbackQueryHandler)
+
+    replay = Replay(bot, client, bot_client, workers, max_pending)
+    try:
+        return await replay.run(records, speed, timeout)
+    finally:
+        teardown_bot(bot)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawTextHelpFormatter)
+    parser.add_argument("log", type=Path)
+    parser.add_argument("--speed", type=float, default=1)
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS)
+    parser.add_argument("--max-pending", type=int, default=1000)
+    parser.add_argument("--timeout", type=float, default=30)
+    parser.add_argument("--output", help="write the JSON here too")
+    args = parser.parse_args()
+
+    result = asyncio.get_event_loop().run_until_complete(
+        run(args.log, args.speed, args.workers, args.max_pending,
+            args.timeout))
+    report = {
+        "log": str(args.log),
+        "speed": args.speed,
+        "workers": args.workers,
+        "max_pending": args.max_pending,
+        "time": int(time.time()),
+        **result,
+    }
+
+    data = json.dumps(report, indent=2)
+    print(data)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(data + "\n")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""
+Benchmark of the Stylish and Text transforms over long inputs
+
+Usage: python -m benchmarks.text_transforms [--length N] [--repeat N]
+"""
+
+import argparse
+import random
+import string
+import timeit
+from typing import Callable, Dict, List, Sequence
+
+from caligo.modules.stylish import Stylish
+from caligo.util import text
+
+
+def legacy_font_gen(input_str: str, style: Sequence[str]) -> str:
+    """The list.index + str.replace implementation translate tables replaced."""
+
+    unstyled = list(Stylish.styles["normal"])
+    font = list(style)
+    for x in input_str:
+        if x in unstyled:
+            input_str = input_str.replace(x, font[unstyled.index(x)])
+    return input_str
+
+
+def make_input(length: int) -> str:
+    chars = string.ascii_letters + string.digits + "  \n.,!?"
+    return "".join(random.choices(chars, k=length))
+
+
+def bench(func: Callable[[], object], repeat: int) -> float:
+    """Returns the best time of one call in milliseconds."""
+
+    return min(timeit.repeat(func, number=1, repeat=repeat)) * 1000
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--length", type=int, nargs="+", default=[100, 1000, 4096])
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    normal = [ord(char) for char in Stylish.styles["normal"]]
+    tables: Dict[str, Dict[int, str]] = {
+        name: dict(zip(normal, style)) for name, style in Stylish.styles.items()
+    }
+    names: List[str] = sorted(list(Stylish.styles)[1:])
+
+    print(f"{'transform':<28}{'length':>8}{'time (ms)':>12}")
+    for length in args.length:
+        inp = make_input(length)
+        cases = {
+            "stylish, all styles (old)":
+                lambda: [legacy_font_gen(inp, Stylish.styles[n]) for n in names],
+            "stylish, all styles":
+                lambda: [inp.translate(tables[n]) for n in names],
+            "mock": lambda: text.mock(inp),
+            "strike": lambda: text.strike(inp),
+            "clap": lambda: text.clap(inp),
+        }
+        for name, func in cases.items():
+            print(f"{name:<28}{length:>8}{bench(func, args.repeat):>12.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,16 +1,18 @@
 import asyncio
 import inspect
-from typing import TYPE_CHECKING, Optional, Union
+from collections import deque
+from typing import TYPE_CHECKING, Any, Deque, List, Optional, Set, Tuple, Union
 
 import pyrogram
 from async_property import async_cached_property
+from pyrogram.filters import Filter
 from pyrogram.types import Chat, Message
 
-from . import util
-
 if TYPE_CHECKING:
     from .core import Bot
 
+Waiter = Tuple[Optional[Filter], asyncio.Future]
+
 
 class Error(Exception):
     pass
@@ -28,6 +30,14 @@ class ConversationTimeout(Error):
 
 
 class Conversation:
+    """Messages of one chat routed to whoever is waiting for them.
+
+    Waiters register a future with their filters and incoming messages are
+    matched as soon as they arrive. Messages nobody waits for yet are kept
+    in a backlog bounded by max_messages, oldest ones dropped first. The
+    backlog is shared by the conversations open in the same chat, so each
+    message is only taken once.
+    """
 
     def __init__(self, bot: "Bot", input_chat: Union[str, int], timeout: int,
                  max_messages: int) -> None:
@@ -42,17 +52,23 @@ class Conversation:
         self._max_incoming = max_messages
         self._timeout = timeout
 
+        self.backlog: Deque[Message] = deque(maxlen=max_messages)
+        self._waiters: List[Waiter] = []
+        self._sent: Set[int] = set()
+
     @async_cached_property
     async def chat(self) -> Chat:
-        return await self.client.get_chat(self._input_chat)
+        return await self.bot.get_chat(self._input_chat)
 
     async def send_message(self, text, **kwargs) -> Message:
         sent = await self.client.send_message(self.chat.id, text, **kwargs)
+        self._sent.add(sent.message_id)
 
         return sent
 
     async def send_file(self, document, **kwargs) -> Message:
         doc = await self.client.send_document(self.chat.id, document, **kwargs)
+        self._sent.add(doc.message_id)
 
         return doc
 
@@ -70,29 +86,82 @@ class Conversation:
     async def mark_read(self, max_id: Optional[int] = 0) -> bool:
         return await self.bot.client.read_history(self.chat.id, max_id)
 
-    async def _get_message(self, filters=None, **kwargs) -> Message:
+    def accepts(self, msg: Message) -> bool:
+        """Whether the message is part of this conversation."""
+
+        if msg.message_id in self._sent:
+            return False
+
+        # Our own replies only count in Saved Messages
+        return not msg.outgoing or self.chat.id == self.bot.uid
+
+    async def _match(self, filters: Optional[Filter], msg: Message) -> bool:
+        if filters is None or not callable(filters):
+            return True
+
+        ready = filters(self.bot.client, msg)
+        if inspect.iscoroutine(ready):
+            ready = await ready
+
+        return bool(ready)
+
+    async def resolve(self, msg: Message) -> bool:
+        """Hands the message to the first waiter whose filters match it."""
+
+        for waiter in list(self._waiters):
+            filters, fut = waiter
+            if fut.done() or not await self._match(filters, msg):
+                continue
+
+            # The waiter may be gone while its filter was awaited
+            if waiter in self._waiters and not fut.done():
+                self._waiters.remove(waiter)
+                fut.set_result(msg)
+                return True
+
+        return False
+
+    async def _get_message(self,
+                           filters: Optional[Filter] = None,
+                           **kwargs: Any) -> Message:
         if self._counter >= self._max_incoming:
             raise ValueError("Received max messages")
 
-        fut = self.bot.CONVERSATION[self.chat.id]
-        timeout = kwargs.get("timeout") or self._timeout
-        before = util.time.usec()
-        while True:
-            after = before - util.time.usec()
-            try:
-                result = await asyncio.wait_for(fut.get(), timeout - after)
-            except asyncio.TimeoutError:
-                raise self.Timeout
+        loop = asyncio.get_event_loop()
+        deadline = loop.time() + (kwargs.get("timeout") or self._timeout)
 
-            if filters is not None and callable(filters):
-                ready = filters(self.bot.client, result)
-                if inspect.iscoroutine(ready):
-                    ready = await ready
-                if not ready:
-                    continue
+        result = None
+        for msg in list(self.backlog):
+            if not self.accepts(msg) or not await self._match(filters, msg):
+                continue
 
+            # Another conversation may have taken it while the filter ran
+            try:
+                self.backlog.remove(msg)
+            except ValueError:
+                continue
+
+            result = msg
             break
 
+        if result is None:
+            waiter = (filters, loop.create_future())
+            self._waiters.append(waiter)
+            try:
+                result = await asyncio.wait_for(waiter[1],
+                                                max(deadline - loop.time(), 0))
+            except asyncio.TimeoutError:
+                raise self.Timeout from None
+            finally:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+
         self._counter += 1
 
         return result
+
+    def close(self) -> None:
+        for _, fut in self._waiters:
+            if not fut.done():
+                fut.cancel()
+        self._waiters.clear()
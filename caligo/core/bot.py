@@ -6,10 +6,13 @@ import aiohttp
 import pyrogram
 import ujson
 
+from .. import util
 from .command_dispatcher import CommandDispatcher
 from .conversation_dispatcher import ConversationDispatcher
 from .database import DataBase
+from .entity_cache import EntityCache
 from .event_dispatcher import EventDispatcher
+from .job_manager import JobManager
 from .module_extender import ModuleExtender
 from .telegram_bot import TelegramBot
 
@@ -18,8 +21,10 @@ class Bot(
         TelegramBot,
         CommandDispatcher,
         DataBase,
+        EntityCache,
         EventDispatcher,
         ConversationDispatcher,
+        JobManager,
         ModuleExtender,
 ):
     client: pyrogram.Client
@@ -62,8 +67,11 @@ class Bot(
         self.log.info("Stopping")
         if self.loaded:
             await self.dispatch_event("stop")
+        if self.recorder is not None:
+            self.recorder.close()
         await self.http.close()
         await self.close_db()
+        util.executors.shutdown()
 
         self.log.info("Running post-stop hooks")
         if self.loaded:
@@ -80,7 +88,9 @@ class Bot(
         self.loop.stop()
 
     def __new_aiosession(self) -> aiohttp.ClientSession:
-        return aiohttp.ClientSession(json_serialize=ujson.dumps)
+        return aiohttp.ClientSession(
+            json_serialize=ujson.dumps,
+            trace_configs=[util.tracing.http_trace_config()])
 
     @property
     def http(self) -> aiohttp.ClientSession:
@@ -142,18 +142,21 @@ class CommandDispatcher(Base):
                                   matches)
 
             try:
-                ret = await cmd.func(ctx)
-
-                if ret is not None:
-                    if isinstance(ret, Tuple):
-                        await ctx.respond(ret[0], delete_after=int(ret[1]))
-                    else:
-                        await ctx.respond(ret)
+                with util.metrics.command_seconds.time(
+                        command=cmd.name), util.tracing.trace(cmd.name):
+                    ret = await cmd.func(ctx)
+
+                    if ret is not None:
+                        if isinstance(ret, Tuple):
+                            await ctx.respond(ret[0], delete_after=int(ret[1]))
+                        else:
+                            await ctx.respond(ret)
             except pyrogram.errors.MessageNotModified:
                 cmd.module.log.warning(
                     f"Command '{cmd.name}' triggered a message edit with no changes"
                 )
             except Exception as e:  # skipcq: PYL-W0703
+                util.metrics.command_errors.inc(command=cmd.name)
                 cmd.module.log.error(f"Error in command '{cmd.name}'",
                                      exc_info=e)
                 if (input_text :=
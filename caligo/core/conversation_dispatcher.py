@@ -1,6 +1,5 @@
-import asyncio
 from contextlib import asynccontextmanager
-from typing import TYPE_CHECKING, Any, Dict, Optional, Union
+from typing import TYPE_CHECKING, Any, Deque, Dict, List, Optional, Union
 
 import pyrogram
 from pyrogram.filters import Filter, create
@@ -13,19 +12,20 @@ if TYPE_CHECKING:
 
 
 class ConversationDispatcher(Base):
-    CONVERSATION: Dict[int, asyncio.Queue]
+    CONVERSATION: Dict[int, List[Conversation]]
+    CONVERSATION_BACKLOG: Dict[int, Deque[pyrogram.types.Message]]
 
     def __init__(self: "Bot", **kwargs: Any) -> None:
         self.CONVERSATION = {}
+        self.CONVERSATION_BACKLOG = {}
 
         super().__init__(**kwargs)
 
     def conversation_predicate(self: "Bot") -> Filter:
 
         async def func(_, __, conv: pyrogram.types.Message):
-            return bool(self.CONVERSATION and conv.chat
-                        and conv.chat.id in self.CONVERSATION
-                        and not conv.outgoing)
+            return bool(self.CONVERSATION and conv.chat and
+                        conv.chat.id in self.CONVERSATION)
 
         return create(func)
 
@@ -40,19 +40,33 @@ class ConversationDispatcher(Base):
         conv = Conversation(self, chat_id, timeout, max_messages)
         await conv.chat
 
-        chat_name = conv.chat.title if conv.chat.title else conv.chat.first_name
-        if conv.chat.id in self.CONVERSATION:
-            raise conv.Exist(f"Conversation with '{chat_name}' exist")
-        self.CONVERSATION[conv.chat.id] = asyncio.Queue(max_messages)
-
+        # Several conversations can be open in the same chat at once, the
+        # first one sets the size of their shared backlog
+        self.CONVERSATION.setdefault(conv.chat.id, []).append(conv)
+        conv.backlog = self.CONVERSATION_BACKLOG.setdefault(
+            conv.chat.id, conv.backlog)
         try:
             yield conv
         finally:
-            self.CONVERSATION[conv.chat.id].put_nowait(None)
-            del self.CONVERSATION[conv.chat.id]
+            conv.close()
+            convs = self.CONVERSATION[conv.chat.id]
+            convs.remove(conv)
+            if not convs:
+                del self.CONVERSATION[conv.chat.id]
+                del self.CONVERSATION_BACKLOG[conv.chat.id]
 
     async def on_conversation(self: "Bot", _: pyrogram.Client,
                               msg: pyrogram.types.Message) -> None:
-        cache = self.CONVERSATION[msg.chat.id]
-        cache.put_nowait(msg)
+        convs = [
+            conv for conv in self.CONVERSATION.get(msg.chat.id, [])
+            if conv.accepts(msg)
+        ]
+        for conv in convs:
+            if await conv.resolve(msg):
+                break
+        else:
+            # Nobody is waiting for it yet, the first get_response takes it
+            if convs:
+                self.CONVERSATION_BACKLOG[msg.chat.id].append(msg)
+
         msg.continue_propagation()
@@ -1,13 +1,64 @@
+import functools
 from typing import TYPE_CHECKING, Any
 
 from motor.core import AgnosticCollection
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase
 
+from .. import util
 from .base import Base
 
 if TYPE_CHECKING:
     from .bot import Bot
 
+# Collection methods returning an awaitable, cursors are left alone
+TIMED_METHODS = frozenset((
+    "bulk_write",
+    "count_documents",
+    "create_index",
+    "delete_many",
+    "delete_one",
+    "distinct",
+    "drop",
+    "estimated_document_count",
+    "find_one",
+    "find_one_and_delete",
+    "find_one_and_replace",
+    "find_one_and_update",
+    "insert_many",
+    "insert_one",
+    "replace_one",
+    "update_many",
+    "update_one",
+))
+
+
+class CollectionProxy:
+    """Motor collection whose awaited calls are timed."""
+
+    def __init__(self, collection: AgnosticCollection) -> None:
+        self._collection = collection
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._collection, name)
+        if name not in TIMED_METHODS:
+            return attr
+
+        @functools.wraps(attr)
+        async def timed(*args: Any, **kwargs: Any) -> Any:
+            collection = self._collection.name
+            with util.metrics.db_seconds.time(
+                    collection=collection, method=name), util.tracing.span(
+                        f"{collection}.{name}", "db"):
+                return await attr(*args, **kwargs)
+
+        return timed
+
+    def __getitem__(self, name: str) -> "CollectionProxy":
+        return CollectionProxy(self._collection[name])
+
+    def __repr__(self) -> str:
+        return f"<CollectionProxy {self._collection!r}>"
+
 
 class DataBase(Base):
     _db: AsyncIOMotorClient
@@ -26,5 +77,5 @@ class DataBase(Base):
     async def close_db(self) -> None:
         self._db.close()
 
-    def get_db(self: "Bot", name: str) -> AgnosticCollection:
-        return self.db.get_collection(name)
+    def get_db(self: "Bot", name: str) -> CollectionProxy:
+        return CollectionProxy(self.db.get_collection(name))
@@ -0,0 +1,119 @@
+from typing import TYPE_CHECKING, Any, Hashable, List, Set, Union
+
+import pyrogram
+
+from .. import util
+from .base import Base
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+EntityRef = Union[int, str]
+
+
+class EntityCache(Base):
+    """Short lived cache of users, chats and chat members.
+
+    Concurrent lookups of the same entity share a single API call, and
+    membership entries are dropped as soon as a join/leave is seen.
+    """
+
+    users_cache: util.cache.TTLCache
+    chats_cache: util.cache.TTLCache
+    members_cache: util.cache.TTLCache
+
+    def __init__(self: "Bot", **kwargs: Any) -> None:
+        self.users_cache = util.cache.TTLCache(ttl=10 * 60, maxsize=1024)
+        self.chats_cache = util.cache.TTLCache(ttl=10 * 60, maxsize=512)
+        # Admin rights change without any service message, keep these short
+        self.members_cache = util.cache.TTLCache(ttl=2 * 60, maxsize=1024)
+
+        super().__init__(**kwargs)
+
+    @staticmethod
+    def _entity_key(ref: EntityRef) -> Hashable:
+        if isinstance(ref, str):
+            return ref.lstrip("@").lower()
+
+        return ref
+
+    async def get_user(self: "Bot", user_id: EntityRef) -> pyrogram.types.User:
+        return await self.users_cache.fetch(
+            self._entity_key(user_id),
+            lambda: util.tg.flood_retry(self.client.get_users, user_id))
+
+    async def get_users(
+            self: "Bot",
+            user_ids: List[EntityRef]) -> List[pyrogram.types.User]:
+        """Resolves all users missing from the cache in one request."""
+
+        missing = [
+            user_id for user_id in user_ids
+            if self._entity_key(user_id) not in self.users_cache
+        ]
+        if missing:
+            users = await util.tg.flood_retry(self.client.get_users, missing)
+            # The response skips unknown users, so it can't be zipped back
+            for user in users:
+                self.users_cache.set(user.id, user)
+                if user.username:
+                    self.users_cache.set(self._entity_key(user.username),
+                                         user)
+
+        return [await self.get_user(user_id) for user_id in user_ids]
+
+    async def get_chat(self: "Bot", chat_id: EntityRef) -> pyrogram.types.Chat:
+
+        async def fetch() -> pyrogram.types.Chat:
+            chat = await util.tg.flood_retry(self.client.get_chat, chat_id)
+            # Cached under both keys so invalidate_chat() drops them together
+            self.chats_cache.set(chat.id, chat)
+            if chat.username:
+                self.chats_cache.set(self._entity_key(chat.username), chat)
+
+            return chat
+
+        return await self.chats_cache.fetch(self._entity_key(chat_id), fetch)
+
+    async def get_chat_member(
+            self: "Bot", chat_id: int,
+            user_id: EntityRef) -> pyrogram.types.ChatMember:
+        if user_id == "me":
+            user_id = self.uid
+
+        return await self.members_cache.fetch(
+            (chat_id, self._entity_key(user_id)),
+            lambda: util.tg.flood_retry(self.client.get_chat_member, chat_id,
+                                        user_id))
+
+    async def get_permissions(self: "Bot",
+                              chat_id: int) -> pyrogram.types.ChatMember:
+        """Returns our own membership, which holds our admin rights."""
+
+        return await self.get_chat_member(chat_id, self.uid)
+
+    async def get_chat_admins(self: "Bot", chat_id: int) -> Set[int]:
+
+        async def fetch() -> Set[int]:
+            return {
+                member.user.id async for member in self.client.
+                iter_chat_members(chat_id, filter="administrators")
+            }
+
+        return await self.members_cache.fetch((chat_id, "admins"), fetch)
+
+    def invalidate_chat(self: "Bot", chat_id: int, *user_ids: int) -> None:
+        chat = self.chats_cache.pop(chat_id)
+        if chat is not None and chat.username:
+            self.chats_cache.pop(self._entity_key(chat.username))
+        self.members_cache.pop((chat_id, "admins"))
+        for user_id in user_ids:
+            self.members_cache.pop((chat_id, user_id))
+
+    async def on_entity_update(self: "Bot", _: pyrogram.Client,
+                               msg: pyrogram.types.Message) -> None:
+        users = list(msg.new_chat_members or [])
+        if msg.left_chat_member:
+            users.append(msg.left_chat_member)
+
+        self.invalidate_chat(msg.chat.id, *(user.id for user in users))
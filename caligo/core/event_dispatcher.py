@@ -107,7 +107,8 @@ class EventDispatcher(Base):
                 else:
                     continue
 
-            task = self.loop.create_task(lst.func(*args, **kwargs))
+            task = self.loop.create_task(
+                self._run_listener(event, lst.func, *args, **kwargs))
             tasks.add(task)
 
         if not tasks:
@@ -119,5 +120,15 @@ class EventDispatcher(Base):
         if wait:
             await asyncio.wait(tasks)
 
+    @staticmethod
+    async def _run_listener(event: str, func: ListenerFunc, *args: Any,
+                            **kwargs: Any) -> Any:
+        util.metrics.listeners_running.inc(event=event)
+        try:
+            with util.metrics.listener_seconds.time(event=event):
+                return await func(*args, **kwargs)
+        finally:
+            util.metrics.listeners_running.dec(event=event)
+
     async def log_stat(self: "Bot", stat: str) -> None:
         await self.dispatch_event("stat_event", stat, wait=False)
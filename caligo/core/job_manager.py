@@ -0,0 +1,104 @@
+import itertools
+from collections import deque
+from typing import (
+    TYPE_CHECKING,
+    Any,
+    Deque,
+    Dict,
+    Iterator,
+    List,
+    MutableMapping,
+    Optional,
+    Tuple,
+)
+
+import pyrogram
+
+from .. import util
+from ..job import Job
+from .base import Base
+
+if TYPE_CHECKING:
+    from .bot import Bot
+
+# Finished jobs kept for .jobs
+JOB_HISTORY = 50
+
+
+class JobManager(Base):
+    """Registry of running jobs indexed by id, message, gid and chat."""
+
+    jobs: MutableMapping[int, Job]
+    job_history: Deque[Job]
+
+    _job_ids: Iterator[int]
+    _jobs_by_message: Dict[Tuple[int, int], Job]
+    _jobs_by_gid: Dict[str, Job]
+    _jobs_by_chat: Dict[int, Dict[int, Job]]
+
+    def __init__(self: "Bot", **kwargs: Any) -> None:
+        self.jobs = {}
+        self.job_history = deque(maxlen=JOB_HISTORY)
+
+        self._job_ids = itertools.count(1)
+        self._jobs_by_message = {}
+        self._jobs_by_gid = {}
+        self._jobs_by_chat = {}
+
+        super().__init__(**kwargs)
+
+    def job(self: "Bot",
+            name: str,
+            msg: Optional[pyrogram.types.Message] = None,
+            *,
+            gid: Optional[str] = None) -> Job:
+        """Registers a running job.
+
+        The job is finished when its context manager exits, or by finish_job().
+        """
+
+        job = Job(self, next(self._job_ids), name, msg, gid)
+        self.jobs[job.id] = job
+        if job.chat_id is not None:
+            self._jobs_by_message[(job.chat_id, job.message_id)] = job
+            self._jobs_by_chat.setdefault(job.chat_id, {})[job.id] = job
+        if gid is not None:
+            self._jobs_by_gid[gid] = job
+
+        return job
+
+    def finish_job(self: "Bot", job: Job, state: str) -> None:
+        if self.jobs.pop(job.id, None) is None:
+            return
+
+        if job.chat_id is not None:
+            key = (job.chat_id, job.message_id)
+            if self._jobs_by_message.get(key) is job:
+                del self._jobs_by_message[key]
+
+            chat_jobs = self._jobs_by_chat[job.chat_id]
+            del chat_jobs[job.id]
+            if not chat_jobs:
+                del self._jobs_by_chat[job.chat_id]
+        if job.gid is not None and self._jobs_by_gid.get(job.gid) is job:
+            del self._jobs_by_gid[job.gid]
+
+        job.state = state
+        job.finished = util.time.sec()
+        # Only the summary is kept in the history
+        job.msg = None
+        job.task = None
+        self.job_history.append(job)
+
+    def get_job(self: "Bot", job_id: int) -> Optional[Job]:
+        return self.jobs.get(job_id)
+
+    def get_message_job(self: "Bot", chat_id: int,
+                        message_id: int) -> Optional[Job]:
+        return self._jobs_by_message.get((chat_id, message_id))
+
+    def get_gid_job(self: "Bot", gid: str) -> Optional[Job]:
+        return self._jobs_by_gid.get(gid)
+
+    def get_chat_jobs(self: "Bot", chat_id: int) -> List[Job]:
+        return list(self._jobs_by_chat.get(chat_id, {}).values())
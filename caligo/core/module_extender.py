@@ -4,6 +4,7 @@ from types import ModuleType
 from typing import TYPE_CHECKING, Any, Iterable, MutableMapping, Optional, Type
 
 from .. import module, modules, util
+from ..help import HelpIndex
 from .base import Base
 
 if TYPE_CHECKING:
@@ -13,9 +14,11 @@ if TYPE_CHECKING:
 class ModuleExtender(Base):
     # Initialized during instantiation
     modules: MutableMapping[str, module.Module]
+    help_index: HelpIndex
 
     def __init__(self: "Bot", **kwargs: Any) -> None:
         self.modules = {}
+        self.help_index = HelpIndex()
 
         super().__init__(**kwargs)
 
@@ -34,6 +37,10 @@ class ModuleExtender(Base):
         self.register_listeners(mod)
         self.register_commands(mod)
         self.modules[cls.name] = mod
+        self.help_index.add_module(mod, [
+            cmd for name, cmd in self.commands.items()
+            if cmd.module == mod and name == cmd.name
+        ])
 
     def unload_module(self: "Bot", mod: module.Module) -> None:
         cls = type(mod)
@@ -42,6 +49,7 @@ class ModuleExtender(Base):
         self.unregister_listeners(mod)
         self.unregister_commands(mod)
         del self.modules[cls.name]
+        self.help_index.remove_module(cls.name)
 
     def _load_all_from_metamod(self: "Bot",
                                submodules: Iterable[ModuleType],
@@ -1,4 +1,4 @@
-from typing import Dict, List, Optional, Set, Union
+from typing import Dict, List, Optional, Union
 
 from pyrogram import Client, types
 from pyrogram.errors import (
@@ -8,8 +8,6 @@ from pyrogram.errors import (
     MessageNotModified,
 )
 
-_CANCEL_SET: Set[int] = set()
-
 # Inspired from Userge
 
 
@@ -17,7 +15,6 @@ class Message(types.Message):
 
     def __init__(self, client: Client, segments: List[Optional[str]],
                  mvars: Dict[str, object], **kwargs):
-        self._process_canceled = False
         self._kwargs = kwargs
         self._client = client
         self.segments = segments
@@ -28,7 +25,7 @@ class Message(types.Message):
         mvars = vars(msg)
         segments = mvars.get("segments")
         client = msg._client
-        for _key in ["segments", "_client", "_process_canceled", "_kwargs"]:
+        for _key in ["segments", "_client", "_kwargs"]:
             mvars.pop(_key, None)
 
         if mvars["reply_to_message"]:
@@ -36,18 +33,6 @@ class Message(types.Message):
                                                    **kwargs)
         return cls(client=client, segments=segments, mvars=mvars, **kwargs)
 
-    @property
-    def process_is_canceled(self) -> bool:
-        """Returns True if process canceled"""
-        if self.message_id in _CANCEL_SET:
-            _CANCEL_SET.remove(self.message_id)
-            self._process_canceled = True
-        return self._process_canceled
-
-    def cancel_the_process(self) -> None:
-        """Set True to the self.process_is_canceled"""
-        _CANCEL_SET.add(self.message_id)
-
     async def edit(
         self,
         text: str,
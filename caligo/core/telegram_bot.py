@@ -1,9 +1,12 @@
 import asyncio
+import logging
 import signal
-from typing import TYPE_CHECKING, Any, Optional
+from pathlib import Path
+from typing import TYPE_CHECKING, Any, Optional, Tuple
 
 import pyrogram
 from pyrogram import Client, filters
+from pyrogram.errors import FloodWait
 from pyrogram.handlers import (
     CallbackQueryHandler,
     DeletedMessagesHandler,
@@ -11,14 +14,29 @@ from pyrogram.handlers import (
     MessageHandler,
 )
 from pyrogram.handlers.handler import Handler
+from pyrogram.storage import FileStorage, MemoryStorage
 
 from ..custom_filter import chat_action
-from ..util import BotConfig, tg, time
+from ..util import (
+    BotConfig,
+    executors,
+    metrics,
+    record,
+    redact,
+    tg,
+    time,
+    tracing,
+)
 from .base import Base
 
 if TYPE_CHECKING:
     from .bot import Bot
 
+SESSION_NAME = "caligo"
+BOT_SESSION_NAME = "caligo_bot"
+# Handler group of the update recorder, ahead of every other handler
+RECORDER_GROUP = -2
+
 
 class TelegramBot(Base):
     client: Client
@@ -33,11 +51,23 @@ class TelegramBot(Base):
     bot_user: pyrogram.types.User
     bot_uid: int
 
+    redactor: redact.Redactor
+    recorder: Optional[record.UpdateRecorder]
+
     def __init__(self: "Bot", **kwargs: Any) -> None:
         self.loaded = False
         self.getConfig = BotConfig()
+        executors.configure(io=self.getConfig.io_workers,
+                            cpu=self.getConfig.cpu_workers,
+                            process=self.getConfig.process_workers)
+
+        self.redactor = redact.Redactor()
+        self.update_redactor()
+        for handler in logging.getLogger().handlers:
+            handler.addFilter(redact.RedactFilter(self.redactor))
 
         self._mevent_handlers = {}
+        self.recorder = None
 
         super().__init__(**kwargs)
 
@@ -50,27 +80,97 @@ class TelegramBot(Base):
         if not isinstance(api_hash, str):
             raise TypeError("API HASH must be a string")
 
-        string_session = self.getConfig.string_session
+        session_dir = self.getConfig.session_dir
+        session_dir.mkdir(parents=True, exist_ok=True)
 
+        string_session = self.getConfig.string_session
         if isinstance(string_session, str):
-            mode = string_session
-        else:
-            mode = ":memory:"
+            await self._seed_session(SESSION_NAME, string_session)
         self.client = Client(api_id=api_id,
                              api_hash=api_hash,
-                             session_name=mode)
+                             session_name=SESSION_NAME,
+                             workdir=str(session_dir))
 
         token = self.getConfig.token
         if token is not None:
             if not isinstance(token, str):
                 raise TypeError("BOT TOKEN must be a string")
 
+            await self._check_bot_session(BOT_SESSION_NAME, token)
             self.client.bot = Client(
                 api_id=api_id,
                 api_hash=api_hash,
                 bot_token=token,
-                session_name=":memory:",
+                session_name=BOT_SESSION_NAME,
+                workdir=str(session_dir),
             )
+            self._instrument_client(self.client.bot)
+
+        self._instrument_client(self.client)
+
+    @staticmethod
+    def _instrument_client(client: Client) -> None:
+        """Times every API call of the client and counts its FloodWaits."""
+
+        send = client.send
+
+        async def timed_send(data: Any, *args: Any, **kwargs: Any) -> Any:
+            method = getattr(data, "QUALNAME", type(data).__name__)
+            try:
+                with metrics.telegram_seconds.time(
+                        method=method), tracing.span(method, "telegram"):
+                    return await send(data, *args, **kwargs)
+            except FloodWait as e:
+                metrics.floodwaits.inc(method=method)
+                metrics.floodwait_seconds.inc(e.x, method=method)
+                raise
+
+        client.send = timed_send
+
+    async def _open_session(self: "Bot", name: str) -> FileStorage:
+        storage = FileStorage(name, self.getConfig.session_dir)
+        await storage.open()
+        return storage
+
+    def _remove_session(self: "Bot", name: str) -> None:
+        path = self.getConfig.session_dir / f"{name}.session"
+        if path.exists():
+            path.unlink()
+
+    async def _seed_session(self: "Bot", name: str,
+                            string_session: str) -> None:
+        """Creates the session file from the string session.
+
+        The file is kept as long as the string session doesn't change, so
+        the peers stored in it survive restarts.
+        """
+        memory = MemoryStorage(string_session)
+        await memory.open()
+        try:
+            storage = await self._open_session(name)
+            same = await storage.auth_key() == await memory.auth_key()
+            await storage.close()
+            if same:
+                return
+
+            # Another account or a revoked session, start from scratch
+            self._remove_session(name)
+            storage = await self._open_session(name)
+            for attr in ("dc_id", "test_mode", "auth_key", "date", "user_id",
+                         "is_bot"):
+                await getattr(storage, attr)(await getattr(memory, attr)())
+            await storage.save()
+            await storage.close()
+        finally:
+            await memory.close()
+
+    async def _check_bot_session(self: "Bot", name: str, token: str) -> None:
+        # The bot id is the first part of its token
+        storage = await self._open_session(name)
+        user_id = await storage.user_id()
+        await storage.close()
+        if user_id is not None and str(user_id) != token.split(":")[0]:
+            self._remove_session(name)
 
     async def start(self: "Bot") -> None:
         self.log.info("Starting")
@@ -94,28 +194,7 @@ class TelegramBot(Base):
                     upsert=True,
                 )
 
-        self.client.add_handler(
-            MessageHandler(
-                self.on_command,
-                filters=(self.command_predicate() & self.outgoing_flt()),
-            ),
-            0,
-        )
-
-        self.client.bot.add_handler(
-            MessageHandler(
-                self.on_command,
-                filters=(self.sudo_command_predicate()),
-                # & self.outgoing_flt()
-            ),
-            0,
-        )
-
-        self.client.add_handler(
-            MessageHandler(self.on_conversation,
-                           filters=self.conversation_predicate()),
-            0,
-        )
+        self.register_handlers()
 
         # Load modules
         self.load_all_modules()
@@ -141,12 +220,78 @@ class TelegramBot(Base):
             self.bot_user = bot
             self.bot_uid = bot.id
 
+        if self.getConfig.update_log is not None:
+            self.start_recording(self.getConfig.update_log)
+
         self.start_time_us = time.usec()
         await self.dispatch_event("start", self.start_time_us)
 
         self.log.info("Bot is ready")
         await self.dispatch_event("started")
 
+    def register_handlers(self: "Bot") -> None:
+        self.client.add_handler(
+            MessageHandler(
+                self.on_command,
+                filters=(self.command_predicate() & self.outgoing_flt()),
+            ),
+            0,
+        )
+
+        self.client.bot.add_handler(
+            MessageHandler(
+                self.on_command,
+                filters=(self.sudo_command_predicate()),
+                # & self.outgoing_flt()
+            ),
+            0,
+        )
+
+        self.client.add_handler(
+            MessageHandler(self.on_conversation,
+                           filters=self.conversation_predicate()),
+            0,
+        )
+
+        # Runs before module listeners so they never see stale entities
+        self.client.add_handler(
+            MessageHandler(self.on_entity_update, filters=chat_action()),
+            -1,
+        )
+
+    def command_prefixes(self: "Bot", client: Client) -> Tuple[str, ...]:
+        """Returns the prefixes of the commands the client reacts to."""
+
+        if getattr(client, "is_bot", False):
+            return (self.sudoprefix, "/")
+
+        return (self.prefix,)
+
+    def start_recording(self: "Bot", path: Path) -> None:
+        """Records the incoming updates of both clients into the given log."""
+
+        self.recorder = record.UpdateRecorder(path, self.uid,
+                                              self.command_prefixes)
+        self.client.add_handler(MessageHandler(self.recorder.on_message),
+                                RECORDER_GROUP)
+        self.client.add_handler(
+            DeletedMessagesHandler(self.recorder.on_deleted), RECORDER_GROUP)
+        if self.has_bot:
+            # Sudo commands come through the bot client
+            self.client.bot.add_handler(
+                MessageHandler(self.recorder.on_message), RECORDER_GROUP)
+            self.client.bot.add_handler(
+                DeletedMessagesHandler(self.recorder.on_deleted),
+                RECORDER_GROUP)
+            self.client.bot.add_handler(
+                InlineQueryHandler(self.recorder.on_inline_query),
+                RECORDER_GROUP)
+            self.client.bot.add_handler(
+                CallbackQueryHandler(self.recorder.on_callback_query),
+                RECORDER_GROUP)
+
+        self.log.info(f"Recording updates to '{path}'")
+
     async def idle(self: "Bot") -> None:
 
         def signal_handler(_, __):
@@ -230,36 +375,24 @@ class TelegramBot(Base):
         return hasattr(self.client, "bot") and isinstance(
             self.client.bot, Client)
 
-    def redact_message(self: "Bot", text: str) -> str:
-        redacted = "[CONFIDENTIAL]"
+    def update_redactor(self: "Bot") -> None:
+        """Recompiles the redaction pattern if any secret in the config changed."""
 
-        api_id = str(self.getConfig.api_id)
-        api_hash = self.getConfig.api_hash
-        db_uri = self.getConfig.db_uri
-        gdrive_secret = self.getConfig.gdrive_secret
-        string_session = self.getConfig.string_session
-        token = self.getConfig.token
+        config = self.getConfig
+        secrets = [
+            str(config.api_id), config.api_hash, config.db_uri,
+            config.string_session, config.token
+        ]
+        if config.gdrive_secret is not None:
+            secrets += [
+                config.gdrive_secret["installed"].get("client_id"),
+                config.gdrive_secret["installed"].get("client_secret"),
+            ]
 
-        if api_id in text:
-            text = text.replace(api_id, redacted)
-        if api_hash in text:
-            text = text.replace(api_hash, redacted)
-        if db_uri in text:
-            text = text.replace(db_uri, redacted)
-        if gdrive_secret is not None:
-            client_id = gdrive_secret["installed"].get("client_id")
-            client_secret = gdrive_secret["installed"].get("client_secret")
-
-            if client_id in text:
-                text = text.replace(client_id, redacted)
-            if client_secret in text:
-                text = text.replace(client_secret, redacted)
-        if string_session in text:
-            text = text.replace(string_session, redacted)
-        if token is not None and token in text:
-            text = text.replace(token, redacted)
-
-        return text
+        self.redactor.update(secrets)
+
+    def redact_message(self: "Bot", text: str) -> str:
+        return self.redactor.redact(text)
 
     async def respond(
         self: "Bot",
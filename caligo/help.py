@@ -0,0 +1,216 @@
+import re
+from collections import Counter, defaultdict
+from typing import TYPE_CHECKING, Dict, List, MutableMapping, Set, Tuple
+
+from pyrogram.types import InlineKeyboardButton, InlineKeyboardMarkup
+
+from . import util
+
+if TYPE_CHECKING:
+    from .command import Command
+    from .module import Module
+
+# Module buttons per row and rows per page of the inline menu
+MENU_COLUMNS = 3
+MENU_ROWS = 5
+# Minimum similarity of a suggestion and how much description words count
+MIN_SCORE = 0.3
+DESC_WEIGHT = 0.8
+
+WORD_PATTERN = re.compile(r"[a-z0-9]{3,}")
+
+
+def trigrams(term: str) -> Set[str]:
+    padded = f"  {term.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def command_text(cmd: "Command") -> str:
+    aliases = f"`{'`, `'.join(cmd.aliases)}`" if cmd.aliases else "none"
+
+    if cmd.usage is None:
+        args_desc = "none"
+    else:
+        args_desc = cmd.usage
+
+        if cmd.usage_optional:
+            args_desc += " (optional)"
+        if cmd.usage_reply:
+            args_desc += " (also accepts replies)"
+
+    return f"""`{cmd.name}`: **{cmd.desc if cmd.desc else '__No description provided.__'}**
+
+Module: {cmd.module.name}
+Aliases: {aliases}
+Expected parameters: {args_desc}"""
+
+
+class HelpIndex:
+    """Help texts and inline menu built once per module load.
+
+    Command names, aliases, module names and description words are indexed
+    by trigrams so unknown filters get suggestions.
+    """
+
+    commands: Dict[str, str]
+    sections: Dict[str, str]
+    pages: List[str]
+    menu_pages: List[InlineKeyboardMarkup]
+    module_markups: Dict[str, InlineKeyboardMarkup]
+
+    def __init__(self) -> None:
+        self.commands = {}
+        self.sections = {}
+        self.pages = []
+        self.menu_pages = []
+        self.module_markups = {}
+
+        self._module_commands: Dict[str, List[str]] = {}
+        self._module_terms: Dict[str, List[Tuple[str, str]]] = {}
+        self._terms: Dict[str, Set[str]] = {}
+        self._postings: MutableMapping[str, Set[str]] = defaultdict(set)
+        self._targets: MutableMapping[str, Dict[str,
+                                                float]] = defaultdict(dict)
+
+        self._build_pages()
+
+    def _add_term(self, mod_name: str, term: str, target: str,
+                  weight: float) -> None:
+        term = term.lower()
+        if term not in self._terms:
+            self._terms[term] = trigrams(term)
+            for tri in self._terms[term]:
+                self._postings[tri].add(term)
+
+        targets = self._targets[term]
+        targets[target] = max(targets.get(target, 0), weight)
+        self._module_terms[mod_name].append((term, target))
+
+    def _remove_term(self, term: str, target: str) -> None:
+        targets = self._targets.get(term)
+        if targets is None:
+            return
+
+        targets.pop(target, None)
+        if targets:
+            return
+
+        del self._targets[term]
+        for tri in self._terms.pop(term):
+            self._postings[tri].discard(term)
+            if not self._postings[tri]:
+                del self._postings[tri]
+
+    def add_module(self, mod: "Module", cmds: List["Command"]) -> None:
+        name = mod.name
+        self.remove_module(name, rebuild=False)
+
+        self._module_commands[name] = []
+        self._module_terms[name] = []
+        self._add_term(name, name, name, 1)
+
+        section: Dict[str, str] = {}
+        for cmd in sorted(cmds, key=lambda cmd: cmd.name):
+            text = command_text(cmd)
+            for key in (cmd.name, *cmd.aliases):
+                self.commands[key] = text
+                self._module_commands[name].append(key)
+                self._add_term(name, key, cmd.name, 1)
+
+            for word in set(WORD_PATTERN.findall((cmd.desc or "").lower())):
+                self._add_term(name, word, cmd.name, DESC_WEIGHT)
+
+            desc = cmd.desc if cmd.desc else "__No description provided__"
+            aliases = ""
+            if cmd.aliases:
+                aliases = f' (aliases: {", ".join(cmd.aliases)})'
+            section[cmd.name] = desc + aliases
+
+        if section:
+            self.sections[name] = util.text.join_map(section, heading=name)
+
+        self._build_pages()
+
+    def remove_module(self, name: str, *, rebuild: bool = True) -> None:
+        for key in self._module_commands.pop(name, []):
+            self.commands.pop(key, None)
+        for term, target in self._module_terms.pop(name, []):
+            self._remove_term(term, target)
+        self.sections.pop(name, None)
+
+        if rebuild:
+            self._build_pages()
+
+    def _build_pages(self) -> None:
+        self.pages = []
+        page = ""
+        for name in sorted(self.sections):
+            section = self.sections[name]
+            if page and len(page) + len(section) + 2 > util.tg.MESSAGE_CHAR_LIMIT:
+                self.pages.append(page)
+                page = ""
+
+            page = f"{page}\n\n{section}" if page else section
+        if page:
+            self.pages.append(page)
+
+        names = sorted(self._module_commands)
+        per_page = MENU_COLUMNS * MENU_ROWS
+        chunks = [
+            names[i:i + per_page] for i in range(0, len(names), per_page)
+        ] or [[]]
+
+        self.menu_pages = []
+        self.module_markups = {}
+        for num, chunk in enumerate(chunks):
+            rows = [[
+                InlineKeyboardButton(name,
+                                     callback_data=f"menu({name})".encode())
+                for name in chunk[i:i + MENU_COLUMNS]
+            ]
+                    for i in range(0, len(chunk), MENU_COLUMNS)]
+
+            nav = []
+            if num > 0:
+                nav.append(
+                    InlineKeyboardButton(
+                        "⇠ Prev", callback_data=f"menu(Page{num - 1})".encode()))
+            if num < len(chunks) - 1:
+                nav.append(
+                    InlineKeyboardButton(
+                        "Next ⇢", callback_data=f"menu(Page{num + 1})".encode()))
+            if nav:
+                rows.append(nav)
+
+            rows.append([
+                InlineKeyboardButton("✗ Close",
+                                     callback_data="menu(Close)".encode())
+            ])
+            self.menu_pages.append(InlineKeyboardMarkup(rows))
+
+            # Back from a module returns to the page it's listed on
+            back = InlineKeyboardMarkup([[
+                InlineKeyboardButton("⇠ Back",
+                                     callback_data=f"menu(Page{num})".encode())
+            ]])
+            for name in chunk:
+                self.module_markups[name] = back
+
+    def search(self, query: str, limit: int = 5) -> List[str]:
+        """Returns the command and module names closest to the query."""
+
+        query_tris = trigrams(query)
+        shared: Counter = Counter()
+        for tri in query_tris:
+            for term in self._postings.get(tri, ()):
+                shared[term] += 1
+
+        scores: Dict[str, float] = {}
+        for term, count in shared.items():
+            similarity = 2 * count / (len(query_tris) + len(self._terms[term]))
+            for target, weight in self._targets[term].items():
+                score = similarity * weight
+                if score >= MIN_SCORE and score > scores.get(target, 0):
+                    scores[target] = score
+
+        return sorted(scores, key=lambda target: -scores[target])[:limit]
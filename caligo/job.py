@@ -0,0 +1,111 @@
+import asyncio
+from typing import TYPE_CHECKING, Any, Awaitable, Optional, TypeVar
+
+import pyrogram
+
+from . import util
+
+if TYPE_CHECKING:
+    from .core import Bot
+
+Result = TypeVar("Result")
+
+RUNNING = "running"
+DONE = "done"
+FAILED = "failed"
+CANCELLED = "cancelled"
+
+
+class Job:
+    """Cancellable work tracked by the bot, see Bot.job().
+
+    Used as an async context manager, the job is finished on exit with a state
+    depending on how the block ended.
+    """
+
+    id: int
+    name: str
+    chat_id: Optional[int]
+    message_id: Optional[int]
+    gid: Optional[str]
+    state: str
+    cancelled: bool
+    created: int
+    finished: Optional[int]
+
+    msg: Optional[pyrogram.types.Message]
+    task: Optional[asyncio.Task]
+
+    # Progress bookkeeping of util.progress
+    progress_start: Optional[int]
+    progress_update: int
+    transferred: int
+
+    def __init__(self,
+                 bot: "Bot",
+                 job_id: int,
+                 name: str,
+                 msg: Optional[pyrogram.types.Message] = None,
+                 gid: Optional[str] = None) -> None:
+        self.bot = bot
+        self.id = job_id
+        self.name = name
+        self.msg = msg
+        self.chat_id = msg.chat.id if msg is not None else None
+        self.message_id = msg.message_id if msg is not None else None
+        self.gid = gid
+        self.state = RUNNING
+        self.cancelled = False
+        self.created = util.time.sec()
+        self.finished = None
+        self.task = None
+
+        self.progress_start = None
+        self.progress_update = 0
+        self.transferred = 0
+
+    @property
+    def done(self) -> bool:
+        return self.state != RUNNING
+
+    async def run(self, coro: Awaitable[Result]) -> Result:
+        """Awaits the coroutine in a task cancelled along with the job."""
+
+        if self.cancelled:
+            if asyncio.iscoroutine(coro):
+                coro.close()
+            raise asyncio.CancelledError
+
+        self.task = asyncio.ensure_future(coro)
+        try:
+            return await self.task
+        finally:
+            self.task = None
+
+    def cancel(self) -> bool:
+        """Requests cancellation, False if the job already finished."""
+
+        if self.done:
+            return False
+
+        self.cancelled = True
+        if self.task is not None:
+            self.task.cancel()
+
+        return True
+
+    async def __aenter__(self) -> "Job":
+        return self
+
+    async def __aexit__(self, exc_type: Any, *_: Any) -> None:
+        if self.cancelled or exc_type is asyncio.CancelledError:
+            state = CANCELLED
+        elif exc_type is not None:
+            state = FAILED
+        else:
+            state = DONE
+
+        self.bot.finish_job(self, state)
+
+    def __repr__(self) -> str:
+        return f"<Job #{self.id} {self.name} {self.state}>"
@@ -3,7 +3,7 @@ import asyncio
 import logging
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, ClassVar, Dict, Optional, Set, Tuple, Union
+from typing import Any, ClassVar, Dict, Optional, Tuple, Union
 from urllib import parse
 
 import pyrogram
@@ -18,13 +18,12 @@ from tenacity import (
     wait_random_exponential,
 )
 
-from .. import module, util
+from .. import job, module, util
 
 
 class Aria2WebSocketServer:
     log: ClassVar[logging.Logger] = logging.getLogger("Aria2WS")
 
-    cancelled: Set[str]
     downloads: Dict[str, util.aria2.Download]
     lock: asyncio.Lock
     uploads: Dict[str, Union[MediaFileUpload, Dict[str, Union[asyncio.Task,
@@ -43,7 +42,6 @@ class Aria2WebSocketServer:
         self.lock = asyncio.Lock()
         self.log = Aria2WebSocketServer.log
 
-        self.cancelled = set()
         self.downloads = {}
         self.uploads = {}
 
@@ -122,6 +120,12 @@ class Aria2WebSocketServer:
     def count(self) -> int:
         return len(self.downloads)
 
+    def _remove(self, gid: str, state: str) -> None:
+        self.downloads.pop(gid, None)
+        download_job = self.bot.get_gid_job(gid)
+        if download_job is not None:
+            self.bot.finish_job(download_job, state)
+
     async def checkDelete(self) -> None:
         if self.count == 0 and self.invoker is not None:
             await self.invoker.delete()
@@ -137,6 +141,8 @@ class Aria2WebSocketServer:
         gid = data["params"][0]["gid"]
         async with self.lock:
             self.downloads[gid] = await self.getDownload(client, gid)
+            if self.bot.get_gid_job(gid) is None:
+                self.bot.job("aria2", gid=gid)
         self.log.info(f"Starting download: [gid: '{gid}']")
 
     async def onDownloadComplete(self, client: Aria2WebsocketClient,
@@ -147,10 +153,14 @@ class Aria2WebSocketServer:
             self.downloads[gid] = await self.getDownload(client, gid)
             file = self.downloads[gid]
             if file.metadata is True:
-                del self.downloads[gid]
+                self._remove(gid, job.DONE)
                 self.log.info(f"Complete download: [gid: '{gid}'] - Metadata")
                 return
 
+        util.metrics.transfer_bytes.inc(file.completed_length,
+                                        service="aria2",
+                                        direction="download")
+
         if file.is_file:
             async with self.lock:
                 self.uploads[gid] = await self.drive.uploadFile(file)
@@ -177,7 +187,7 @@ class Aria2WebSocketServer:
             if not cancelled:
                 async with self.lock:
                     del self.uploads[gid]
-                    del self.downloads[gid]
+                    self._remove(gid, job.DONE)
 
                 folderLink = (
                     f"**GoogleDrive folderLink**: [{file.name}]"
@@ -207,7 +217,7 @@ class Aria2WebSocketServer:
 
         else:
             async with self.lock:
-                del self.downloads[gid]
+                self._remove(gid, job.FAILED)
             self.log.warning(f"Can't upload '{file.name}', "
                              f"due to '{file.dir}' is not accessible")
 
@@ -244,7 +254,7 @@ class Aria2WebSocketServer:
 
         self.log.warning(f"[gid: '{gid}']: {file.error_message}")
         async with self.lock:
-            del self.downloads[file.gid]
+            self._remove(file.gid, job.FAILED)
             await self.checkDelete()
 
     @retry(
@@ -311,11 +321,17 @@ class Aria2WebSocketServer:
     async def updateProgress(self) -> None:
         last_update_time = None
         while not self.stopping:
-            for gid in self.cancelled.copy():
+            for gid in list(self.downloads):
+                download_job = self.bot.get_gid_job(gid)
+                if download_job is None or not download_job.cancelled:
+                    continue
+
                 async with self.lock:
-                    file = self.downloads[gid]
-                    if gid in self.downloads:
-                        del self.downloads[gid]
+                    # It may have finished while waiting for the lock
+                    file = self.downloads.get(gid)
+                    if file is None:
+                        continue
+
                     if file.is_file and gid in self.uploads:
                         del self.uploads[gid]
                     elif file.is_dir and gid in self.uploads:
@@ -324,7 +340,7 @@ class Aria2WebSocketServer:
                                 task.cancel()
                         await self.uploads[gid]["generator"].aclose()
                         del self.uploads[gid]
-                    self.cancelled.remove(gid)
+                    self._remove(gid, job.CANCELLED)
                     await self.checkDelete()
 
             progress = await self.checkProgress()
@@ -403,6 +419,9 @@ class Aria2WebSocketServer:
             return progress, False
 
         file_size = response.get("size")
+        util.metrics.transfer_bytes.inc(int(file_size),
+                                        service="drive",
+                                        direction="upload")
         mirrorLink = response.get("webContentLink")
         fileLink = (f"**GoogleDrive Link**: [{file.name}]({mirrorLink}) "
                     f"(__{human(int(file_size))}__)")
@@ -416,7 +435,7 @@ class Aria2WebSocketServer:
         async with self.lock:
             await self.bot.respond(self.invoker, text=fileLink, mode="reply")
             del self.uploads[file.gid]
-            del self.downloads[file.gid]
+            self._remove(file.gid, job.DONE)
             await self.checkDelete()
 
         return None, True
@@ -460,7 +479,8 @@ class Aria2(module.Module):
 
     async def _formatSE(self, err: Exception) -> str:
         res = await util.run_sync(ast.literal_eval,
-                                  str(err).split(":", 2)[-1].strip())
+                                  str(err).split(":", 2)[-1].strip(),
+                                  pool="cpu")
         return "__" + res["error"]["message"] + "__"
 
     async def addDownload(self, types: Union[str, bytes],
@@ -508,5 +528,10 @@ class Aria2(module.Module):
         elif status == "complete" and metadata is True:
             return "__GID belongs to finished Metadata, can't be abort.__"
 
-        self._ws.cancelled.add(gid)
+        download_job = self.bot.get_gid_job(gid)
+        if download_job is not None:
+            download_job.cancel()
+            # Nothing left for the progress loop to clean up
+            if gid not in self._ws.downloads:
+                self.bot.finish_job(download_job, job.CANCELLED)
         return ret
@@ -1,7 +1,6 @@
 import platform
 import uuid
-from collections import defaultdict
-from typing import ClassVar, Dict, List, MutableMapping
+from typing import ClassVar, Dict
 
 import pyrogram
 from motor.motor_asyncio import AsyncIOMotorDatabase
@@ -27,23 +26,6 @@ class CoreModule(module.Module):
         self.cache = {}
         self.db = self.bot.get_db("core")
 
-    def build_button(self) -> List[List[InlineKeyboardButton]]:
-        modules = list(self.bot.modules.keys())
-        button: List[InlineKeyboardButton] = []
-        for mod in modules:
-            button.append(
-                InlineKeyboardButton(mod,
-                                     callback_data=f"menu({mod})".encode()))
-        buttons = [
-            button[i * 3:(i + 1) * 3] for i in range((len(button) + 3 - 1) // 3)
-        ]
-        buttons.append([
-            InlineKeyboardButton("✗ Close",
-                                 callback_data="menu(Close)".encode())
-        ])
-
-        return buttons
-
     @listener.pattern(r"^help$")
     async def on_inline_query(self, query: InlineQuery) -> None:
         repo = self.bot.getConfig.github_repo
@@ -67,7 +49,6 @@ class CoreModule(module.Module):
             )
         ]
         if query.from_user and (query.from_user.id == self.bot.uid):
-            button = await util.run_sync(self.build_button)
             answer.append(
                 InlineQueryResultArticle(
                     id=uuid.uuid4(),
@@ -77,7 +58,7 @@ class CoreModule(module.Module):
                     url=f"https://github.com/{repo}",
                     description="Menu Helper.",
                     thumb_url=None,
-                    reply_markup=InlineKeyboardMarkup(button),
+                    reply_markup=self.bot.help_index.menu_pages[0],
                 ))
 
         await query.answer(results=answer, cache_time=3)
@@ -90,15 +71,16 @@ class CoreModule(module.Module):
                                show_alert=True)
             return
 
+        index = self.bot.help_index
         mod = query.matches[0].group(1)
-        if mod == "Back":
-            button = await util.run_sync(self.build_button)
+        if mod == "Back" or mod.startswith("Page"):
+            page = int(mod[4:]) if mod[4:].isdigit() else 0
             await query.edit_message_text(
                 "**Caligo Menu Helper**",
-                reply_markup=InlineKeyboardMarkup(button))
+                reply_markup=index.menu_pages[min(page,
+                                                  len(index.menu_pages) - 1)])
             return
         if mod == "Close":
-            button = await util.run_sync(self.build_button)
             for msg_id, chat_id in list(self.cache.items()):
                 try:
                     msg = await self.bot.client.get_messages(chat_id, msg_id)
@@ -118,36 +100,16 @@ class CoreModule(module.Module):
                 await query.answer("😿️ Couldn't close expired message")
                 await query.edit_message_text(
                     "**Caligo Menu Helper**",
-                    reply_markup=InlineKeyboardMarkup(button[:-1]),
+                    reply_markup=InlineKeyboardMarkup(
+                        index.menu_pages[0].inline_keyboard[:-1]),
                 )
 
             return
 
-        modules: MutableMapping[str, MutableMapping[str,
-                                                    str]] = defaultdict(dict)
-        for _, cmd in self.bot.commands.items():
-            if cmd.module.name != mod:
-                continue
-
-            desc = cmd.desc if cmd.desc else "__No description provided__"
-            aliases = ""
-            if cmd.aliases:
-                aliases = f' (aliases: {", ".join(cmd.aliases)})'
-
-            mod_name = type(cmd.module).name
-            modules[mod_name][cmd.name] = desc + aliases
-
-        response = None
-        for mod_name, commands in sorted(modules.items()):
-            response = util.text.join_map(commands, heading=mod_name)
-
+        response = index.sections.get(mod)
         if response is not None:
-            button = [[
-                InlineKeyboardButton("⇠ Back",
-                                     callback_data="menu(Back)".encode())
-            ]]
             await query.edit_message_text(
-                response, reply_markup=InlineKeyboardMarkup(button))
+                response, reply_markup=index.module_markups[mod])
 
             return
 
@@ -167,65 +129,26 @@ class CoreModule(module.Module):
 
             return
 
+        index = self.bot.help_index
         filt = ctx.input
-        modules: MutableMapping[str, MutableMapping[str,
-                                                    str]] = defaultdict(dict)
-        if filt and filt not in self.bot.modules:
-            if filt in self.bot.commands:
-                cmd = self.bot.commands[filt]
-
-                aliases = f"`{'`, `'.join(cmd.aliases)}`" if cmd.aliases else "none"
-
-                if cmd.usage is None:
-                    args_desc = "none"
-                else:
-                    args_desc = cmd.usage
-
-                    if cmd.usage_optional:
-                        args_desc += " (optional)"
-                    if cmd.usage_reply:
-                        args_desc += " (also accepts replies)"
-
-                return f"""`{cmd.name}`: **{cmd.desc if cmd.desc else '__No description provided.__'}**
+        if not filt:
+            for page in index.pages:
+                await ctx.respond_multi(page)
 
-Module: {cmd.module.name}
-Aliases: {aliases}
-Expected parameters: {args_desc}"""
+            return
 
-            return "__That filter didn't match any commands or modules.__"
+        if filt in self.bot.modules:
+            return index.sections.get(
+                filt, f"__{filt} doesn't have any commands.__")
+        if filt in index.commands:
+            return index.commands[filt]
 
-        for name, cmd in self.bot.commands.items():
-            if filt:
-                if cmd.module.name != filt:
-                    continue
-            else:
-                if name != cmd.name:
-                    continue
-
-            desc = cmd.desc if cmd.desc else "__No description provided__"
-            aliases = ""
-            if cmd.aliases:
-                aliases = f' (aliases: {", ".join(cmd.aliases)})'
-
-            mod_name = type(cmd.module).name
-            modules[mod_name][cmd.name] = desc + aliases
-
-        response = None
-        for mod_name, commands in sorted(modules.items()):
-            section = util.text.join_map(commands, heading=mod_name)
-            add_len = len(section) + 2
-            if response and (len(response) + add_len >
-                             util.tg.MESSAGE_CHAR_LIMIT):
-                await ctx.respond_multi(response)
-                response = None
-
-            if response:
-                response += "\n\n" + section
-            else:
-                response = section
+        suggestions = index.search(filt)
+        if suggestions:
+            return ("__That filter didn't match any commands or modules.__\n"
+                    f"Did you mean: `{'`, `'.join(suggestions)}`?")
 
-        if response:
-            await ctx.respond_multi(response)
+        return "__That filter didn't match any commands or modules.__"
 
     @command.desc("Get or change this bot prefix")
     @command.alias("setprefix", "getprefix")
@@ -1,15 +1,36 @@
+import asyncio
+import copy
+import cProfile
+import io
+import pstats
+import sys
+import tempfile
+import time
 from datetime import datetime
-from typing import ClassVar
+from typing import Any, Callable, ClassVar, List, Optional
 
 import aiohttp
+import ujson
 from pyrogram.errors import PeerIdInvalid, UsernameInvalid
 
 from .. import command, module, util
 
 
+# Functions listed in the .profile reply
+PROFILE_TOP = 25
+# Since 3.12 only one profiler can be active per interpreter, and it already
+# sees the calls made by every thread
+NESTED_PROFILERS = sys.version_info < (3, 12)
+
+
 class DebugModule(module.Module):
     name: ClassVar[str] = "Debug"
 
+    profile_lock: asyncio.Lock
+
+    async def on_load(self) -> None:
+        self.profile_lock = asyncio.Lock()
+
     @command.desc("Pong")
     async def cmd_ping(self, ctx: command.Context):
         start = datetime.now()
@@ -19,6 +40,123 @@ class DebugModule(module.Module):
 
         return f"Request response time: **{latency} ms**"
 
+    @command.desc("Run a command under the profiler")
+    @command.usage("[command] [arguments?]")
+    @command.alias("prof")
+    async def cmd_profile(self, ctx: command.Context) -> Optional[str]:
+        if not ctx.args:
+            return "Give me a command to profile."
+
+        cmd = self.bot.commands.get(ctx.args[0])
+        if cmd is None:
+            return f"__Command__ `{ctx.args[0]}` __doesn't exist.__"
+        if cmd.name == "profile":
+            return "__Can't profile the profiler.__"
+        if self.profile_lock.locked():
+            return "__Another command is being profiled.__"
+
+        # Dispatch a copy of the message as if the command was sent directly
+        msg = copy.copy(ctx.msg)
+        msg.text = self.bot.prefix + ctx.input
+        msg.segments = ctx.args
+
+        profiler = cProfile.Profile()
+        sync_profiles: List[cProfile.Profile] = []
+        sync_times: List[float] = []
+
+        def observe(call: Callable[[], Any]) -> Any:
+            # Runs on the executor thread
+            start = time.perf_counter()
+            if not NESTED_PROFILERS:
+                try:
+                    return call()
+                finally:
+                    sync_times.append(time.perf_counter() - start)
+
+            sync_profiler = cProfile.Profile()
+            try:
+                return sync_profiler.runcall(call)
+            finally:
+                sync_times.append(time.perf_counter() - start)
+                sync_profiles.append(sync_profiler)
+
+        async with self.profile_lock:
+            token = util.async_helpers.sync_observer.set(observe)
+            wall_start = time.perf_counter()
+            cpu_start = time.thread_time()
+            profiler.enable()
+            try:
+                await self.bot.on_command(ctx.client, msg)
+            finally:
+                profiler.disable()
+                cpu = time.thread_time() - cpu_start
+                wall = time.perf_counter() - wall_start
+                util.async_helpers.sync_observer.reset(token)
+
+        out = io.StringIO()
+        stats = pstats.Stats(profiler, stream=out)
+        if sync_profiles:
+            stats.add(*sync_profiles)
+        stats.strip_dirs().sort_stats("cumulative").print_stats(PROFILE_TOP)
+
+        # Drop the header, the table starts at the column names
+        table = out.getvalue()
+        table = table[table.find("   ncalls"):].rstrip()
+        summary = util.text.join_map(
+            {
+                "Wall time": f"{wall * 1000:.1f} ms",
+                "Event loop CPU time": f"{cpu * 1000:.1f} ms",
+                "run_sync calls": f"{len(sync_times)} "
+                                  f"({sum(sync_times) * 1000:.1f} ms)",
+            },
+            heading=f"Profile of {cmd.name}")
+        await ctx.respond(
+            f"{summary}\n\n__Other tasks running meanwhile are "
+            f"included.__\n```{table[:util.tg.MESSAGE_CHAR_LIMIT - 512]}```",
+            mode="reply")
+
+        with tempfile.NamedTemporaryFile(suffix=".prof") as f:
+            await util.run_sync(stats.dump_stats, f.name)
+            await ctx.msg.reply_document(f.name,
+                                         file_name=f"{cmd.name}.prof",
+                                         caption="Open with `snakeviz` or "
+                                         "`python -m pstats`")
+
+        return None
+
+    @command.desc("Show the waterfall of a recent command, -l to list them "
+                  "and -e to export it as JSON")
+    @command.usage("[-l|-e?] [trace number?]", optional=True)
+    async def cmd_trace(self, ctx: command.Context) -> Optional[str]:
+        traces = list(reversed(util.tracing.traces))
+        if not traces:
+            return "__No command has been traced yet.__"
+
+        if "-l" in ctx.flags:
+            return "\n".join(
+                f"`{num}` **{trace.name}** {trace.duration * 1000:.1f} ms, "
+                f"{trace.span_count + trace.dropped} spans"
+                for num, trace in enumerate(traces, start=1))
+
+        num = ctx.filtered_input
+        if num and (not num.isdigit() or not 1 <= int(num) <= len(traces)):
+            return f"__Trace number must be between 1 and {len(traces)}.__"
+        trace = traces[int(num) - 1 if num else 0]
+
+        if "-e" in ctx.flags:
+            data = await util.run_sync(ujson.dumps,
+                                        trace.to_dict(),
+                                        indent=2,
+                                        pool="cpu")
+            with io.BytesIO(data.encode()) as f:
+                f.name = f"trace-{trace.name}.json"
+                await ctx.msg.reply_document(f)
+            return None
+
+        return (f"**Trace of** `{trace.name}` "
+                f"({trace.duration * 1000:.1f} ms)\n"
+                f"```{util.tracing.waterfall(trace)}```")
+
     @command.desc("Send text")
     @command.usage("[text to send]")
     async def cmd_echo(self, ctx: command.Context) -> str:
@@ -56,7 +194,7 @@ class DebugModule(module.Module):
                 entity_ref = ctx.input
 
             try:
-                entity = await self.bot.client.get_chat(entity_ref)
+                entity = await self.bot.get_chat(entity_ref)
             except (UsernameInvalid, PeerIdInvalid):
                 return f"Error getting entity `{entity_ref}`"
         elif ctx.msg.reply_to_message:
@@ -3,9 +3,8 @@ import base64
 import pickle
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, AsyncIterator, ClassVar, Dict, Optional, Set, Tuple, Union
+from typing import Any, AsyncIterator, ClassVar, Dict, Optional, Union
 
-import aiofile
 import pyrogram
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
@@ -29,7 +28,6 @@ class GoogleDrive(module.Module):
     aria2: Any
     index_link: str
     parent_id: str
-    task: Set[Tuple[int, asyncio.Task]]
 
     async def on_load(self) -> None:
         self.db = self.bot.get_db("gdrive")
@@ -44,10 +42,11 @@ class GoogleDrive(module.Module):
 
         self.index_link = self.bot.getConfig.gdrive_index_link
         self.parent_id = self.bot.getConfig.gdrive_folder_id
-        self.task = set()
 
         if data:
-            self.creds = await util.run_sync(pickle.loads, data.get("creds"))
+            self.creds = await util.run_sync(pickle.loads,
+                                             data.get("creds"),
+                                             pool="cpu")
             # service will be overwrite if credentials is expired
             self.service = await util.run_sync(build,
                                                "drive",
@@ -108,7 +107,7 @@ class GoogleDrive(module.Module):
                     "or does not match the redirection URI.__")
 
         self.creds = flow.credentials
-        credential = await util.run_sync(pickle.dumps, self.creds)
+        credential = await util.run_sync(pickle.dumps, self.creds, pool="cpu")
 
         await self.db.find_one_and_update({"_id": self.name},
                                           {"$set": {
@@ -126,7 +125,9 @@ class GoogleDrive(module.Module):
                 self.log.info("Refreshing credentials")
                 await util.run_sync(self.creds.refresh, Request())
 
-                credential = await util.run_sync(pickle.dumps, self.creds)
+                credential = await util.run_sync(pickle.dumps,
+                                                 self.creds,
+                                                 pool="cpu")
                 await self.db.find_one_and_update(
                     {"_id": self.name}, {"$set": {
                         "creds": credential
@@ -307,39 +308,27 @@ class GoogleDrive(module.Module):
         if ctx.msg.reply_to_message:
             reply_msg = ctx.msg.reply_to_message
 
-            if reply_msg.media:
-                task = self.bot.loop.create_task(
-                    self.downloadFile(ctx, reply_msg))
-                self.task.add((ctx.msg.message_id, task))
-                try:
-                    await task
-                except asyncio.CancelledError:
-                    return "__Transmission aborted.__"
-                else:
-                    path = task.result()
-                    self.task.remove((ctx.msg.message_id, task))
-
-                if path.suffix == ".torrent":
-                    async with aiofile.async_open(path, "rb") as afp:
-                        types = base64.b64encode(await afp.read())
-                else:
-                    file = util.File(path)
-                    files = await self.uploadFile(file)
-                    file.content, file.invoker = files, ctx.msg
-                    file.start_time = util.time.sec()
-                    if self.index_link is not None:
-                        file.index_link = self.index_link
-
-                    task = self.bot.loop.create_task(file.progress())
-                    self.task.add((ctx.msg.message_id, task))
+            if (reply_msg.document and reply_msg.document.file_name and
+                    reply_msg.document.file_name.endswith(".torrent")):
+                types = base64.b64encode(await util.tg.fetch_media_bytes(
+                    self.bot.client, reply_msg))
+            elif reply_msg.media:
+                async with self.bot.job("gdmirror", ctx.msg) as job:
                     try:
-                        await task
+                        path = await job.run(self.downloadFile(ctx, reply_msg))
+
+                        file = util.File(path)
+                        files = await self.uploadFile(file)
+                        file.content, file.invoker = files, ctx.msg
+                        file.start_time = util.time.sec()
+                        if self.index_link is not None:
+                            file.index_link = self.index_link
+
+                        await job.run(file.progress())
                     except asyncio.CancelledError:
                         return "__Transmission aborted.__"
-                    else:
-                        self.task.remove((ctx.msg.message_id, task))
 
-                    return
+                return
             elif reply_msg.text:
                 types = reply_msg.text
             else:
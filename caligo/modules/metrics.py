@@ -0,0 +1,67 @@
+import asyncio
+from typing import ClassVar, Optional
+
+from aiohttp import web
+
+from .. import command, module, util
+
+# Seconds between two event loop lag measures
+LAG_INTERVAL = 1
+
+
+class MetricsModule(module.Module):
+    name: ClassVar[str] = "Metrics"
+
+    lag_task: Optional[asyncio.Task]
+    runner: Optional[web.AppRunner]
+
+    async def on_load(self) -> None:
+        self.lag_task = None
+        self.runner = None
+
+    async def monitor_lag(self) -> None:
+        while True:
+            before = self.bot.loop.time()
+            await asyncio.sleep(LAG_INTERVAL)
+            util.metrics.loop_lag.set(self.bot.loop.time() - before -
+                                      LAG_INTERVAL)
+
+    async def on_start(self, time_us: int) -> None:  # skipcq: PYL-W0613
+        self.lag_task = self.bot.loop.create_task(self.monitor_lag())
+
+        port = self.bot.getConfig.metrics_port
+        if port is None:
+            return
+
+        app = web.Application()
+        app.router.add_get("/metrics", self.handle_metrics)
+        self.runner = web.AppRunner(app, access_log=None)
+        await self.runner.setup()
+
+        host = self.bot.getConfig.metrics_host
+        await web.TCPSite(self.runner, host, port).start()
+        self.log.info(f"Serving metrics on http://{host}:{port}/metrics")
+
+    async def on_stop(self) -> None:
+        if self.lag_task is not None:
+            self.lag_task.cancel()
+        if self.runner is not None:
+            await self.runner.cleanup()
+
+    @staticmethod
+    async def handle_metrics(_: web.Request) -> web.Response:
+        return web.Response(
+            body=util.metrics.registry.render().encode(),
+            headers={"Content-Type": "text/plain; version=0.0.4; charset=utf-8"})
+
+    @command.desc("Show the current metrics")
+    @command.usage("[metric name filter?]", optional=True)
+    async def cmd_metrics(self, ctx: command.Context) -> str:
+        lines = [
+            line for line in util.metrics.registry.render().splitlines()
+            if not line.startswith("#") and ctx.input in line
+        ]
+        if not lines:
+            return "__No metrics recorded yet.__"
+
+        return "```" + "\n".join(lines) + "```"
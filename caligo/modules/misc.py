@@ -1,21 +1,16 @@
 import asyncio
 import urllib.parse
 from datetime import datetime, timedelta
-from itertools import zip_longest
 from pathlib import Path
-from typing import ClassVar, Optional, Set, Tuple, Union
+from typing import ClassVar, Optional, Tuple
 
 from .. import command, module, util
+from ..job import Job
 
 
 class Misc(module.Module):
     name: ClassVar[str] = "Misc"
 
-    task: Set[Tuple[int, asyncio.Task]]
-
-    async def on_load(self) -> None:
-        self.task = set()
-
     @command.desc("Generate a LMGTFY link (Let Me Google That For You)")
     @command.usage("[search query]")
     async def cmd_lmgtfy(self, ctx: command.Context) -> str:
@@ -75,18 +70,15 @@ class Misc(module.Module):
 
                 last_update_time = now
 
-        task = self.bot.loop.create_task(
-            self.bot.client.send_document(ctx.msg.chat.id,
-                                          file_path,
-                                          force_document=True,
-                                          progress=prog_func))
-        self.task.add((ctx.msg.message_id, task))
-        try:
-            await task
-        except asyncio.CancelledError:
-            return "__Transmission aborted.__"
-        else:
-            self.task.remove((ctx.msg.message_id, task))
+        async with self.bot.job("upload", ctx.msg) as job:
+            try:
+                await job.run(
+                    self.bot.client.send_document(ctx.msg.chat.id,
+                                                  file_path,
+                                                  force_document=True,
+                                                  progress=prog_func))
+            except asyncio.CancelledError:
+                return "__Transmission aborted.__"
 
         await ctx.msg.delete()
         return
@@ -99,31 +91,12 @@ class Misc(module.Module):
         if ctx.msg.reply_to_message and ctx.input:
             return "__Can't pass gid while replying to message.__"
         aria2 = self.bot.modules.get("Aria2")
-        drive = self.bot.modules.get("GoogleDrive")
 
         if ctx.msg.reply_to_message:
             reply_msg = ctx.msg.reply_to_message
-            msg_id = reply_msg.message_id
-
-            i: Union[Tuple[int, asyncio.Task], None]
-            j: Union[Tuple[int, asyncio.Task], None]
-            for i, j in zip_longest(drive.task.copy(), self.task.copy()):
-                if i is not None:
-                    m_id = i[0]
-                    task = i[1]
-                    if m_id == msg_id:
-                        task.cancel()
-                        drive.task.remove((m_id, task))
-                        break
-
-                if j is not None:
-                    m_id = j[0]
-                    task = j[1]
-                    if m_id == msg_id:
-                        task.cancel()
-                        self.task.remove((m_id, task))
-                        break
-            else:
+            job = self.bot.get_message_job(reply_msg.chat.id,
+                                           reply_msg.message_id)
+            if job is None or not job.cancel():
                 return "__The message you choose is not in task.__"
 
             await ctx.msg.delete()
@@ -144,6 +117,48 @@ class Misc(module.Module):
     async def cmd_cancel(self, ctx: command.Context) -> Tuple[str, int]:
         reply = ctx.msg.reply_to_message
         if reply:
-            reply.cancel_the_process()
+            job = self.bot.get_message_job(reply.chat.id, reply.message_id)
+            if job is None or not job.cancel():
+                return "`no running job for that message`", 5
             return "`added your request to the cancel list`", 5
         return "`reply to the message you want to cancel`", 5
+
+    @staticmethod
+    def _format_job(job: Job, now: int) -> str:
+        duration = util.time.format_duration_td
+        line = f"`#{job.id}` **{job.name}** __{job.state}__"
+        if job.done:
+            line += f" {duration(now - job.finished)} ago"
+        else:
+            line += f" for {duration(now - job.created)}"
+        if job.gid is not None:
+            line += f" gid `{job.gid}`"
+        elif job.chat_id is not None:
+            line += f" in `{job.chat_id}`"
+        if job.cancelled and not job.done:
+            line += " (cancelling)"
+
+        return line
+
+    @command.desc("List the running jobs, -a to include the finished ones "
+                  "and -c for the current chat only")
+    @command.usage("[-a|-c?]", optional=True)
+    async def cmd_jobs(self, ctx: command.Context) -> str:
+        chat_id = ctx.msg.chat.id if "-c" in ctx.flags else None
+        if chat_id is not None:
+            jobs = self.bot.get_chat_jobs(chat_id)
+        else:
+            jobs = list(self.bot.jobs.values())
+        if "-a" in ctx.flags:
+            jobs += [
+                job for job in reversed(self.bot.job_history)
+                if chat_id is None or job.chat_id == chat_id
+            ]
+
+        now = util.time.sec()
+        lines = [self._format_job(job, now) for job in jobs]
+
+        if not lines:
+            return "__No jobs.__"
+
+        return "\n".join(lines)
@@ -1,11 +1,26 @@
+import asyncio
+from collections import Counter
 from datetime import datetime
-from typing import ClassVar, List, Optional
+from typing import (
+    AsyncIterator,
+    Callable,
+    ClassVar,
+    Dict,
+    List,
+    Optional,
+    Union,
+)
 
 import pyrogram
 from pyrogram.errors import MessageDeleteForbidden
 
 from .. import command, module, util
 
+# Bans running at once, FloodWait is still honored on top of this
+MAX_CONCURRENT_ACTIONS = 5
+# Delete requests of 100 messages running at once
+MAX_CONCURRENT_DELETES = 3
+
 
 class ModerationModule(module.Module):
     name: ClassVar[str] = "Moderation"
@@ -51,11 +66,28 @@ class ModerationModule(module.Module):
                                        tag="admin",
                                        user_filter="administrators")
 
+    async def resolve_users(
+        self, user_ids: List[int]
+    ) -> Dict[int, Union[pyrogram.types.User, Exception]]:
+        """Resolves all the users in one request when possible."""
+        try:
+            users = await self.bot.get_users(user_ids)
+        except (ValueError, KeyError, pyrogram.errors.RPCError):
+            # Some IDs are unknown, find out which ones
+            results = await asyncio.gather(
+                *(self.bot.get_user(user_id) for user_id in user_ids),
+                return_exceptions=True)
+            return dict(zip(user_ids, results))
+
+        return {user.id: user for user in users}
+
     @command.desc("Ban user(s) from the current chat by ID or reply")
-    @command.usage("[ID(s) of the user(s) to ban?, or reply to user's message]",
-                   optional=True)
+    @command.usage(
+        "[-n for a dry run] [ID(s) of the user(s) to ban?, or reply to user's message]",
+        optional=True)
     async def cmd_ban(self, ctx: command.Context) -> str:
-        input_ids = ctx.args
+        input_ids = ctx.filtered_input.split()
+        dry_run = "-n" in ctx.flags
 
         try:
             # Parse user IDs without duplicates
@@ -70,151 +102,207 @@ class ModerationModule(module.Module):
         if not user_ids:
             return "__Provide a list of user IDs to ban, or reply to a user's message to ban them.__"
 
+        action = "Would ban" if dry_run else "Banned"
         lines: List[str]
         single_user = len(user_ids) == 1
         if single_user:
             lines = []
         else:
-            lines = [f"**Banned {len(user_ids)} users:**"]
+            lines = [f"**{action} {len(user_ids)} users:**"]
             await ctx.respond(f"Banning {len(user_ids)} users...")
 
-        for user_id in user_ids:
-            try:
-                user = await self.bot.client.get_users(user_id)
-            except ValueError:
+        chat_id = ctx.msg.chat.id
+        users, admins = await asyncio.gather(self.resolve_users(user_ids),
+                                             self.bot.get_chat_admins(chat_id))
+        targets = []
+        for user_id, user in users.items():
+            if isinstance(user, Exception):
                 if single_user:
                     lines.append(f"__Unable to find user__ `{user_id}`.")
                 else:
                     lines.append(f"Unable to find user `{user_id}`")
-
-                continue
-
-            if not isinstance(user, pyrogram.types.User):
+            elif not isinstance(user, pyrogram.types.User):
                 ent_type = type(user).__name__.lower()
                 lines.append(f"Skipped {ent_type} object (`{user_id}`)")
-                continue
-
-            user_spec = f"{util.tg.mention_user(user)} (`{user_id}`)"
-            if single_user:
-                lines.append(f"**Banned** {user_spec}")
+            elif user.id in admins:
+                lines.append(f"Skipped admin {util.tg.mention_user(user)}")
             else:
-                lines.append(user_spec)
+                user_spec = f"{util.tg.mention_user(user)} (`{user_id}`)"
+                if single_user:
+                    lines.append(f"**{action}** {user_spec}")
+                else:
+                    lines.append(user_spec)
+
+                targets.append(user.id)
 
-            is_administrator = bool(
-                (await self.bot.client.get_chat_member(ctx.msg.chat.id, user.id)
-                ).status == "administrator")
+        if not dry_run:
 
-            if is_administrator:
-                return "__I'm not gonna ban admin.__"
+            async def ban(user_id: int) -> None:
+                await util.tg.flood_retry(self.bot.client.kick_chat_member,
+                                          chat_id, user_id)
 
             try:
-                await ctx.msg.chat.kick_member(user.id)
-            except pyrogram.errors.UserAdminInvalid:
+                await util.run_bounded(targets, ban, MAX_CONCURRENT_ACTIONS)
+            except (pyrogram.errors.UserAdminInvalid,
+                    pyrogram.errors.ChatAdminRequired):
                 return "__I need permission to ban users in this chat.__"
+            finally:
+                self.bot.invalidate_chat(chat_id, *targets)
 
         return util.text.join_list(lines)
 
     @command.desc("Prune deleted members in this group or the specified group")
     @command.alias("prune")
-    @command.usage("[target chat ID/username/...?]", optional=True)
+    @command.usage("[-n for a dry run] [target chat ID/username/...?]",
+                   optional=True)
     async def cmd_prunemembers(self, ctx: command.Context) -> str:
-        if ctx.input:
-            chat = await self.bot.client.get_users(ctx.input)
-            if isinstance(chat, pyrogram.types.User):
-                return f"`{ctx.input}` __references a user, not a chat.__"
+        dry_run = "-n" in ctx.flags
+        if ctx.filtered_input:
+            chat = await self.bot.get_chat(ctx.filtered_input)
+            if chat.type in ("private", "bot"):
+                return f"`{ctx.filtered_input}` __references a user, not a chat.__"
 
             _chat_name = f" from **{chat.title}**"
             _chat_name2 = f" in **{chat.title}**"
         else:
-            chat = ctx.msg.chat.id
+            chat = ctx.msg.chat
             _chat_name = ""
             _chat_name2 = ""
 
-        await ctx.respond(f"Fetching members{_chat_name}...")
-        all_members = await self.bot.client.get_chat_members(chat)
+        total_count = await self.bot.client.get_chat_members_count(chat.id)
+        status = util.tg.StatusMessage(ctx)
+        status_text = f"Pruning deleted members{_chat_name}..."
+        await status.update(status_text, force=True)
 
-        last_time = datetime.now()
-        total_count = len(all_members)
-        err_count = 0
-        pruned_count = 0
-        idx = 0
+        counter = Counter()
 
-        status_text = f"Pruning deleted members{_chat_name}..."
-        await ctx.respond(status_text)
+        async def deleted_members() -> AsyncIterator[int]:
+            # Members are streamed, the full list is never held in memory
+            async for member in self.bot.client.iter_chat_members(chat.id):
+                counter["processed"] += 1
+                if member.user.is_deleted:
+                    yield member.user.id
 
-        for member in all_members:
-            if not member.user.is_deleted:
-                continue
+                percent_done = int(counter["processed"] / max(total_count, 1) *
+                                   100)
+                await status.update(
+                    f"{status_text} {percent_done}% done ({counter['processed']} of {total_count} processed; {counter['pruned']} banned; {counter['failed']} failed)"
+                )
+
+        async def prune(user_id: int) -> None:
+            if dry_run:
+                counter["pruned"] += 1
+                return
 
             try:
-                await self.bot.client.kick_chat_member(chat, member.user.id)
-            except pyrogram.errors.ChatAdminRequired:
-                return "__I'm not an admin.__"
+                await util.tg.flood_retry(self.bot.client.kick_chat_member,
+                                          chat.id, user_id)
             except pyrogram.errors.UserAdminInvalid:
-                err_count += 1
+                counter["failed"] += 1
             else:
-                pruned_count += 1
-
-            percent_done = int((idx + 1) / total_count * 100)
-            now = datetime.now()
-            delta = now - last_time
-            if delta.total_seconds() >= 5:
-                await ctx.respond(
-                    f"{status_text} {percent_done}% done ({idx + 1} of {total_count} processed; {pruned_count} banned; {err_count} failed)"
-                )
+                counter["pruned"] += 1
 
-            last_time = now
-            idx += 1
-
-        percent_pruned = int(pruned_count / total_count * 100)
-        return f"Pruned {pruned_count} deleted users{_chat_name2} — {percent_pruned}% of the original member count."
+        try:
+            await util.run_bounded(deleted_members(), prune,
+                                   MAX_CONCURRENT_ACTIONS)
+        except pyrogram.errors.ChatAdminRequired:
+            return "__I'm not an admin.__"
+
+        percent_pruned = int(counter["pruned"] / max(total_count, 1) * 100)
+        action = "Would prune" if dry_run else "Pruned"
+        return f"{action} {counter['pruned']} deleted users{_chat_name2} — {percent_pruned}% of the original member count."
+
+    @staticmethod
+    def get_purge_filter(
+            ctx: command.Context
+    ) -> Callable[[pyrogram.types.Message], bool]:
+        flags = ctx.flags
+        sender = None
+        if "-me" in flags:
+            sender = ctx.msg.from_user.id
+        elif "-u" in flags and ctx.msg.reply_to_message.from_user:
+            sender = ctx.msg.reply_to_message.from_user.id
+        media = "-media" in flags
+        text = "-text" in flags
+
+        def predicate(msg: pyrogram.types.Message) -> bool:
+            if sender is not None and (msg.from_user is None or
+                                       msg.from_user.id != sender):
+                return False
+            if media and not msg.media:
+                return False
+            if text and not msg.text:
+                return False
+
+            return True
+
+        return predicate
 
     @command.desc("reply to a message, mark as start until your purge command.")
-    @command.usage("purge", reply=True)
+    @command.usage(
+        "[-me only mine] [-u only from the replied user] [-media] [-text]",
+        optional=True,
+        reply=True)
     async def cmd_purge(self, ctx: command.Context):
         """This function need permission to delete messages."""
         if not ctx.msg.reply_to_message:
             return "__Reply to a message.__"
 
         if ctx.msg.chat.type in ["group", "supergroup"]:
-            perm = (await
-                    ctx.bot.client.get_chat_member(ctx.msg.chat.id,
-                                                   "me")).can_delete_messages
+            perm = (await ctx.bot.get_permissions(ctx.msg.chat.id)
+                   ).can_delete_messages
             if perm is not True:
                 return "__You can't delete message in this chat.__"
 
         await ctx.respond("Purging...")
 
-        msg_ids = []
+        chat_id = ctx.msg.chat.id
+        start_id = ctx.msg.reply_to_message.message_id
+        predicate = self.get_purge_filter(ctx)
         purged = 0
-        before = datetime.now()
-        for msg_id in range(ctx.msg.reply_to_message.message_id,
-                            ctx.msg.message_id):
-            msg_ids.append(msg_id)
-            if len(msg_ids) == 100:
-                await ctx.bot.client.delete_messages(
-                    chat_id=ctx.msg.chat.id,
+
+        async def batches() -> AsyncIterator[List[int]]:
+            # Only ids of messages that still exist and match the filters
+            msg_ids = []
+            async for msg in ctx.bot.client.iter_history(
+                    chat_id, offset_id=ctx.msg.message_id):
+                if msg.message_id < start_id:
+                    break
+                if not predicate(msg):
+                    continue
+
+                msg_ids.append(msg.message_id)
+                if len(msg_ids) == 100:
+                    yield msg_ids
+                    msg_ids = []
+
+            if msg_ids:
+                yield msg_ids
+
+        async def delete(msg_ids: List[int]) -> None:
+            nonlocal purged
+
+            if await util.tg.flood_retry(
+                    ctx.bot.client.delete_messages,
+                    chat_id=chat_id,
                     message_ids=msg_ids,
                     revoke=True,
-                )
+            ):
                 purged += len(msg_ids)
-                msg_ids = []
 
-        if msg_ids:
-            await ctx.bot.client.delete_messages(
-                chat_id=ctx.msg.chat.id,
-                message_ids=msg_ids,
-                revoke=True,
-            )
-            purged += len(msg_ids)
+        before = datetime.now()
+        await util.run_bounded(batches(), delete, MAX_CONCURRENT_DELETES)
 
         after = datetime.now()
-        run_time = (after - before).seconds
+        run_time = (after - before).total_seconds()
         time = "second" if run_time <= 1 else "seconds"
         msg = "message" if purged <= 1 else "messages"
+        rate = purged / max(run_time, 0.001)
 
-        await ctx.respond(f"__Purged {purged} {msg} in {run_time} {time}...__",
-                          delete_after=5)
+        await ctx.respond(
+            f"__Purged {purged} {msg} in {run_time:.1f} {time} "
+            f"({rate:.1f} msgs/s)...__",
+            delete_after=5)
 
     @command.desc("Delete the replied message.")
     @command.usage("del", reply=True)
@@ -4,9 +4,14 @@
 #
 #  Copyright (C) 2021 - Kraken
 
+import asyncio
+import random
 import re
-from typing import ClassVar, Dict, List, Optional, Pattern, Union
+import time
+from collections import deque
+from typing import ClassVar, Deque, Dict, List, Optional, Pattern, Union
 
+import aiohttp
 from pyrogram.errors import MediaEmpty, WebpageCurlFailed
 from pyrogram.types import (
     InlineKeyboardButton,
@@ -20,6 +25,23 @@ from pyrogram.types import (
 
 from .. import command, listener, module, util
 
+NO_POST = "Coudn't find any reddit post with image or gif, Please try again"
+
+
+class PostPool:
+    """Validated posts of one subreddit, ready to be sent."""
+
+    posts: Deque[Dict[str, str]]
+    refilled: float
+    error: Optional[str]
+    task: Optional[asyncio.Task]
+
+    def __init__(self, size: int) -> None:
+        self.posts = deque(maxlen=size)
+        self.refilled = 0
+        self.error = None
+        self.task = None
+
 
 class Reddit(module.Module):
     name: ClassVar[str] = "Reddit"
@@ -27,7 +49,30 @@ class Reddit(module.Module):
     thumb_regex: Pattern = re.compile(
         r"https?://preview\.redd\.it/\w+\.(?:jpg|jpeg|png)\?width=(?:[2][1-9][0-9]|[3-9][0-9]{2}|[0-9]{4,})"
     )
-    max_inline_results: str = "30"
+    max_inline_results: int = 30
+    # Posts fetched per refill, the API caps it at 50
+    fetch_count: ClassVar[int] = 50
+    pool_size: ClassVar[int] = 100
+    low_watermark: ClassVar[int] = 15
+    refill_interval: ClassVar[int] = 5 * 60
+    # Telegram limits when sending media by URL
+    max_photo_size: ClassVar[int] = 5 * 1024 * 1024
+    max_animation_size: ClassVar[int] = 20 * 1024 * 1024
+
+    pools: util.cache.TTLCache
+    bad_urls: util.cache.TTLCache
+    check_limit: asyncio.Semaphore
+
+    async def on_load(self) -> None:
+        # Pools of subreddits nobody asked for in an hour are dropped
+        self.pools = util.cache.TTLCache(ttl=60 * 60, maxsize=32)
+        self.bad_urls = util.cache.TTLCache(ttl=6 * 60 * 60, maxsize=4096)
+        self.check_limit = asyncio.Semaphore(10)
+
+    async def on_stop(self) -> None:
+        for pool in self.pools.values():
+            if pool.task is not None:
+                pool.task.cancel()
 
     def get_rthumb(self, result: Dict) -> str:
         """get thumbnail of size 210 and above"""
@@ -42,8 +87,7 @@ class Reddit(module.Module):
                         thumb = t_img
         return thumb.replace("\u0026", "&") if thumb else result.get("url")
 
-    @staticmethod
-    def parse_rpost(r: Dict) -> Optional[Dict[str, str]]:
+    def parse_rpost(self, r: Dict) -> Optional[Dict[str, str]]:
         if not r.get("url"):
             return
         caption = f"""
@@ -59,39 +103,146 @@ class Reddit(module.Module):
             postlink=r["postLink"],
             subreddit=r["subreddit"],
             media_url=r["url"],
+            thumb=self.get_rthumb(r),
         )
 
-    @command.desc("get post from reddit")
-    async def cmd_reddit(self, ctx: command.Context):
-        await ctx.respond("`Processing ...`")
-        r_api = ("/".join([self.uri, ctx.input.split()[0], "5"])
-                 if ctx.input else f"{self.uri}/5")
-        rjson = await util.aiorequest(session=self.bot.http,
-                                      url=r_api,
-                                      mode="json")
+    async def check_media(self, url: str) -> bool:
+        """Checks that Telegram will be able to fetch the media by URL."""
+        if url.endswith(".gif"):
+            max_size = self.max_animation_size
+        else:
+            max_size = self.max_photo_size
+
+        async with self.check_limit:
+            try:
+                async with self.bot.http.head(
+                        url,
+                        allow_redirects=True,
+                        timeout=aiohttp.ClientTimeout(total=10)) as resp:
+                    size = resp.content_length
+                    valid = (resp.status == 200 and
+                             resp.content_type.startswith("image/") and
+                             (size is None or 0 < size <= max_size))
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                valid = False
+
+        if not valid:
+            self.bad_urls.set(url, True)
+
+        return valid
+
+    def get_pool(self, subreddit: str) -> PostPool:
+        pool = self.pools.get(subreddit)
+        if pool is None:
+            pool = PostPool(self.pool_size)
+        # Refresh the expiry of pools still in use
+        self.pools.set(subreddit, pool)
+
+        return pool
+
+    def refill(self, subreddit: str) -> asyncio.Task:
+        """Starts refilling the pool unless it's already being refilled."""
+        pool = self.get_pool(subreddit)
+        if pool.task is None or pool.task.done():
+            pool.task = self.bot.loop.create_task(
+                self._refill(subreddit, pool))
+
+        return pool.task
+
+    async def _refill(self, subreddit: str, pool: PostPool) -> None:
+        r_api = "/".join(
+            [self.uri, subreddit, str(self.fetch_count)] if subreddit else
+            [self.uri, str(self.fetch_count)])
+        try:
+            rjson = await util.aiorequest(session=self.bot.http,
+                                          url=r_api,
+                                          mode="json")
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            # Whatever is left in the pool is still served
+            self.log.warning(f"Failed to refill r/{subreddit or 'random'}: "
+                             f"{e!r}")
+            rjson = None
+        pool.refilled = time.monotonic()
         if rjson is None:
-            return "ERROR : Reddit API is Down !", 5
+            pool.error = "ERROR : Reddit API is Down !"
+            return
         if rjson.get("code"):
-            return f"**ERROR (code: {res['code']})** : `{res.get('message')}`", 5
-        if not rjson.get("memes"):
-            return "Coudn't find any reddit post with image or gif, Please try again", 5
+            pool.error = (f"**ERROR (code: {rjson['code']})** : "
+                          f"`{rjson.get('message')}`")
+            return
+
+        seen = {post["media_url"] for post in pool.posts}
+        posts = []
+        for post in rjson.get("memes") or []:
+            res = self.parse_rpost(post)
+            if (res is None or res["media_url"] in seen or
+                    res["media_url"] in self.bad_urls):
+                continue
+
+            seen.add(res["media_url"])
+            posts.append(res)
+
+        valid = await asyncio.gather(
+            *(self.check_media(post["media_url"]) for post in posts))
+        pool.posts.extend(post for post, ok in zip(posts, valid) if ok)
+        pool.error = None if pool.posts else NO_POST
+
+    async def get_posts(self, subreddit: str, count: int,
+                        consume: bool) -> Union[str, List[Dict[str, str]]]:
+        """Returns posts from memory, the network is only hit on a cold pool.
+
+        Consumed posts are removed so they aren't sent twice, the others
+        are randomly picked so repeated inline queries vary.
+        """
+        subreddit = subreddit.lower()
+        pool = self.get_pool(subreddit)
+        if not pool.posts:
+            # Errors are kept for a bit so a dead API isn't hammered
+            if pool.error is None or time.monotonic() - pool.refilled > 30:
+                await asyncio.shield(self.refill(subreddit))
+            if not pool.posts:
+                return pool.error or NO_POST
+
+        count = min(count, len(pool.posts))
+        if consume:
+            posts = [pool.posts.popleft() for _ in range(count)]
+        else:
+            posts = random.sample(list(pool.posts), count)
+
+        if (len(pool.posts) < self.low_watermark or
+                time.monotonic() - pool.refilled > self.refill_interval):
+            self.refill(subreddit)
+
+        return posts
+
+    @command.desc("get post from reddit")
+    async def cmd_reddit(self, ctx: command.Context):
+        subreddit = ctx.input.split()[0] if ctx.input else ""
+        if subreddit.lower().startswith("r/"):
+            subreddit = subreddit[2:]
         chat_id = ctx.msg.chat.id
         reply_id = (ctx.msg.reply_to_message.message_id
                     if ctx.msg.reply_to_message else None)
-        for post in rjson["memes"]:
+        # Posts are taken one at a time so only the sent and broken ones are
+        # used up
+        for _ in range(5):
+            posts = await self.get_posts(subreddit, 1, consume=True)
+            if isinstance(posts, str):
+                return posts, 5
+
+            post = posts[0]
             try:
-                if await self.send_rpost(ctx, post, chat_id, reply_id):
-                    break
+                await self.send_rpost(ctx, post, chat_id, reply_id)
+                break
             except (MediaEmpty, WebpageCurlFailed):
+                self.bad_urls.set(post["media_url"], True)
                 continue
         else:
             return "__Failed to Get Post from reddit__", 5
         await ctx.msg.delete()
 
-    async def send_rpost(self, ctx: command.Context, rjson: Dict, chat_id: int,
-                         reply_id: Optional[int]):
-        if (res := self.parse_rpost(rjson)) is None:
-            return False
+    async def send_rpost(self, ctx: command.Context, res: Dict[str, str],
+                         chat_id: int, reply_id: Optional[int]) -> None:
         if ctx.client.is_bot:
             buttons = InlineKeyboardMarkup([[
                 InlineKeyboardButton(f"Source: r/{res['subreddit']}",
@@ -119,64 +270,49 @@ class Reddit(module.Module):
                 reply_to_message_id=reply_id,
                 reply_markup=buttons,
             )
-        return True
 
     @listener.pattern(r"(?i)^reddit(?:\s+(?:r/)?([a-z]+)\.)?$")
     async def on_inline_query(self, query: InlineQuery) -> None:
-        if subreddit := query.matches[0].group(1):
-            r_api = "/".join([self.uri, subreddit, self.max_inline_results])
-        else:
-            r_api = "/".join([self.uri, self.max_inline_results])
-        rjson = await util.aiorequest(session=self.bot.http,
-                                      url=r_api,
-                                      mode="json")
-        if rjson is None:
-            results = "Coudn't find any reddit post with image or gif, Please try again"
-        elif rjson.get("code"):
-            results = f"**ERROR (code: {rjson['code']})** : `{rjson.get('message')}`"
-        else:
-            results: List[Union[InlineQueryResultAnimation,
-                                InlineQueryResultPhoto]] = []
-            for post in rjson.get("memes"):
-                if p_data := self.parse_rpost(post):
-                    thumbnail = self.get_rthumb(p_data)
-                    buttons = InlineKeyboardMarkup([[
-                        InlineKeyboardButton(
-                            f"Source: r/{p_data['subreddit']}",
-                            url=p_data["postlink"],
-                        )
-                    ]])
-                    if p_data["media_url"].endswith(".gif"):
-                        results.append(
-                            InlineQueryResultAnimation(
-                                animation_url=p_data["media_url"],
-                                thumb_url=thumbnail,
-                                caption=p_data["caption"],
-                                reply_markup=buttons,
-                            ))
-                    else:
-                        results.append(
-                            InlineQueryResultPhoto(
-                                photo_url=p_data["media_url"],
-                                thumb_url=thumbnail,
-                                caption=p_data["caption"],
-                                reply_markup=buttons,
-                            ))
-
-        if not results:
-            results = "Coudn't find any reddit post with image or gif, Please try again"
-
-        if isinstance(results, str):
+        subreddit = query.matches[0].group(1) or ""
+        posts = await self.get_posts(subreddit,
+                                     self.max_inline_results,
+                                     consume=False)
+        if isinstance(posts, str):
             switch_pm_text = "⚠️ Error getting posts from reddit !"
             results = [
                 InlineQueryResultArticle(
-                    title=results,
-                    input_message_content=InputTextMessageContent(results),
+                    title=posts,
+                    input_message_content=InputTextMessageContent(posts),
                     thumb_url="https://i.imgur.com/7a7aPVa.png",
                 )
             ]
         else:
-            switch_pm_text = f"Posts from r/{p_data['subreddit']}"
+            switch_pm_text = f"Posts from r/{posts[0]['subreddit']}"
+            results: List[Union[InlineQueryResultAnimation,
+                                InlineQueryResultPhoto]] = []
+            for p_data in posts:
+                buttons = InlineKeyboardMarkup([[
+                    InlineKeyboardButton(
+                        f"Source: r/{p_data['subreddit']}",
+                        url=p_data["postlink"],
+                    )
+                ]])
+                if p_data["media_url"].endswith(".gif"):
+                    results.append(
+                        InlineQueryResultAnimation(
+                            animation_url=p_data["media_url"],
+                            thumb_url=p_data["thumb"],
+                            caption=p_data["caption"],
+                            reply_markup=buttons,
+                        ))
+                else:
+                    results.append(
+                        InlineQueryResultPhoto(
+                            photo_url=p_data["media_url"],
+                            thumb_url=p_data["thumb"],
+                            caption=p_data["caption"],
+                            reply_markup=buttons,
+                        ))
 
         await query.answer(
             results=results,
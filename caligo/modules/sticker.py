@@ -1,181 +1,327 @@
 import asyncio
 import io
-from datetime import datetime
-from typing import ClassVar, Optional, Set, Tuple, Union
+from collections import OrderedDict, deque
+from dataclasses import dataclass
+from typing import Any, ClassVar, Deque, Dict, List, Optional, Tuple, Union
 from urllib.parse import quote
 
+import aiohttp
 import pyrogram
-from aiofile import AIOFile
+import requests
 from bs4 import BeautifulSoup as soup
-from cloudscraper import create_scraper
-from motor.motor_asyncio import AsyncIOMotorCollection, AsyncIOMotorDatabase
+from cloudscraper import CloudScraper, create_scraper
+from motor.motor_asyncio import AsyncIOMotorDatabase
 from pyrogram.errors import StickersetInvalid
 from pyrogram.raw.functions.messages import GetStickerSet
 from pyrogram.raw.types import InputStickerSetShortName
 
 from .. import command, module, util
+from ..conversation import Conversation
 
-PNG_MAGIC = b"\x89\x50\x4e\x47\x0d\x0a\x1a\x0a"
+# Sticker pack search
+SEARCH_TIMEOUT = 15
+SEARCH_USER_AGENT = ("Mozilla/5.0 (X11; Linux x86_64; rv:88.0) "
+                     "Gecko/20100101 Firefox/88.0")
+# Larger images are scaled down before they get glitched
+GLITCH_SIZE = 1280
 
 # Sticker bot info and return error strings
 STICKER_BOT_USERNAME = "Stickers"
+# Maximum number of static stickers in a pack
+PACK_LIMIT = 120
+# Stickers added in one /addsticker or /newpack flow
+KANG_BATCH = 10
+# Replies read from one conversation before it's reopened
+SESSION_MESSAGES = 100
 
 
 class LengthMismatchError(Exception):
     pass
 
 
+class StickerError(Exception):
+    pass
+
+
+@dataclass
+class KangRequest:
+    sticker: io.BytesIO
+    emoji: str
+    future: asyncio.Future
+
+
+class StickerSession:
+    """Steps through the sticker bot flows over an open conversation."""
+
+    conv: Conversation
+    received: int
+
+    def __init__(self, conv: Conversation) -> None:
+        self.conv = conv
+        self.received = 0
+
+    async def _reply_and_ack(self) -> pyrogram.types.Message:
+        # Wait for a response
+        resp = await self.conv.get_response()
+        # Ack the response to suppress its notification
+        await self.conv.mark_read()
+
+        return resp
+
+    async def step(self,
+                   data: Any,
+                   expected_resp: Optional[str] = None,
+                   *,
+                   file: bool = False) -> pyrogram.types.Message:
+        if file:
+            await self.conv.send_file(data, force_document=True)
+        else:
+            await self.conv.send_message(data)
+
+        # Wait for both the rate-limit and the bot's response
+        try:
+            response, _ = await asyncio.gather(self._reply_and_ack(),
+                                               asyncio.sleep(0.25))
+        except self.conv.Timeout:
+            raise StickerError("Sticker bot didn't respond in time.") from None
+        finally:
+            self.received += 1
+
+        if expected_resp and expected_resp not in (response.text or ""):
+            raise StickerError(f'Sticker creation failed: "{response.text}"')
+
+        return response
+
+
 class StickerModule(module.Module):
     name: ClassVar[str] = "Sticker"
 
     db: AsyncIOMotorDatabase
-    kang_db: AsyncIOMotorCollection
+    kang_db: Optional[Dict[str, str]]
+
+    kang_queues: "OrderedDict[Optional[str], Deque[KangRequest]]"
+    kang_event: asyncio.Event
+    kang_worker: asyncio.Task
+    pack_counts: Dict[str, int]
+
+    scraper: Optional[CloudScraper]
+    search_cache: util.cache.TTLCache
 
     async def on_load(self):
         self.db = self.bot.get_db("stickers")
+        await self.load_packs()
+
+        self.kang_queues = OrderedDict()
+        self.kang_event = asyncio.Event()
+        self.pack_counts = {}
+        self.kang_worker = self.bot.loop.create_task(self.run_kang_worker())
 
+        self.scraper = None
+        self.search_cache = util.cache.TTLCache(ttl=30 * 60, maxsize=128)
+
+    async def on_stop(self) -> None:
+        self.kang_worker.cancel()
+        self.fail_pending("Bot is stopping.")
+
+    async def load_packs(self) -> None:
         check = await self.db.find_one({"_id": self.name})
         self.kang_db = check.get("pack_name") if check is not None else None
 
-    async def add_sticker(
-        self,
-        sticker_data: Union[pyrogram.types.Sticker, bytes],
-        pack_name: str,
-        emoji: str = "❓",
-        *,
-        target: str = STICKER_BOT_USERNAME,
-    ) -> Tuple[bool, str]:
-        commands = [
-            ("text", "/cancel", None),
-            ("text", "/addsticker", "Choose the sticker pack"),
-            ("text", pack_name, "send me the sticker"),
-            ("file", sticker_data, "send me an emoji"),
-            ("text", emoji, "added your sticker"),
-            ("text", "/done", "done"),
-        ]
-
-        success = False
-        before = datetime.now()
-
-        async with self.bot.conversation(target) as conv:
-
-            async def reply_and_ack():
-                # Wait for a response
-                resp = await conv.get_response()
-                # Ack the response to suppress its notification
-                await conv.mark_read()
-
-                return resp
+    def get_pack_name(self, vol: str) -> str:
+        return self.bot.user.username + f"_kangPack_VOL{vol}"
+
+    @property
+    def current_vol(self) -> str:
+        vols = [int(vol) for vol in self.kang_db or {} if vol.isdigit()]
+        return str(max(vols)) if vols else "1"
+
+    async def get_pack_count(self, pack_name: str) -> Optional[int]:
+        """Returns the number of stickers in the pack, None if it's missing."""
+        count = self.pack_counts.get(pack_name)
+        if count is not None:
+            return count
+
+        try:
+            result = await self.bot.client.send(
+                GetStickerSet(stickerset=InputStickerSetShortName(
+                    short_name=pack_name)))
+        except StickersetInvalid:
+            return None
+
+        self.pack_counts[pack_name] = result.set.count
+        return result.set.count
+
+    async def kang(self,
+                   sticker: io.BytesIO,
+                   emoji: Optional[str] = None,
+                   vol: Optional[str] = None) -> Tuple[bool, str]:
+        """Queues the sticker for the pack, the current one if no VOL given.
+
+        Requests are serialized into a single conversation with the sticker
+        bot, consecutive ones for the same pack are added in one flow.
+        """
+        future = self.bot.loop.create_future()
+        self.kang_queues.setdefault(vol, deque()).append(
+            KangRequest(sticker, emoji or "❓", future))
+        self.kang_event.set()
+
+        return await future
+
+    def fail_pending(self, reason: str) -> None:
+        for queue in self.kang_queues.values():
+            for request in queue:
+                if not request.future.done():
+                    request.future.set_result((False, reason))
+        self.kang_queues.clear()
+
+    async def run_kang_worker(self) -> None:
+        while True:
+            if not self.kang_queues:
+                self.kang_event.clear()
+                await self.kang_event.wait()
 
             try:
-                for cmd_type, data, expected_resp in commands:
-                    if cmd_type == "text":
-                        await conv.send_message(data)
-                    elif cmd_type == "file":
-                        await conv.send_file(data, force_document=True)
-                    else:
-                        raise TypeError(f"Unknown command type '{cmd_type}'")
-
-                    # Wait for both the rate-limit and the bot's response
-                    try:
-                        done: Set[asyncio.Future]
-                        resp_task = self.bot.loop.create_task(reply_and_ack())
-                        done, _ = await asyncio.wait(
-                            (resp_task, asyncio.sleep(0.25)))
-                        # Raise exceptions encountered in coroutines
-                        for fut in done:
-                            fut.result()
-
-                        response = resp_task.result()
-                        if expected_resp and expected_resp not in response.text:
-                            return False, f'Sticker creation failed: "{response.text}"'
-                    except asyncio.TimeoutError:
-                        after = datetime.now()
-                        delta_seconds = int((after - before).total_seconds())
-
-                        return (
-                            False,
-                            f"Sticker creation timed out after {delta_seconds} seconds.",
-                        )
-
-                success = True
-            finally:
-                # Cancel the operation if we return early
-                if not success:
-                    await conv.send_message("/cancel")
-
-        return True, f"https://t.me/addstickers/{pack_name}"
-
-    async def create_pack(
-        self,
-        sticker_data: Union[pyrogram.types.Sticker, bytes],
-        pack_name: str,
-        emoji: str = "❓",
-        *,
-        target: str = STICKER_BOT_USERNAME,
-    ) -> Tuple[bool, str]:
-        commands = [
-            ("text", "/cancel", None),
-            ("text", "/newpack", "Yay!"),
-            ("text", pack_name, "send me the sticker"),
-            ("file", sticker_data, "send me an emoji"),
-            ("text", emoji, "/publish"),
-            ("text", "/publish", "/skip"),
-            ("text", "/skip", "Animals"),
-            ("text", pack_name, "Kaboom!"),
-        ]
-
-        success = False
-        before = datetime.now()
-
-        async with self.bot.conversation(target, max_messages=9) as conv:
-
-            async def reply_and_ack():
-                # Wait for a response
-                resp = await conv.get_response()
-                # Ack the response to suppress its notification
-                await conv.mark_read()
-
-                return resp
+                async with self.bot.conversation(
+                        STICKER_BOT_USERNAME,
+                        max_messages=SESSION_MESSAGES) as conv:
+                    await self.run_session(StickerSession(conv))
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:  # skipcq: PYL-W0703
+                self.log.error("Sticker bot session failed", exc_info=e)
+                self.fail_pending(f"Sticker bot session failed: {e}")
+
+    async def run_session(self, session: StickerSession) -> None:
+        await session.step("/cancel")
+        # Leave room for a batch that spans two packs
+        while (self.kang_queues and SESSION_MESSAGES - session.received >=
+               9 + 2 * KANG_BATCH):
+            vol, queue = next(iter(self.kang_queues.items()))
+            batch = [
+                queue.popleft() for _ in range(min(len(queue), KANG_BATCH))
+            ]
+            if not queue:
+                del self.kang_queues[vol]
 
             try:
-                for cmd_type, data, expected_resp in commands:
-                    if cmd_type == "text":
-                        await conv.send_message(data)
-                    elif cmd_type == "file":
-                        await conv.send_file(data, force_document=True)
-                    else:
-                        raise TypeError(f"Unknown command type '{cmd_type}'")
-
-                    # Wait for both the rate-limit and the bot's response
-                    try:
-                        done: Set[asyncio.Future]
-                        resp_task = self.bot.loop.create_task(reply_and_ack())
-                        done, _ = await asyncio.wait(
-                            (resp_task, asyncio.sleep(0.25)))
-                        # Raise exceptions encountered in coroutines
-                        for fut in done:
-                            fut.result()
-
-                        response = resp_task.result()
-                        if expected_resp and expected_resp not in response.text:
-                            return False, f'Sticker creation failed: "{response.text}"'
-                    except asyncio.TimeoutError:
-                        after = datetime.now()
-                        delta_seconds = int((after - before).total_seconds())
-
-                        return (
-                            False,
-                            f"Sticker creation timed out after {delta_seconds} seconds.",
-                        )
-
-                success = True
-            finally:
-                # Cancel the operation if we return early
-                if not success:
-                    await conv.send_message("/cancel")
-
-        return True, f"https://t.me/addstickers/{pack_name}"
+                await self.process_batch(session, vol, batch)
+            except StickerError as e:
+                for request in batch:
+                    if not request.future.done():
+                        request.future.set_result((False, str(e)))
+
+                # Cancel the operation since it ended early, the session is
+                # reopened if the bot doesn't even answer that
+                try:
+                    await session.step("/cancel")
+                except StickerError:
+                    return
+
+    async def process_batch(self, session: StickerSession, vol: Optional[str],
+                            batch: List[KangRequest]) -> None:
+        auto = vol is None
+        num = self.current_vol if auto else vol
+        while batch:
+            pack_name = self.get_pack_name(num)
+            count = await self.get_pack_count(pack_name)
+            if count is not None and count >= PACK_LIMIT:
+                if not auto:
+                    raise StickerError(f"Pack VOL{num} is full.")
+
+                # Move on before the sticker bot has to refuse it
+                num = str(int(num) + 1)
+                continue
+
+            part = batch[:PACK_LIMIT - (count or 0)]
+            del batch[:len(part)]
+            # Skip the requests that were cancelled while queued
+            part = [request for request in part if not request.future.done()]
+            if not part:
+                continue
+
+            if count is None:
+                await self.create_pack(session, pack_name, part)
+                await self.db.update_one(
+                    {"_id": self.name},
+                    {"$set": {
+                        f"pack_name.{num}": pack_name
+                    }},
+                    upsert=True)
+                await self.load_packs()
+            else:
+                await self.add_sticker(session, pack_name, part)
+
+    async def add_sticker(self, session: StickerSession, pack_name: str,
+                          batch: List[KangRequest]) -> None:
+        link = f"https://t.me/addstickers/{pack_name}"
+        await session.step("/addsticker", "Choose the sticker pack")
+        await session.step(pack_name, "send me the sticker")
+        for request in batch:
+            if request.future.done():
+                continue
+
+            await session.step(request.sticker, "send me an emoji", file=True)
+            await session.step(request.emoji, "added your sticker")
+
+            # The sticker is in the pack now, whatever happens next
+            self.pack_counts[pack_name] += 1
+            if not request.future.done():
+                request.future.set_result((True, link))
+        await session.step("/done", "done")
+
+    async def create_pack(self, session: StickerSession, pack_name: str,
+                          batch: List[KangRequest]) -> None:
+        await session.step("/newpack", "Yay!")
+        await session.step(pack_name, "send me the sticker")
+        added = 0
+        for request in batch:
+            # The pack can't be published empty
+            if added and request.future.done():
+                continue
+
+            await session.step(request.sticker, "send me an emoji", file=True)
+            await session.step(request.emoji, "/publish")
+            added += 1
+        await session.step("/publish", "/skip")
+        await session.step("/skip", "Animals")
+        await session.step(pack_name, "Kaboom!")
+
+        self.pack_counts[pack_name] = added
+        for request in batch:
+            if not request.future.done():
+                request.future.set_result(
+                    (True, f"https://t.me/addstickers/{pack_name}"))
+
+    @staticmethod
+    def get_media(msg: pyrogram.types.Message) -> Any:
+        return msg.sticker or msg.photo or msg.document
+
+    async def get_image(self,
+                        msg: pyrogram.types.Message,
+                        *,
+                        max_size: Optional[int] = None,
+                        fit: Optional[int] = None) -> bytes:
+        """Returns the message image as PNG, converted at most once."""
+
+        async def fetch() -> bytes:
+            return await util.tg.fetch_media_bytes(self.bot.client, msg)
+
+        media = self.get_media(msg)
+        # Message ids are only unique within a chat
+        key = (media.file_unique_id if media is not None else
+               (msg.chat.id, msg.message_id))
+        return await util.image.cached_transform(
+            key,
+            fetch,
+            "png",
+            max_size=max_size,
+            fit=fit)
+
+    async def get_sticker_png(self, msg: pyrogram.types.Message) -> io.BytesIO:
+        sticker_buf = io.BytesIO(await self.get_image(
+            msg, fit=util.image.STICKER_SIZE))
+        sticker_buf.name = "sticker.png"
+        return sticker_buf
 
     @command.desc("Copy a sticker into another pack")
     @command.alias("stickercopy", "kang")
@@ -196,44 +342,14 @@ class StickerModule(module.Module):
             else:
                 pack_VOL = arg
 
-        if not pack_VOL:
-            pack_name = self.kang_db.get(
-                "1") if self.kang_db is not None else None
-        else:
-            pack_name = self.kang_db.get(
-                pack_VOL) if self.kang_db is not None else None
-
-        if not pack_name:
-            ret = await self.cmd_createpack(ctx)
-            await self.on_load()
-
-            return ret
-
-        try:
-            await self.bot.client.send(
-                GetStickerSet(stickerset=InputStickerSetShortName(
-                    short_name=pack_name)))
-        except StickersetInvalid:
-            ret = await self.cmd_createpack(ctx)
-
-            return ret
-
         reply_msg = ctx.msg.reply_to_message
 
         await ctx.respond("Copying sticker...")
 
-        sticker_file = await reply_msg.download()
-        async with AIOFile(sticker_file, "rb") as sticker:
-            sticker_bytes = await sticker.read()
-        sticker_buf = io.BytesIO(sticker_bytes)
-        await util.image.img_to_png(sticker_buf)
-
-        sticker_buf.seek(0)
-        sticker_buf.name = "sticker.png"
-        status, result = await self.add_sticker(sticker_buf,
-                                                pack_name,
-                                                emoji=emoji
-                                                or reply_msg.sticker.emoji)
+        sticker_buf = await self.get_sticker_png(reply_msg)
+        if not emoji and reply_msg.sticker:
+            emoji = reply_msg.sticker.emoji
+        status, result = await self.kang(sticker_buf, emoji, pack_VOL)
         if status:
             await self.bot.log_stat("stickers_created")
             return f"[Sticker copied]({result})."
@@ -250,55 +366,19 @@ class StickerModule(module.Module):
         if not reply_msg.sticker:
             return "__That message is not a sticker.__"
 
-        num = ctx.input if ctx.input else "1"
-        check = self.kang_db.get(num) if self.kang_db is not None else None
-        if check:
-            try:
-                await self.bot.client.send(
-                    GetStickerSet(stickerset=InputStickerSetShortName(
-                        short_name=check)))
-            except StickersetInvalid:
-                pass
-            else:
-                return "__Pack with that name already exists, use 'kang' instead.__"
-
+        num = ctx.args[0] if ctx.args else "1"
         emoji = ctx.args[1] if len(ctx.args) > 1 else "❓"
-        pack_name = self.bot.user.username + f"_kangPack_VOL{num}"
-        await self.db.update_one({"_id": self.name},
-                                 {"$set": {
-                                     f"pack_name.{num}": pack_name
-                                 }},
-                                 upsert=True)
-
-        try:
-            await self.bot.client.send(
-                GetStickerSet(stickerset=InputStickerSetShortName(
-                    short_name=pack_name)))
-        except StickersetInvalid:
-            pass
-        else:
-            await self.on_load()
+        if await self.get_pack_count(self.get_pack_name(num)) is not None:
             return "__Pack with that name already exists, use 'kang' instead.__"
 
         await ctx.respond("Creating new pack...")
 
-        sticker_file = await reply_msg.download()
-        async with AIOFile(sticker_file, "rb") as sticker:
-            sticker_bytes = await sticker.read()
-        sticker_buf = io.BytesIO(sticker_bytes)
-        await util.image.img_to_png(sticker_buf)
-
-        sticker_buf.seek(0)
-        sticker_buf.name = "sticker.png"
-        status, result = await self.create_pack(sticker_buf,
-                                                pack_name,
-                                                emoji=reply_msg.sticker.emoji
-                                                or emoji)
+        sticker_buf = await self.get_sticker_png(reply_msg)
+        status, result = await self.kang(sticker_buf,
+                                         reply_msg.sticker.emoji or emoji,
+                                         num)
         if status:
             await self.bot.log_stat("stickers_created")
-
-            # Update the database
-            await self.on_load()
             return f"[Pack Created]({result})."
 
         return result
@@ -322,18 +402,30 @@ class StickerModule(module.Module):
 
         await ctx.respond("Glitching image...")
 
-        orig_file = await reply_msg.download()
-        async with AIOFile(orig_file, "rb") as image:
-            orig_bytes = await image.read()
+        key = (self.get_media(reply_msg).file_unique_id, "glitch", offset)
+        glitched = util.image.cache.get(key)
+        if glitched is None:
+            png_bytes = await self.get_image(reply_msg, max_size=GLITCH_SIZE)
+            glitched = await self.glitch(png_bytes, offset)
+            if isinstance(glitched, str):
+                return glitched
 
-        # Convert to PNG if necessary
-        if orig_bytes.startswith(PNG_MAGIC):
-            png_bytes = orig_bytes
-        else:
-            png_buf = io.BytesIO(orig_bytes)
-            await util.image.img_to_png(png_buf)
-            png_bytes = png_buf.getvalue()
+            util.image.cache.set(key, glitched)
+
+        with io.BytesIO(glitched) as file:
+            if reply_msg.sticker:
+                file.name = "glitch.webp"
+                await ctx.msg.reply_sticker(file)
+                await ctx.msg.delete()
+                return None
+
+            file.name = "glitch.png"
+            await ctx.respond(document=file, mode="repost")
 
+        return None
+
+    @staticmethod
+    async def glitch(png_bytes: bytes, offset: int) -> Union[bytes, str]:
         # Invoke external 'corrupter' program to glitch the image
         # Source code: https://github.com/r00tman/corrupter
         try:
@@ -357,17 +449,49 @@ class StickerModule(module.Module):
                 f"⚠️ `corrupter` failed with return code {ret}. Error: ```{stderr}```"
             )
 
-        with io.BytesIO(stdout) as file:
-            if reply_msg.sticker:
-                file.name = "glitch.webp"
-                await ctx.msg.reply_sticker(file)
-                await ctx.msg.delete()
-                return None
+        return stdout
 
-            file.name = "glitch.png"
-            await ctx.respond(document=file, mode="repost")
+    @staticmethod
+    def parse_packs(html: str) -> List[Tuple[str, str]]:
+        packs = []
+        for header in soup(html, "lxml").findAll(
+                "div", {"class": "sticker-pack__header"}):
+            if header.button is None:
+                continue
 
-        return None
+            title = header.find("div", {"class": "sticker-pack__title"}).text
+            packs.append((title, header.a.get("href")))
+
+        return packs
+
+    async def fetch_search_page(self, url: str) -> str:
+        try:
+            async with self.bot.http.get(
+                    url,
+                    headers={"User-Agent": SEARCH_USER_AGENT},
+                    timeout=aiohttp.ClientTimeout(total=SEARCH_TIMEOUT),
+            ) as resp:
+                # Anything else is most likely a Cloudflare challenge
+                if resp.status == 200:
+                    return await resp.text()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            self.log.debug(f"Plain sticker search request failed: {e}")
+
+        if self.scraper is None:
+            self.scraper = await util.run_sync(create_scraper)
+        resp = await util.run_sync(self.scraper.get, url, timeout=SEARCH_TIMEOUT)
+        resp.raise_for_status()
+        return resp.text
+
+    async def search_packs(self, query: str) -> List[Tuple[str, str]]:
+        """Returns (title, link) of the packs matching the query."""
+
+        async def search() -> List[Tuple[str, str]]:
+            html = await self.fetch_search_page(
+                f"https://combot.org/telegram/stickers?q={quote(query)}")
+            return await util.run_sync(self.parse_packs, html, pool="cpu")
+
+        return await self.search_cache.fetch(query.lower(), search)
 
     @command.usage("Search Sticker Pack")
     async def cmd_stickers(self, ctx: command.Context) -> str:
@@ -383,20 +507,13 @@ class StickerModule(module.Module):
             )
             return
 
-        if out := "\n".join(
-                list(
-                    map(
-                        lambda x:
-                        f"• [{x.find('div', {'class': 'sticker-pack__title'}).text}]({x.a.get('href')})",
-                        filter(
-                            lambda x: x.button is not None,
-                            soup(
-                                create_scraper().get(
-                                    f"https://combot.org/telegram/stickers?q={quote(search_query)}"
-                                ).text,
-                                "lxml",
-                            ).findAll("div", {"class": "sticker-pack__header"}),
-                        ),
-                    ))):
+        try:
+            packs = await self.search_packs(str(search_query))
+        except (aiohttp.ClientError, asyncio.TimeoutError,
+                requests.RequestException) as e:
+            return f"__Sticker pack search failed:__ `{e}`"
+
+        if packs:
+            out = "\n".join(f"• [{title}]({link})" for title, link in packs)
             return f"<b>Sticker Packs For:</b> '<u>{search_query}</u>'\n{out}"
         await ctx.respond("❌  `No Sticker Pack Found !`", delete_after=5)
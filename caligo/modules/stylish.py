@@ -5,7 +5,7 @@
 #  Copyright (C) 2021 - Kraken
 
 import random
-from typing import ClassVar, Dict, List
+from typing import ClassVar, Dict, List, Sequence
 
 from pyrogram.types import (
     InlineQuery,
@@ -13,12 +13,12 @@ from pyrogram.types import (
     InputTextMessageContent,
 )
 
-from .. import command, listener, module
+from .. import command, listener, module, util
 
 
 class Stylish(module.Module):
     name: ClassVar[str] = "Stylish"
-    styles: Dict[str, str] = {
+    styles: ClassVar[Dict[str, Sequence[str]]] = {
         "normal": "ABCDEFGHIJKLMNOPQRSTUVWXYZ"
                   "abcdefghijklmnopqrstuvwxyz",
         "serif": "𝐀𝐁𝐂𝐃𝐄𝐅𝐆𝐇𝐈𝐉𝐊𝐋𝐌𝐍𝐎𝐏𝐐𝐑𝐒𝐓𝐔𝐕𝐖𝐗𝐘𝐙"
@@ -53,8 +53,8 @@ class Stylish(module.Module):
                    "🅰🅱🅲🅳🅴🅵🅶🅷🅸🅹🅺🅻🅼🅽🅾🅿🆀🆁🆂🆃🆄🆅🆆🆇🆈🆉",
         "square": "🄰🄱🄲🄳🄴🄵🄶🄷🄸🄹🄺🄻🄼🄽🄾🄿🅀🅁🅂🅃🅄🅅🅆🅇🅈🅉"
                   "🄰🄱🄲🄳🄴🄵🄶🄷🄸🄹🄺🄻🄼🄽🄾🄿🅀🅁🅂🅃🅄🅅🅆🅇🅈🅉",
-        "smoth": "ᗩᗷᑢᕲᘿᖴᘜᕼᓰᒚᖽᐸᒪᘻᘉᓍᕵᕴᖇSᖶᑘᐺᘺ᙭ᖻᗱ"
-                 "ᗩᗷᑢᕲᘿᖴᘜᕼᓰᒚᖽᐸᒪᘻᘉᓍᕵᕴᖇSᖶᑘᐺᘺ᙭ᖻᗱ",
+        # K takes two characters here
+        "smoth": (*"ᗩᗷᑢᕲᘿᖴᘜᕼᓰᒚ", "ᖽᐸ", *"ᒪᘻᘉᓍᕵᕴᖇSᖶᑘᐺᘺ᙭ᖻᗱ") * 2,
         "smoth2": "ᗩᗷᑕᗪEᖴGᕼIᒍKᒪᗰᑎOᑭᑫᖇᔕTᑌᐯᗯ᙭Yᘔ"
                   "ᗩᗷᑕᗪEᖴGᕼIᒍKᒪᗰᑎOᑭᑫᖇᔕTᑌᐯᗯ᙭Yᘔ",
         "wide": "ＡＢＣＤＥＦＧＨＩＪＫＬＭＮＯＰＱＲＳＴＵＶＷＸＹＺ"
@@ -67,15 +67,21 @@ class Stylish(module.Module):
                  "丹日亡句ヨ乍呂廾工勹片し冊几回尸甲尺己卞凵レ山メと乙",
     }
 
+    tables: Dict[str, Dict[int, str]]
+    inline_cache: util.cache.TTLCache
+
+    async def on_load(self) -> None:
+        normal = [ord(char) for char in self.styles["normal"]]
+        self.tables = {
+            name: dict(zip(normal, style))
+            for name, style in self.styles.items()
+        }
+        self.inline_cache = util.cache.TTLCache(ttl=10 * 60, maxsize=256)
+
     def font_gen(self, input_str: str, font_choice: str = None) -> str:
         font_choice = font_choice or random.choice(list(self.styles))
-        unstyled = list(self.styles["normal"])
-        if font := self.styles.get(font_choice):
-            font = list(font)
-            for x in input_str:
-                if x in unstyled:
-                    input_str = input_str.replace(x, font[unstyled.index(x)])
-            return input_str
+        if (table := self.tables.get(font_choice)) is not None:
+            return input_str.translate(table)
 
     @command.desc("Make text stylish")
     async def cmd_style(self, ctx: command.Context):
@@ -89,10 +95,8 @@ class Stylish(module.Module):
         await ctx.respond("🧙‍♂️ `Doing some magik ...`")
         return self.font_gen(inp_text.strip())
 
-    @listener.pattern(r"(?i)^stylish\s([\S\s]+)")
-    async def on_inline_query(self, query: InlineQuery) -> None:
-        text = query.matches[0].group(1).strip()
-        results: List = []
+    def get_inline_results(self, text: str) -> List[InlineQueryResultArticle]:
+        results: List[InlineQueryResultArticle] = []
         for f_name in sorted(list(self.styles)[1:]):
             styled_str = self.font_gen(text, f_name)
             results.append(
@@ -102,6 +106,17 @@ class Stylish(module.Module):
                         f"`{styled_str}`"),
                     description=styled_str,
                 ))
+
+        return results
+
+    @listener.pattern(r"(?i)^stylish\s([\S\s]+)")
+    async def on_inline_query(self, query: InlineQuery) -> None:
+        text = query.matches[0].group(1).strip()
+        results = self.inline_cache.get(text)
+        if results is None:
+            results = self.get_inline_results(text)
+            self.inline_cache.set(text, results)
+
         await query.answer(
             results=results,
             cache_time=3,
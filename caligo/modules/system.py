@@ -1,6 +1,5 @@
 import asyncio
 import inspect
-import io
 import os
 import re
 import sys
@@ -16,6 +15,12 @@ from motor.motor_asyncio import AsyncIOMotorDatabase
 
 from .. import command, module, util
 
+# Characters of shell output kept in memory and shown while it runs
+SHELL_BUFFER_SIZE = 64 * 1024
+SHELL_TAIL_SIZE = 3072
+SHELL_EDIT_INTERVAL = 3
+EVAL_BUFFER_SIZE = 64 * 1024
+
 
 class SystemModule(module.Module):
     name: ClassVar[str] = "System"
@@ -52,6 +57,23 @@ class SystemModule(module.Module):
         sysinfo = "\n".join(stdout.split("\n")[2:]) if ret == 0 else stdout
         return f"```{sysinfo}```{err}"
 
+    @command.desc("Store the peers of recent dialogs in the session")
+    @command.usage("[number of dialogs?]", optional=True)
+    @command.alias("warm")
+    async def cmd_warmpeers(self, ctx: command.Context) -> str:
+        limit = int(ctx.input) if ctx.input.isdigit() else 200
+
+        await ctx.respond("Warming up peers...")
+        start = util.time.usec()
+        count = 0
+        # Resolving dialogs stores their access hashes in the session file
+        async for dialog in self.bot.client.iter_dialogs(limit=limit):
+            self.bot.chats_cache.set(dialog.chat.id, dialog.chat)
+            count += 1
+
+        delta = util.time.format_duration_us(util.time.usec() - start)
+        return f"Stored peers of __{count}__ dialogs in {delta}."
+
     @command.desc("Test Internet speed")
     @command.alias("stest", "st")
     async def cmd_speedtest(self, ctx: command.Context) -> str:
@@ -82,50 +104,77 @@ class SystemModule(module.Module):
 
         return status
 
-    @command.desc("Run a snippet in a shell")
-    @command.usage("[shell snippet]")
+    @command.desc("Run a snippet in a shell, -f to get the full output")
+    @command.usage("[-f?] [shell snippet]")
     @command.alias("sh")
-    async def cmd_shell(self, ctx: command.Context) -> str:
+    async def cmd_shell(self, ctx: command.Context) -> Optional[str]:
         snip = ctx.input
+        # Only a leading flag, the snippet can have its own
+        full = snip.startswith("-f ")
+        if full:
+            snip = snip[3:].strip()
         if not snip:
             return "Give me command to run."
 
         await ctx.respond("Running snippet...")
         before = util.time.usec()
 
+        out = util.system.OutputBuffer(SHELL_BUFFER_SIZE, spill=full)
+        status = util.tg.StatusMessage(ctx, interval=SHELL_EDIT_INTERVAL)
+
+        def render(body: str, footer: str = "") -> str:
+            el_us = util.time.usec() - before
+            tail = body[-SHELL_TAIL_SIZE:] or "[no output]\n"
+            if not tail.endswith("\n"):
+                tail += "\n"
+            if len(body) > SHELL_TAIL_SIZE or out.truncated:
+                tail = f"[...]\n{tail}"
+
+            return (f"**CMD:**\n```{snip}```\n\n**Output:**\n```{tail}```"
+                    f"{footer}\n`Time: {util.time.format_duration_us(el_us)}`")
+
+        async def show_tail() -> None:
+            seen = 0
+            while True:
+                await asyncio.sleep(1)
+                if out.written != seen:
+                    seen = out.written
+                    await status.update(render(out.tail(), "\n🕑 Running..."))
+
+        ticker = self.bot.loop.create_task(show_tail())
+        # The spill file is removed however the command ends
         try:
-            stdout, _, ret = await util.system.run_command(
-                snip,
-                shell=True,
-                timeout=120  # skipcq: BAN-B604
-            )
-        except FileNotFoundError as E:
-            after = util.time.usec()
-            return (
-                f"**CMD:**\n```{snip}```\n\n"
-                "**Output:**\n"
-                f"⚠️ Error executing command:\n```{util.error.format_exception(E)}```\n\n"
-                f"Time: {util.time.format_duration_us(after - before)}")
-        except asyncio.TimeoutError:
-            after = util.time.usec()
-            return (f"**CMD:**\n```{snip}```\n\n"
-                    "**Output:**\n"
-                    "🕑 Snippet failed to finish within 2 minutes.\n\n"
-                    f"`Time: {util.time.format_duration_us(after - before)}`")
-
-        after = util.time.usec()
-
-        el_us = after - before
-        el_str = f"\n`Time: {util.time.format_duration_us(el_us)}`"
+            try:
+                ret = await util.system.stream_command(
+                    snip,
+                    sink=out.write,
+                    transform=self.bot.redact_message,
+                    shell=True,  # skipcq: BAN-B604
+                    timeout=120)
+            except FileNotFoundError as E:
+                return render(
+                    "", "⚠️ Error executing command:\n"
+                    f"```{util.error.format_exception(E)}```\n")
+            except asyncio.TimeoutError:
+                ret = None
+            finally:
+                ticker.cancel()
+
+            if ret is None:
+                footer = "🕑 Snippet failed to finish within 2 minutes."
+            else:
+                footer = f"⚠️ Return code: {ret}" if ret != 0 else ""
 
-        if not stdout:
-            stdout = "[no output]"
-        elif stdout[-1:] != "\n":
-            stdout += "\n"
+            await status.update(render(out.tail(), footer), force=True)
+            spilled = out.spilled()
+            if spilled is not None and out.written:
+                await ctx.msg.reply_document(spilled,
+                                             file_name="output.txt.gz",
+                                             caption=f"`{out.written}` chars")
+        finally:
+            out.close()
 
-        stdout = self.bot.redact_message(stdout)
-        err = f"⚠️ Return code: {ret}" if ret != 0 else ""
-        return f"**CMD:**\n```{snip}```\n\n**Output:**\n```{stdout}```{err}{el_str}"
+        return None
 
     @command.desc("Evaluate code")
     @command.usage("[code snippet]")
@@ -135,7 +184,7 @@ class SystemModule(module.Module):
         if not code:
             return "Give me code to evaluate."
 
-        out_buf = io.StringIO()
+        out_buf = util.system.OutputBuffer(EVAL_BUFFER_SIZE)
 
         async def _eval() -> Tuple[str, str]:
 
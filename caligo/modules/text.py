@@ -1,10 +1,9 @@
 import base64
 import binascii
-import random
 import unicodedata
 from typing import ClassVar
 
-from .. import command, module
+from .. import command, module, util
 
 
 class TextModule(module.Module):
@@ -13,10 +12,10 @@ class TextModule(module.Module):
     @command.desc("Unicode character from hex codepoint")
     @command.usage("[hexadecimal Unicode codepoint]")
     async def cmd_uni(self, ctx: command.Context) -> str:
-        codepoint = ctx.input
+        codepoint = ctx.input.strip()
         try:
             return chr(int(codepoint, 16))
-        except ValueError:
+        except (ValueError, OverflowError):
             return "__Input is out of Unicode's range of__ `0x00000` __to__ `0xFFFFF` __range.__"
 
     @command.desc("Apply a sarcasm/mocking filter to the given text")
@@ -29,12 +28,7 @@ class TextModule(module.Module):
         elif not text and not ctx.msg.reply_to_message:
             return "__Give me a text or reply to a message.__"
 
-        chars = list(text)
-        for idx, ch in enumerate(chars):
-            ch = ch.upper() if random.choice((True, False)) else ch.lower()
-            chars[idx] = ch
-
-        return "".join(chars)
+        return util.text.mock(text)
 
     @command.desc("Apply strike-through formatting to the given text")
     @command.usage("[text to format]", reply=True)
@@ -46,7 +40,7 @@ class TextModule(module.Module):
         elif not text and not ctx.msg.reply_to_message:
             return "__Give me a text or reply to a message.__"
 
-        return "\u0336".join(text) + "\u0336"
+        return util.text.strike(text)
 
     @command.desc("Dissect a string into named Unicode codepoints")
     @command.usage("[text to dissect]", reply=True)
@@ -90,7 +84,7 @@ class TextModule(module.Module):
         elif not text and not ctx.msg.reply_to_message:
             return "__Give me a text or reply to a message.__"
 
-        return "\n".join("👏".join(line.split()) for line in text.split("\n"))
+        return util.text.clap(text)
 
     @command.desc("Encode text into Base64")
     @command.alias("b64encode", "b64e")
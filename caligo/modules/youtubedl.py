@@ -1,14 +1,29 @@
+import asyncio
 import os
 import re
-from collections import defaultdict
+import shutil
+from collections import Counter, defaultdict
 from functools import wraps
 from glob import glob
 from math import floor
-from typing import Any, ClassVar, Dict, List, Optional, Pattern, Tuple, Union
+from pathlib import Path
+from typing import (
+    Any,
+    ClassVar,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Tuple,
+    Union,
+)
+from urllib.parse import urlsplit, urlunsplit
 from uuid import uuid4
 
 import ujson
 import youtube_dl
+from motor.core import AgnosticCollection
 from pyrogram.types import (
     CallbackQuery,
     InlineKeyboardButton,
@@ -20,7 +35,6 @@ from pyrogram.types import (
 from youtube_dl.utils import (
     DownloadError,
     ExtractorError,
-    GeoRestrictedError,
     UnsupportedError,
 )
 from youtubesearchpython.__future__ import VideosSearch
@@ -29,6 +43,11 @@ from .. import command, listener, module, util
 
 yt_result_vid = Optional[Dict[str, str]]
 
+# Kept in whatever container youtube-dl merges it to
+MKV_FORMAT = "bestvideo+bestaudio/best"
+# H.264 and AAC, so making it streamable is a plain remux
+MP4_FORMAT = "bestvideo[vcodec^=avc1]+bestaudio[ext=m4a]/best[ext=mp4]/best"
+
 
 def loop_safe(func):
 
@@ -43,9 +62,23 @@ class YouTube(module.Module):
     name: ClassVar[str] = "YouTube"
     yt_datafile: str
     yt_link_regex: Pattern
+    archive: AgnosticCollection
     base_yt_url: str
     default_thumb: str
     url_regex: Pattern
+    info_cache: util.cache.TTLCache
+    pool: util.ytdl.DownloadPool
+    format_keys: ClassVar[Tuple[str, ...]] = (
+        "format",
+        "format_id",
+        "format_note",
+        "ext",
+        "filesize",
+        "acodec",
+        "abr",
+        "tbr",
+        "width",
+    )
 
     async def on_load(self):
         self.yt_datafile = "yt_data.json"
@@ -57,6 +90,16 @@ class YouTube(module.Module):
         )
         self.base_yt_url = "https://www.youtube.com/watch?v="
         self.default_thumb = "https://i.imgur.com/4LwPLai.png"
+        # Formats links expire after a few hours, don't keep them too long
+        self.info_cache = util.cache.TTLCache(ttl=30 * 60, maxsize=256)
+        self.archive = self.bot.get_db("youtube")
+        self.pool = util.ytdl.DownloadPool(
+            self.bot.getConfig.ytdl_workers,
+            memory_limit=self.bot.getConfig.ytdl_memory_limit,
+        )
+
+    async def on_stop(self) -> None:
+        self.pool.close()
 
     @staticmethod
     def format_line(key: str, value: str) -> str:
@@ -114,35 +157,85 @@ class YouTube(module.Module):
             return key, search_data[0]
 
     async def get_ytthumb(self, yt_id: str) -> str:
-        for quality in (
-                "maxresdefault.jpg",
-                "hqdefault.jpg",
-                "sddefault.jpg",
-                "mqdefault.jpg",
-                "default.jpg",
-        ):
-            link = f"https://i.ytimg.com/vi/{yt_id}/{quality}"
-            status = await util.aiorequest(self.bot.http, link, mode="status")
+        qualities = (
+            "maxresdefault.jpg",
+            "hqdefault.jpg",
+            "sddefault.jpg",
+            "mqdefault.jpg",
+            "default.jpg",
+        )
+        links = [
+            f"https://i.ytimg.com/vi/{yt_id}/{quality}" for quality in qualities
+        ]
+        # Probe every quality at once, then keep the best one that exists
+        statuses = await asyncio.gather(
+            *(util.aiorequest(self.bot.http, link, mode="status")
+              for link in links),
+            return_exceptions=True,
+        )
+        for link, status in zip(links, statuses):
             if status == 200:
-                thumb_link = link
-                break
-        else:
-            thumb_link = self.default_thumb
-        return thumb_link
+                return link
+
+        return self.default_thumb
+
+    def get_cache_key(self, url: str) -> str:
+        """Normalize url so every link to the same video shares one entry"""
+        if match := self.yt_link_regex.search(url):
+            return "yt:" + match.group(1)
+
+        parts = urlsplit(url.strip())
+        return urlunsplit((parts.scheme.lower() or "https",
+                           parts.netloc.lower(), parts.path.rstrip("/"),
+                           parts.query, ""))
+
+    async def get_info(self, url: str) -> Dict[str, Any]:
+        """Extracted info of url, cached and shared between concurrent callers
+
+        Raises whatever youtube_dl raises, failures are never cached.
+        """
+        key = self.get_cache_key(url)
+
+        async def extract() -> Dict[str, Any]:
+            if key.startswith("yt:"):
+                yt_id = key[3:]
+                resp, thumb = await asyncio.gather(
+                    self.extract_info(f"{self.base_yt_url}{yt_id}"),
+                    self.get_ytthumb(yt_id),
+                )
+            else:
+                resp = await self.extract_info(url)
+                thumb = resp.get("thumbnail") or self.default_thumb
+
+            return dict(
+                title=resp.get("title"),
+                webpage_url=resp.get("webpage_url"),
+                description=resp.get("description"),
+                duration=resp.get("duration"),
+                uploader=resp.get("uploader"),
+                thumb=thumb,
+                formats=[{
+                    k: frmt[k] for k in self.format_keys if k in frmt
+                } for frmt in resp.get("formats") or []],
+            )
+
+        return await self.info_cache.fetch(key, extract)
+
+    @loop_safe
+    def extract_info(self, url: str) -> Dict[str, Any]:
+        return youtube_dl.YoutubeDL({
+            "no-playlist": True
+        }).extract_info(url, download=False)
 
     @staticmethod
     def get_choice_by_id(choice_id: str, media_type: str) -> Tuple[str, str]:
         if choice_id == "mkv":
             # default format selection
-            choice_str = "bestvideo+bestaudio/best"
+            choice_str = MKV_FORMAT
             disp_str = "best(video+audio)"
         elif choice_id == "mp4":
-            # Download best Webm / Mp4 format available or any other best if no mp4
-            # available
-            choice_str = ("bestvideo[ext=webm]+251/bestvideo[ext=mp4]+"
-                          "(258/256/140/bestaudio[ext=m4a])/"
-                          "bestvideo[ext=webm]+(250/249)/best")
-            disp_str = "best(video+audio)[webm/mp4]"
+            choice_str = MP4_FORMAT
+            disp_str = "best(video+audio)[mp4]"
         elif choice_id == "mp3":
             choice_str = "320"
             disp_str = "320 Kbps"
@@ -161,8 +254,7 @@ class YouTube(module.Module):
         if match := self.yt_link_regex.search(url):
             return match.group(1)
 
-    @loop_safe
-    def get_download_button(
+    async def get_download_button(
         self,
         yt_id: str,
         body: bool = False
@@ -183,9 +275,7 @@ class YouTube(module.Module):
             )
         ]]
         try:
-            vid_data = youtube_dl.YoutubeDL({
-                "no-playlist": True
-            }).extract_info(f"{self.base_yt_url}{yt_id}", download=False)
+            vid_data = await self.get_info(f"{self.base_yt_url}{yt_id}")
         except ExtractorError:
             vid_data = None
             buttons += best_audio_btn
@@ -237,14 +327,17 @@ class YouTube(module.Module):
             vid_body = (
                 f"<b>[{vid_data.get('title')}]({vid_data.get('webpage_url')})</b>"
                 if vid_data else None)
-            return {"msg": vid_body, "buttons": InlineKeyboardMarkup(buttons)}
+            return {
+                "msg": vid_body,
+                "buttons": InlineKeyboardMarkup(buttons),
+                "thumb": (vid_data["thumb"]
+                          if vid_data else await self.get_ytthumb(yt_id)),
+            }
         return InlineKeyboardMarkup(buttons)
 
     async def video_downloader(self, url: str, uid: str, rnd_key: str,
                                prog_func):
         options = {
-            "addmetadata":
-                True,
             "geo_bypass":
                 True,
             "nocheckcertificate":
@@ -254,26 +347,21 @@ class YouTube(module.Module):
                              "%(title)s-%(format)s.%(ext)s"),
             "logger":
                 self.log,
-            "progress_hooks": [prog_func],
             "format":
                 uid,
             "writethumbnail":
                 True,
-            "prefer_ffmpeg":
-                True,
-            "postprocessors": [
-                {
-                    "key": "FFmpegMetadata"
-                }
-                # ERROR R15: Memory quota vastly exceeded
-                # {"key": "FFmpegVideoConvertor", "preferedformat": "mp4"},
-            ],
             "quiet":
                 True,
             "logtostderr":
                 False,
         }
-        return await self.ytdownloader(url, options)
+        info = await self.ytdownloader(url, options, prog_func)
+        # The mkv choice is kept as downloaded
+        if info is not None and uid != MKV_FORMAT:
+            await self.postprocess(rnd_key, info)
+
+        return info
 
     async def audio_downloader(self, url: str, uid: str, rnd_key: str,
                                prog_func):
@@ -283,55 +371,108 @@ class YouTube(module.Module):
                              "%(title)s-%(format)s.%(ext)s"),
             "logger":
                 self.log,
-            "progress_hooks": [prog_func],
             "writethumbnail":
                 True,
-            "prefer_ffmpeg":
-                True,
             "format":
                 "bestaudio/best",
             "geo_bypass":
                 True,
             "nocheckcertificate":
                 True,
-            "postprocessors": [
-                {
-                    "key": "FFmpegExtractAudio",
-                    "preferredcodec": "mp3",
-                    "preferredquality": uid,
-                },
-                {
-                    "key": "EmbedThumbnail"
-                },  # ERROR: Conversion failed!
-                {
-                    "key": "FFmpegMetadata"
-                },
-            ],
             "quiet":
                 True,
             "logtostderr":
                 False,
         }
-        return await self.ytdownloader(url, options)
+        info = await self.ytdownloader(url, options, prog_func)
+        if info is not None:
+            await self.postprocess(rnd_key, info, bitrate=uid)
 
-    @loop_safe
-    def ytdownloader(self, url: str, options: Dict):
+        return info
+
+    def find_media(self, rnd_key: str) -> Tuple[Optional[str], Optional[str]]:
+        """Returns the downloaded media and its thumbnail, if any."""
+        media = thumb = None
+        for file in glob(
+                os.path.join(self.bot.getConfig.downloadPath, rnd_key, "*")):
+            # Exclude incomplete files
+            if file.lower().endswith((".jpg", ".png", ".webp")):
+                thumb = file
+            elif not file.lower().endswith(".part"):
+                media = file
+
+        return media, thumb
+
+    async def postprocess(self,
+                          rnd_key: str,
+                          info: Dict[str, Any],
+                          bitrate: Optional[str] = None) -> None:
+        """Turns the download into a streamable mp4 or a tagged mp3.
+
+        Everything is done in a single ffmpeg pass with bounded threads and
+        memory, if it fails the original download is kept as is. An unreadable
+        thumbnail only skips the cover art.
+        """
+        media, thumb = self.find_media(rnd_key)
+        if media is None:
+            return
+
+        src = Path(media)
+        dest = src.with_suffix(".mp3" if bitrate else ".mp4")
+        tmp = src.with_suffix(".tmp" + dest.suffix)
+        metadata = {
+            "title": info.get("title"),
+            "artist": info.get("uploader"),
+            "date": info.get("upload_date"),
+            "comment": info.get("webpage_url"),
+        }
+        limits = dict(threads=self.bot.getConfig.ffmpeg_threads,
+                      memory_limit=self.bot.getConfig.ffmpeg_memory_limit)
         try:
-            with youtube_dl.YoutubeDL(options) as ytdl:
-                out = ytdl.download([url])
-        except DownloadError:
-            self.log.error("[DownloadError] : Failed to Download Video")
-        except GeoRestrictedError:
-            self.log.error(
-                "[GeoRestrictedError] : The uploader has not made this video"
-                " available in your country")
-        except Exception as all_e:
-            self.log.exception(f"[{all_e.__class__.__name__}] - {all_e}")
-        else:
-            return out
+            if bitrate:
+                try:
+                    await util.ffmpeg.to_mp3(
+                        src,
+                        tmp,
+                        bitrate=bitrate,
+                        cover=Path(thumb) if thumb else None,
+                        metadata=metadata,
+                        **limits)
+                except util.ffmpeg.CoverError as e:
+                    self.log.warning(f"Skipping the cover of '{src.name}': {e}")
+                    await util.ffmpeg.to_mp3(src,
+                                             tmp,
+                                             bitrate=bitrate,
+                                             metadata=metadata,
+                                             **limits)
+            else:
+                await util.ffmpeg.make_streamable(src,
+                                                  tmp,
+                                                  metadata=metadata,
+                                                  **limits)
+        except (FileNotFoundError, util.ffmpeg.FFmpegError) as e:
+            self.log.error(f"Post-processing of '{src.name}' failed: {e}")
+            if tmp.exists():
+                tmp.unlink()
+            return
 
-    @loop_safe
-    def generic_extractor(self, url: str) -> Optional[Dict[str, Any]]:
+        src.unlink()
+        tmp.rename(dest)
+
+    async def ytdownloader(self, url: str, options: Dict, prog_func=None):
+        try:
+            return await self.pool.download(url, options, progress=prog_func)
+        except util.ytdl.WorkerError as e:
+            if e.kind == "GeoRestrictedError":
+                self.log.error(
+                    "[GeoRestrictedError] : The uploader has not made this video"
+                    " available in your country")
+            elif e.kind == "DownloadError":
+                self.log.error("[DownloadError] : Failed to Download Video")
+            else:
+                self.log.error(f"[{e.kind}] - {e}")
+
+    async def generic_extractor(self, url: str) -> Optional[Dict[str, Any]]:
         buttons = [[
             InlineKeyboardButton("⭐️ BEST - 📹 Video",
                                  callback_data=f"generic_down_best_v"),
@@ -339,9 +480,7 @@ class YouTube(module.Module):
                                  callback_data=f"generic_down_best_a"),
         ]]
         try:
-            resp = youtube_dl.YoutubeDL({
-                "no-playlist": True
-            }).extract_info(url, download=False)
+            resp = await self.get_info(url)
         except UnsupportedError:
             return self.log.error(f"[URL -> {url}] - is not NOT SUPPORTED")
         except DownloadError as d_e:
@@ -385,7 +524,7 @@ class YouTube(module.Module):
             )
             return dict(
                 msg=msg,
-                thumb=resp.get("thumbnail", self.default_thumb),
+                thumb=resp["thumb"],
                 buttons=InlineKeyboardMarkup(buttons),
             )
 
@@ -419,8 +558,6 @@ class YouTube(module.Module):
                 # youtube link
                 yt_id = match.group(1)
                 if vid_data := await self.get_download_button(yt_id, body=True):
-                    # Add Thumbnail
-                    vid_data["thumb"] = await self.get_ytthumb(yt_id)
                     return vid_data
             if self.url_regex.search(query_split[0]):
                 # Matches URL regex (doesn't mean it's supported by YoutubeDL)
@@ -458,22 +595,192 @@ class YouTube(module.Module):
                                      msg=ctx.msg,
                                      downtype="video")
         await ctx.respond("Done. Uploading ...")
-        for file in glob(
-                os.path.join(self.bot.getConfig.downloadPath, rnd_id, "*")):
-            # Exclude incomplete files and thumb
-            if not file.lower().endswith((".jpg", ".png", ".webp", ".part")):
-                media_file = file
-                break
-        else:
+        media_file, _ = self.find_media(rnd_id)
+        if media_file is None:
             await ctx.respond("No Media Found", mode="error", delete_after=8)
-        await ctx.msg.reply_video(
-            video=media_file,
-            progress=util.progress,
-            supports_streaming=True,
-            progress_args=(ctx.msg, "Uploading", "video.mp4"),
-        )
+            return
+
+        async with self.bot.job("ytdl upload", ctx.msg) as job:
+            try:
+                await job.run(
+                    ctx.msg.reply_video(
+                        video=media_file,
+                        progress=util.progress,
+                        supports_streaming=True,
+                        progress_args=(job, "Uploading", "video.mp4"),
+                    ))
+            except asyncio.CancelledError:
+                return "__Upload aborted.__"
         await ctx.msg.delete()
 
+    @loop_safe
+    def extract_playlist(self, url: str) -> Iterator[Dict[str, Any]]:
+        """Returns the playlist entries, resolved lazily while iterating."""
+        ytdl = youtube_dl.YoutubeDL({
+            "extract_flat": "in_playlist",
+            "logger": self.log,
+            "quiet": True,
+        })
+        info = ytdl.extract_info(url, download=False, process=False)
+        # Channels redirect to their uploads playlist first
+        while info.get("_type") in ("url", "url_transparent"):
+            info = ytdl.extract_info(info["url"], download=False, process=False)
+
+        return iter(info.get("entries") or [info])
+
+    async def archive_entry(self, entry: Dict[str, Any], mode: str,
+                            drive: Any, msg: Message) -> bool:
+        vid = entry["id"]
+        url = entry.get("webpage_url") or entry.get("url") or vid
+        if entry.get("ie_key") == "Youtube" or not url.startswith("http"):
+            url = f"{self.base_yt_url}{vid}"
+
+        rnd_key = str(uuid4())[:8]
+        path = os.path.join(self.bot.getConfig.downloadPath, rnd_key)
+        try:
+            if mode == "audio":
+                info = await self.audio_downloader(url, "320", rnd_key, None)
+            else:
+                uid = self.get_choice_by_id("mp4", "v")[0]
+                info = await self.video_downloader(url, uid, rnd_key, None)
+
+            media, thumb = self.find_media(rnd_key)
+            if info is None or media is None:
+                return False
+            # Telegram only accepts JPEG thumbnails
+            if thumb is not None and not thumb.lower().endswith(".jpg"):
+                thumb = None
+
+            if drive is not None:
+                file = util.File(Path(media))
+                files = await drive.uploadFile(file)
+                if not isinstance(files, str):
+                    file.content, file.start_time = files, util.time.sec()
+                    await file.progress(update=False)
+            elif mode == "audio":
+                await self.bot.client.send_audio(
+                    msg.chat.id,
+                    media,
+                    title=info.get("title"),
+                    performer=info.get("uploader"),
+                    duration=int(info.get("duration") or 0),
+                    thumb=thumb)
+            else:
+                await self.bot.client.send_video(
+                    msg.chat.id,
+                    media,
+                    caption=info.get("title"),
+                    duration=int(info.get("duration") or 0),
+                    thumb=thumb,
+                    supports_streaming=True)
+        finally:
+            await util.run_sync(shutil.rmtree, path, ignore_errors=True)
+
+        await self.archive.update_one(
+            {"_id": vid},
+            {
+                "$set": {
+                    "title": info.get("title")
+                },
+                "$addToSet": {
+                    "modes": mode
+                }
+            },
+            upsert=True)
+        return True
+
+    @command.desc("Archive a whole YouTube playlist or channel")
+    @command.usage("[-a for audio] [-d to upload to Drive] [-w<workers>] "
+                   "[playlist url or reply to one]")
+    @command.alias("ytpl")
+    async def cmd_ytplaylist(self, ctx: command.Context) -> Optional[str]:
+        url = ctx.filtered_input
+        if not url and ctx.msg.reply_to_message:
+            url = (ctx.msg.reply_to_message.text or "").strip()
+        if not url:
+            return "__Pass a playlist or channel url.__"
+
+        mode = "audio" if "-a" in ctx.flags else "video"
+        drive = None
+        if "-d" in ctx.flags:
+            drive = self.bot.modules.get("GoogleDrive")
+            if drive is None:
+                return "__GoogleDrive is not loaded.__"
+        workers = max(1, int(ctx.flags.get("-w") or
+                             self.bot.getConfig.ytdl_workers))
+
+        await ctx.respond("__Expanding playlist...__")
+        try:
+            entries = await self.extract_playlist(url)
+        except DownloadError as e:
+            return f"__Failed to extract playlist:__ `{e}`"
+
+        counter = Counter()
+        last_update_time = None
+        # Bounded so entries are only expanded as fast as they're downloaded
+        queue: asyncio.Queue = asyncio.Queue(workers)
+
+        async def report(done: bool = False) -> None:
+            nonlocal last_update_time
+
+            now = util.time.sec()
+            if (not done and last_update_time is not None and
+                    (now - last_update_time).total_seconds() < 10):
+                return
+
+            last_update_time = now
+            await ctx.respond(("**Finished**" if done else "**Archiving**") +
+                              f" `{url}`\n\n"
+                              f"**Uploaded**: {counter['done']}\n"
+                              f"**Skipped**: {counter['skipped']}\n"
+                              f"**Failed**: {counter['failed']}")
+
+        async def worker() -> None:
+            while True:
+                entry = await queue.get()
+                try:
+                    ok = await self.archive_entry(entry, mode, drive, ctx.msg)
+                except Exception as e:  # skipcq: PYL-W0703
+                    self.log.error(f"Failed to archive '{entry['id']}'",
+                                   exc_info=e)
+                    ok = False
+                finally:
+                    queue.task_done()
+
+                counter["done" if ok else "failed"] += 1
+                await report()
+
+        tasks = [self.bot.loop.create_task(worker()) for _ in range(workers)]
+        try:
+            while True:
+                try:
+                    entry = await util.run_sync(next, entries, None)
+                except DownloadError as e:
+                    self.log.error(f"Playlist expansion stopped: {e}")
+                    break
+                if entry is None:
+                    break
+
+                if not entry.get("id"):
+                    continue
+                if await self.archive.find_one({
+                        "_id": entry["id"],
+                        "modes": mode
+                }):
+                    counter["skipped"] += 1
+                    continue
+
+                await queue.put(entry)
+
+            await queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        await report(done=True)
+        return None
+
     async def download_progress(self, *args, msg: Union[Message, CallbackQuery],
                                 downtype: str):
         last_update_time = None
@@ -3,17 +3,25 @@ from . import (
     aria2,
     async_helpers,
     buttons,
+    cache,
     config,
     error,
+    executors,
+    ffmpeg,
     file,
     git,
     image,
+    metrics,
     misc,
+    record,
+    redact,
     system,
     text,
     tg,
     time,
+    tracing,
     version,
+    ytdl,
 )
 from .buttons import sublists
 from .media_utils import get_file_id, get_media, progress
@@ -21,4 +29,5 @@ from .media_utils import get_file_id, get_media, progress
 BotConfig = config.BotConfig
 File = file.File
 run_sync = async_helpers.run_sync
+run_bounded = async_helpers.run_bounded
 aiorequest = aiohelper.aiorequest
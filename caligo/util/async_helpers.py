@@ -1,14 +1,94 @@
 import asyncio
 import functools
-from typing import Any, Callable, TypeVar
+from contextvars import ContextVar
+from typing import (
+    Any,
+    AsyncIterable,
+    Awaitable,
+    Callable,
+    Iterable,
+    Optional,
+    Set,
+    TypeVar,
+    Union,
+)
 
+from . import executors
+from .tracing import span
+
+Item = TypeVar("Item")
 Result = TypeVar("Result")
 
+# Wraps the calls run_sync makes from the current context, the wrapper runs
+# on the executor thread
+sync_observer: ContextVar[Optional[Callable[[Callable[[], Any]], Any]]] = (
+    ContextVar("sync_observer", default=None))
+
 
-async def run_sync(func: Callable[..., Result], *args: Any,
+async def run_sync(func: Callable[..., Result],
+                   *args: Any,
+                   pool: str = executors.IO,
                    **kwargs: Any) -> Result:
-    """Runs the given sync function (optionally with arguments) on a separate thread."""
+    """Runs the given sync function (optionally with arguments) in an executor.
+
+    pool is "io" for blocking I/O, "cpu" for short CPU-bound work or "process"
+    for heavy CPU-bound work taking and returning picklable values.
+    """
+
+    executor = executors.get(pool)
+    call = functools.partial(func, *args, **kwargs)
+    observer = sync_observer.get()
+    if observer is not None and pool != executors.PROCESS:
+        call = functools.partial(observer, call)
+
+    name = getattr(func, "__qualname__", type(func).__name__)
+    with span(name, f"executor:{pool}"):
+        return await executor.run(call)
+
+
+async def run_bounded(items: Union[Iterable[Item], AsyncIterable[Item]],
+                      func: Callable[[Item], Awaitable[Any]],
+                      limit: int) -> None:
+    """Runs func over the items with at most `limit` calls in flight.
+
+    Items are pulled lazily, only as fast as they're processed. The first
+    exception cancels the remaining calls and is raised.
+    """
+
+    slots = asyncio.Semaphore(limit)
+    tasks: Set[asyncio.Task] = set()
+    failed: asyncio.Future = asyncio.get_event_loop().create_future()
+
+    async def run(item: Item) -> None:
+        try:
+            await func(item)
+        except Exception as e:  # skipcq: PYL-W0703
+            if not failed.done():
+                failed.set_exception(e)
+        finally:
+            slots.release()
+
+    async def spawn(item: Item) -> None:
+        await slots.acquire()
+        if failed.done():
+            failed.result()
+
+        task = asyncio.get_event_loop().create_task(run(item))
+        tasks.add(task)
+        task.add_done_callback(tasks.discard)
+
+    try:
+        if hasattr(items, "__aiter__"):
+            async for item in items:
+                await spawn(item)
+        else:
+            for item in items:
+                await spawn(item)
 
-    loop = asyncio.get_event_loop()
-    return await loop.run_in_executor(None,
-                                      functools.partial(func, *args, **kwargs))
+        if tasks:
+            await asyncio.wait(tasks)
+        if failed.done():
+            failed.result()
+    finally:
+        for task in tasks:
+            task.cancel()
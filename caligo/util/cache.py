@@ -0,0 +1,169 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Generic,
+    Hashable,
+    List,
+    Optional,
+    Tuple,
+    TypeVar,
+)
+
+Value = TypeVar("Value")
+
+_MISSING = object()
+
+
+def _retrieve_exception(task: "asyncio.Task[Any]") -> None:
+    if not task.cancelled():
+        task.exception()
+
+
+class TTLCache(Generic[Value]):
+    """Size bounded LRU mapping whose entries expire after `ttl` seconds.
+
+    Concurrent `fetch` calls for the same missing key share one in-flight
+    factory call instead of each running their own.
+    """
+
+    ttl: float
+    maxsize: int
+
+    def __init__(self, ttl: float, maxsize: int = 128) -> None:
+        self.ttl = ttl
+        self.maxsize = maxsize
+
+        self._data: "OrderedDict[Hashable, Tuple[float, Value]]" = OrderedDict()
+        self._pending: Dict[Hashable, asyncio.Future] = {}
+
+    def __contains__(self, key: Hashable) -> bool:
+        return self.get(key, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            expire, value = self._data[key]
+        except KeyError:
+            return default
+
+        if expire < time.monotonic():
+            del self._data[key]
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self,
+            key: Hashable,
+            value: Value,
+            ttl: Optional[float] = None) -> None:
+        expire = time.monotonic() + (self.ttl if ttl is None else ttl)
+        self._data[key] = (expire, value)
+        self._data.move_to_end(key)
+
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            return self._data.pop(key)[1]
+        except KeyError:
+            return default
+
+    def values(self) -> List[Value]:
+        now = time.monotonic()
+        return [value for expire, value in self._data.values() if expire >= now]
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    async def fetch(self, key: Hashable,
+                    factory: Callable[[], Awaitable[Value]]) -> Value:
+        """Returns the cached value or awaits `factory` to produce it once.
+
+        The factory runs in its own task, so a cancelled caller doesn't cancel
+        it for the others waiting on the same key.
+        """
+
+        value = self.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        task = self._pending.get(key)
+        if task is None:
+            task = asyncio.get_event_loop().create_task(
+                self._load(key, factory))
+            # Every caller may be gone by the time it fails
+            task.add_done_callback(_retrieve_exception)
+            self._pending[key] = task
+
+        return await asyncio.shield(task)
+
+    async def _load(self, key: Hashable,
+                    factory: Callable[[], Awaitable[Value]]) -> Value:
+        try:
+            value = await factory()
+            self.set(key, value)
+            return value
+        finally:
+            del self._pending[key]
+
+
+class SizedCache:
+    """LRU mapping of bytes values bounded by their total size."""
+
+    max_bytes: int
+    nbytes: int
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+
+        self._data: "OrderedDict[Hashable, bytes]" = OrderedDict()
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._data
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value = self._data[key]
+        except KeyError:
+            return default
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: bytes) -> None:
+        self.pop(key)
+        # Don't flush the whole cache for something that can't fit anyway
+        if len(value) > self.max_bytes:
+            return
+
+        self._data[key] = value
+        self.nbytes += len(value)
+        while self.nbytes > self.max_bytes:
+            _, old = self._data.popitem(last=False)
+            self.nbytes -= len(old)
+
+    def pop(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            return default
+
+        self.nbytes -= len(value)
+        return value
+
+    def clear(self) -> None:
+        self._data.clear()
+        self.nbytes = 0
@@ -35,6 +35,10 @@ class BotConfig:
         self.api_hash = os.environ.get("API_HASH")
         self.db_uri = os.environ.get("DB_URI")
         self.string_session = os.environ.get("STRING_SESSION")
+        # Session files keeping the peer cache across restarts
+        path = _replace(os.environ.get("SESSION_DIR"))
+        self.session_dir = (Path(path) if path else Path.home() / ".cache" /
+                            "caligo" / "sessions")
 
         # GoogleDrive
         try:
@@ -55,3 +59,32 @@ class BotConfig:
         # Heroku
         self.heroku_app_name = _replace(os.environ.get("HEROKU_APP"))
         self.heroku_api_key = _replace(os.environ.get("HEROKU_API_KEY"))
+
+        # YouTube
+        self.ytdl_workers = int(_replace(os.environ.get("YTDL_WORKERS")) or 2)
+        mem_limit = _replace(os.environ.get("YTDL_MEMORY_LIMIT"))
+        self.ytdl_memory_limit = (int(mem_limit) * 1024 * 1024
+                                  if mem_limit else None)
+
+        # FFmpeg
+        self.ffmpeg_threads = int(
+            _replace(os.environ.get("FFMPEG_THREADS")) or 2)
+        mem_limit = _replace(os.environ.get("FFMPEG_MEMORY_LIMIT"))
+        self.ffmpeg_memory_limit = (int(mem_limit) * 1024 * 1024
+                                    if mem_limit else None)
+
+        # Executors, sizes of the pools run_sync dispatches to
+        self.io_workers = int(_replace(os.environ.get("IO_WORKERS")) or 0)
+        self.cpu_workers = int(_replace(os.environ.get("CPU_WORKERS")) or 0)
+        self.process_workers = int(
+            _replace(os.environ.get("PROCESS_WORKERS")) or 0)
+
+        # Metrics
+        port = _replace(os.environ.get("METRICS_PORT"))
+        self.metrics_port = int(port) if port else None
+        self.metrics_host = (_replace(os.environ.get("METRICS_HOST")) or
+                             "127.0.0.1")
+
+        # Update recording, for replaying real traffic offline
+        path = _replace(os.environ.get("UPDATE_LOG"))
+        self.update_log = Path(path) if path else None
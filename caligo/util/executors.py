@@ -0,0 +1,123 @@
+"""
+Named executors for run_sync, so slow blocking calls can't starve quick ones
+"""
+
+import asyncio
+import functools
+import multiprocessing
+import os
+import time
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Any, Callable, Dict, Optional, Tuple, TypeVar
+
+from . import metrics
+
+Result = TypeVar("Result")
+
+# Blocking I/O: network clients, Drive uploads, git, file access
+IO = "io"
+# Short CPU-bound work that releases the GIL or doesn't matter holding it
+CPU = "cpu"
+# Heavy CPU-bound work, arguments and results have to be picklable
+PROCESS = "process"
+
+DEFAULT_SIZES = {
+    IO: 16,
+    CPU: os.cpu_count() or 1,
+    PROCESS: min(2, os.cpu_count() or 1),
+}
+
+
+def _call(func: Callable[..., Result], *args: Any,
+          **kwargs: Any) -> Tuple[float, Result]:
+    # Runs in the executor, wall clock so it works across processes too
+    return time.time(), func(*args, **kwargs)
+
+
+class Pool:
+    """Lazily started executor with its queue depth and wait times recorded."""
+
+    name: str
+    size: int
+    in_flight: int
+
+    def __init__(self, name: str, size: int) -> None:
+        self.name = name
+        self.size = size
+        self.in_flight = 0
+
+        self._executor: Optional[Executor] = None
+
+    @property
+    def executor(self) -> Executor:
+        if self._executor is None:
+            self._executor = self._create()
+
+        return self._executor
+
+    @property
+    def queued(self) -> int:
+        """Calls waiting for a free worker."""
+
+        return max(0, self.in_flight - self.size)
+
+    def _create(self) -> Executor:
+        if self.name != PROCESS:
+            return ThreadPoolExecutor(self.size,
+                                      thread_name_prefix=f"caligo-{self.name}")
+
+        if "forkserver" in multiprocessing.get_all_start_methods():
+            ctx = multiprocessing.get_context("forkserver")
+        else:
+            ctx = multiprocessing.get_context("spawn")
+        return ProcessPoolExecutor(self.size, mp_context=ctx)
+
+    def _update(self, delta: int) -> None:
+        self.in_flight += delta
+        metrics.executor_in_flight.set(self.in_flight, pool=self.name)
+        metrics.executor_queue.set(self.queued, pool=self.name)
+
+    async def run(self, func: Callable[..., Result], *args: Any,
+                  **kwargs: Any) -> Result:
+        submitted = time.time()
+        self._update(1)
+        try:
+            started, result = await asyncio.get_event_loop().run_in_executor(
+                self.executor, functools.partial(_call, func, *args, **kwargs))
+        finally:
+            self._update(-1)
+
+        metrics.executor_wait_seconds.observe(max(0, started - submitted),
+                                              pool=self.name)
+        metrics.executor_seconds.observe(time.time() - started, pool=self.name)
+        return result
+
+    def shutdown(self) -> None:
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+
+
+pools: Dict[str, Pool] = {
+    name: Pool(name, size) for name, size in DEFAULT_SIZES.items()
+}
+
+
+def configure(**sizes: Optional[int]) -> None:
+    """Sets the pool sizes, only before the pools are first used."""
+
+    for name, size in sizes.items():
+        if size:
+            get(name).size = size
+
+
+def get(name: str) -> Pool:
+    try:
+        return pools[name]
+    except KeyError:
+        raise ValueError(f"Unknown executor '{name}'") from None
+
+
+def shutdown() -> None:
+    for pool in pools.values():
+        pool.shutdown()
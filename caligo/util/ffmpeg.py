@@ -0,0 +1,176 @@
+"""
+Low memory ffmpeg post-processing for Telegram ready media
+"""
+
+import asyncio
+import io
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional
+
+import ujson
+from PIL import Image
+
+from .async_helpers import run_sync
+from .system import run_command
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Codecs that Telegram streams straight out of an mp4 container
+MP4_VIDEO_CODECS = ("h264",)
+MP4_AUDIO_CODECS = ("aac", "mp3")
+# Cover art is scaled down before it gets embedded
+COVER_SIZE = (800, 800)
+
+
+class FFmpegError(Exception):
+    pass
+
+
+class CoverError(FFmpegError):
+    """The cover art couldn't be read as an image."""
+
+
+def _limit_memory(limit: int) -> None:
+    resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+
+
+async def _run(cmdline: List[str],
+               *,
+               in_data: Optional[bytes] = None,
+               memory_limit: Optional[int] = None) -> None:
+    kwargs: Dict[str, Any] = {}
+    if memory_limit and resource is not None:
+        kwargs["preexec_fn"] = lambda: _limit_memory(memory_limit)
+
+    _, stderr, ret = await run_command(*cmdline,
+                                       in_data=in_data,
+                                       stdout=asyncio.subprocess.DEVNULL,
+                                       stderr=asyncio.subprocess.PIPE,
+                                       **kwargs)
+    if ret != 0:
+        raise FFmpegError(stderr or f"ffmpeg exited with code {ret}")
+
+
+def _metadata_args(metadata: Optional[Mapping[str, Any]]) -> List[str]:
+    args = []
+    for key, value in (metadata or {}).items():
+        if value is not None:
+            args += ["-metadata", f"{key}={value}"]
+
+    return args
+
+
+def _cover_to_jpeg(path: Path) -> bytes:
+    im = Image.open(path).convert("RGB")
+    im.thumbnail(COVER_SIZE)
+
+    buf = io.BytesIO()
+    im.save(buf, "jpeg", quality=90)
+    return buf.getvalue()
+
+
+async def probe(path: Path) -> List[Dict[str, Any]]:
+    """Returns the streams of the given media file using ffprobe."""
+
+    stdout, stderr, ret = await run_command("ffprobe",
+                                            "-v",
+                                            "error",
+                                            "-print_format",
+                                            "json",
+                                            "-show_streams",
+                                            str(path),
+                                            stderr=asyncio.subprocess.PIPE)
+    if ret != 0:
+        raise FFmpegError(stderr or f"ffprobe exited with code {ret}")
+
+    return ujson.loads(stdout).get("streams", [])
+
+
+async def make_streamable(src: Path,
+                          dest: Path,
+                          *,
+                          metadata: Optional[Mapping[str, Any]] = None,
+                          threads: int = 2,
+                          memory_limit: Optional[int] = None) -> Path:
+    """Remuxes src into a faststart mp4, only transcoding what mp4 can't hold.
+
+    Downloads picked with an H.264/AAC format selector are only copied, the
+    libx264 transcode is a last resort for codecs mp4 can't stream, and it's
+    slow and CPU heavy.
+    """
+
+    codecs: Dict[str, List[str]] = {"video": [], "audio": []}
+    for stream in await probe(src):
+        if stream.get("disposition", {}).get("attached_pic"):
+            continue
+        if stream.get("codec_type") in codecs:
+            codecs[stream["codec_type"]].append(stream.get("codec_name"))
+
+    cmdline = [
+        "ffmpeg", "-hide_banner", "-loglevel", "error", "-nostdin", "-y",
+        "-threads",
+        str(threads), "-i",
+        str(src), "-map", "0:v:0?", "-map", "0:a:0?", "-threads",
+        str(threads)
+    ]
+    if all(codec in MP4_VIDEO_CODECS for codec in codecs["video"]):
+        cmdline += ["-c:v", "copy"]
+    else:
+        cmdline += [
+            "-c:v", "libx264", "-preset", "veryfast", "-crf", "23", "-pix_fmt",
+            "yuv420p"
+        ]
+    if all(codec in MP4_AUDIO_CODECS for codec in codecs["audio"]):
+        cmdline += ["-c:a", "copy"]
+    else:
+        cmdline += ["-c:a", "aac", "-b:a", "192k"]
+
+    cmdline += ["-movflags", "+faststart", *_metadata_args(metadata), str(dest)]
+    await _run(cmdline, memory_limit=memory_limit)
+
+    return dest
+
+
+async def to_mp3(src: Path,
+                 dest: Path,
+                 *,
+                 bitrate: str,
+                 cover: Optional[Path] = None,
+                 metadata: Optional[Mapping[str, Any]] = None,
+                 threads: int = 2,
+                 memory_limit: Optional[int] = None) -> Path:
+    """Converts src into an mp3 with embedded cover art in a single pass.
+
+    The cover is converted in memory and piped through stdin, so no
+    intermediate file is written.
+    """
+
+    cmdline = ["ffmpeg", "-hide_banner", "-loglevel", "error", "-y"]
+    in_data = None
+    if cover is None:
+        cmdline += ["-nostdin", "-threads", str(threads), "-i", str(src)]
+        cmdline += ["-map", "0:a:0"]
+    else:
+        try:
+            in_data = await run_sync(_cover_to_jpeg, cover, pool="cpu")
+        except OSError as e:  # Includes PIL's UnidentifiedImageError
+            raise CoverError(str(e)) from e
+        cmdline += ["-threads", str(threads), "-i", str(src)]
+        cmdline += [
+            "-f", "image2pipe", "-i", "pipe:0", "-map", "0:a:0", "-map", "1:v:0",
+            "-c:v", "copy", "-metadata:s:v", "title=Album cover",
+            "-metadata:s:v", "comment=Cover (front)"
+        ]
+
+    cmdline += [
+        "-threads",
+        str(threads), "-c:a", "libmp3lame", "-b:a", f"{bitrate}k",
+        "-id3v2_version", "3", *_metadata_args(metadata),
+        str(dest)
+    ]
+    await _run(cmdline, in_data=in_data, memory_limit=memory_limit)
+
+    return dest
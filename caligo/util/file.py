@@ -8,6 +8,7 @@ from urllib import parse
 from async_property import async_property
 
 from .async_helpers import run_sync
+from .metrics import transfer_bytes
 from .misc import human_readable_bytes as human
 from .time import format_duration_td as time
 from .time import sec
@@ -114,6 +115,7 @@ class File:
             return progress, False, None
 
         size = response.get("size")
+        transfer_bytes.inc(int(size), service="drive", direction="upload")
         mirrorLink = response.get("webContentLink")
         text = (f"**GoogleDrive Link**: [{self.name}]({mirrorLink}) "
                 f"(__{human(int(size))}__)")
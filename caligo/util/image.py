@@ -1,14 +1,102 @@
 import io
 import os
-from typing import IO, Mapping, Optional, Union
+from typing import IO, Awaitable, Callable, Hashable, Mapping, Optional, Union
 
 from PIL import Image
 
 from .async_helpers import run_sync
+from .cache import SizedCache
 
 FileLike = Union[str, os.PathLike, IO[bytes]]
 FormatMap = Mapping[str, FileLike]
 
+# Telegram sticker size on the longest side
+STICKER_SIZE = 512
+
+# Converted images keyed by their source plus the transform parameters
+cache = SizedCache(32 * 1024 * 1024)
+
+
+def _transform(data: bytes, fmt: str, max_size: Optional[int],
+               fit: Optional[int]) -> bytes:
+    # Runs in the pool, only bytes go in and out
+    im = Image.open(io.BytesIO(data))
+    target = fit or max_size
+    if target is not None:
+        # Let the JPEG decoder scale large images down while decoding
+        im.draft("RGB", (target, target))
+    im = im.convert("RGBA")
+
+    if fit is not None and max(im.size) != fit:
+        ratio = fit / max(im.size)
+        im = im.resize((max(1, round(im.size[0] * ratio)),
+                        max(1, round(im.size[1] * ratio))), Image.LANCZOS)
+    elif max_size is not None and max(im.size) > max_size:
+        im.thumbnail((max_size, max_size), Image.LANCZOS)
+
+    buf = io.BytesIO()
+    im.save(buf, fmt)
+    return buf.getvalue()
+
+
+async def transform(data: bytes,
+                    fmt: str = "png",
+                    *,
+                    max_size: Optional[int] = None,
+                    fit: Optional[int] = None) -> bytes:
+    """Converts the image in a worker process.
+
+    Images are scaled down to max_size if larger, or scaled to make their
+    longest side exactly fit.
+    """
+
+    return await run_sync(_transform,
+                          data,
+                          fmt,
+                          max_size,
+                          fit,
+                          pool="process")
+
+
+async def cached_transform(key: Hashable,
+                           fetch: Callable[[], Awaitable[bytes]],
+                           fmt: str = "png",
+                           *,
+                           max_size: Optional[int] = None,
+                           fit: Optional[int] = None) -> bytes:
+    """Like transform but the source is only fetched on a cache miss."""
+
+    cache_key = (key, fmt, max_size, fit)
+    result = cache.get(cache_key)
+    if result is None:
+        result = await transform(await fetch(),
+                                 fmt,
+                                 max_size=max_size,
+                                 fit=fit)
+        cache.set(cache_key, result)
+
+    return result
+
+
+def _read(src: FileLike) -> bytes:
+    if isinstance(src, (str, os.PathLike)):
+        with open(src, "rb") as f:
+            return f.read()
+
+    src.seek(0)
+    return src.read()
+
+
+def _write(dest: FileLike, data: bytes) -> None:
+    if isinstance(dest, (str, os.PathLike)):
+        with open(dest, "wb") as f:
+            f.write(data)
+        return
+
+    dest.seek(0)
+    dest.write(data)
+    dest.truncate()
+
 
 async def img_to_png(src: FileLike,
                      dest: Optional[FileLike] = None) -> FileLike:
@@ -17,35 +105,18 @@ async def img_to_png(src: FileLike,
     if dest is None:
         dest = src
 
-    def _img_to_png() -> None:
-        im = Image.open(src).convert("RGBA")
-        if isinstance(dest, io.BufferedIOBase):
-            dest.seek(0)
-        im.save(dest, "png")
-
-    await run_sync(_img_to_png)
+    data = await transform(await run_sync(_read, src), "png")
+    await run_sync(_write, dest, data)
     return dest
 
 
 async def img_to_sticker(src: FileLike, formats: FormatMap) -> FormatMap:
     """Coverts the given image to a Telegram WebP sticker PNG using Pillow."""
 
-    def _img_to_sticker() -> None:
-        im = Image.open(src).convert("RGBA")
-
-        sz = im.size
-        target = 512
-        if sz[0] > sz[1]:
-            w_ratio = target / float(sz[0])
-            h_size = int(float(sz[1]) * float(w_ratio))
-            im = im.resize((target, h_size), Image.LANCZOS)
-        else:
-            h_ratio = target / float(sz[1])
-            w_size = int(float(sz[0]) * float(h_ratio))
-            im = im.resize((w_size, target), Image.LANCZOS)
-
-        for fmt, dest in formats.items():
-            im.save(dest, fmt)
+    data = await run_sync(_read, src)
+    for fmt, dest in formats.items():
+        await run_sync(_write, dest, await transform(data,
+                                                     fmt,
+                                                     fit=STICKER_SIZE))
 
-    await run_sync(_img_to_sticker)
     return formats
@@ -1,17 +1,19 @@
 import asyncio
 import logging
 from math import floor
-from typing import Dict, Optional, Tuple
+from typing import TYPE_CHECKING, Optional
 
 from pyrogram.errors import FloodWait
 from pyrogram.types import CallbackQuery
 
 from ..core.raw import Message
+from .metrics import transfer_bytes
 from .misc import human_readable_bytes as humanbytes
 from .time import format_duration_td as time_formater
 from .time import sec as time_now
 
-_PROCESS: Dict[str, Tuple[int, int]] = {}
+if TYPE_CHECKING:
+    from ..job import Job
 
 
 def get_media(msg):
@@ -47,35 +49,39 @@ def get_file_id(msg) -> Optional[str]:
 async def progress(
     current: int,
     total: int,
-    message: Message,
+    job: "Job",
     mode: str,
     filename: str = "",
     c_q: CallbackQuery = None,
 ):
-    if message.process_is_canceled:
+    message = job.msg
+    if job.cancelled:
         # Cancel Process
         return await message._client.stop_transmission()
     # Supports callback query and message
     edit_func = c_q.edit_message_text if c_q else message.edit
-    # Unique ID to track progress
-    process_id = f"{message.chat.id}.{message.message_id}"
+    direction = "upload" if mode.lower().startswith("upload") else "download"
+    transfer_bytes.inc(current - job.transferred,
+                       service="telegram",
+                       direction=direction)
+    job.transferred = current
     if current == total:
         # Finished
-        if process_id not in _PROCESS:
+        if job.progress_start is None:
             return
-        del _PROCESS[process_id]
+        job.progress_start = None
         try:
             await edit_func(f"`finalizing {mode} process ...`")
         except FloodWait as f_w:
             await asyncio.sleep(f_w.x)
         return
     now = time_now()
-    if process_id not in _PROCESS:
-        _PROCESS[process_id] = (now, now)
-    start, last_update_time = _PROCESS[process_id]
+    if job.progress_start is None:
+        job.progress_start = job.progress_update = now
+    start = job.progress_start
     # ------------------------------------ #
-    if (now - last_update_time) >= 8:
-        _PROCESS[process_id] = (start, now)
+    if (now - job.progress_update) >= 8:
+        job.progress_update = now
         # Only edit message once every 8 seconds to avoid ratelimits
         after = now - start
         speed = current / after
@@ -0,0 +1,244 @@
+"""
+In-process metrics rendered in the Prometheus text format
+"""
+
+import bisect
+import time
+from contextlib import contextmanager
+from typing import (
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Type,
+    TypeVar,
+)
+
+LabelValues = Tuple[str, ...]
+Sample = Tuple[str, str, float]
+MetricType = TypeVar("MetricType", bound="Metric")
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+                   30, 60)
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", r"\\").replace("\n", r"\n").replace('"', r"\"")
+
+
+def _format_labels(names: Sequence[str],
+                   values: Sequence[str],
+                   extra: Sequence[Tuple[str, str]] = ()) -> str:
+    pairs = [*zip(names, values), *extra]
+    if not pairs:
+        return ""
+
+    return "{" + ",".join(f'{key}="{_escape(value)}"'
+                          for key, value in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if float(value).is_integer():
+        return str(int(value))
+
+    return repr(float(value))
+
+
+class Metric:
+    kind: str = "untyped"
+
+    name: str
+    doc: str
+    labels: Tuple[str, ...]
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()) -> None:
+        self.name = name
+        self.doc = doc
+        self.labels = tuple(labels)
+
+    def _key(self, labels: Dict[str, str]) -> LabelValues:
+        return tuple(str(labels.get(name, "")) for name in self.labels)
+
+    def samples(self) -> Iterator[Sample]:
+        raise NotImplementedError
+
+    def render(self) -> str:
+        lines = [
+            f"# HELP {self.name} {self.doc}", f"# TYPE {self.name} {self.kind}"
+        ]
+        for suffix, labels, value in self.samples():
+            lines.append(f"{self.name}{suffix}{labels} {_format_value(value)}")
+
+        return "\n".join(lines)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, doc: str, labels: Sequence[str] = ()) -> None:
+        super().__init__(name, doc, labels)
+
+        self._values: Dict[LabelValues, float] = {}
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        key = self._key(labels)
+        self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> Iterator[Sample]:
+        for key, value in sorted(self._values.items()):
+            yield "", _format_labels(self.labels, key), value
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    _func: Optional[Callable[[], float]] = None
+
+    def set(self, value: float, **labels: str) -> None:
+        self._values[self._key(labels)] = value
+
+    def dec(self, amount: float = 1, **labels: str) -> None:
+        self.inc(-amount, **labels)
+
+    def set_function(self, func: Callable[[], float]) -> None:
+        """Computes the unlabelled value when rendered."""
+
+        self._func = func
+
+    def samples(self) -> Iterator[Sample]:
+        if self._func is not None:
+            yield "", "", self._func()
+            return
+
+        yield from super().samples()
+
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    buckets: Tuple[float, ...]
+
+    def __init__(self,
+                 name: str,
+                 doc: str,
+                 labels: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS) -> None:
+        super().__init__(name, doc, labels)
+
+        self.buckets = tuple(sorted(buckets))
+        # Per bucket counts, the last one is +Inf
+        self._counts: Dict[LabelValues, List[int]] = {}
+        self._sums: Dict[LabelValues, float] = {}
+
+    def observe(self, value: float, **labels: str) -> None:
+        key = self._key(labels)
+        counts = self._counts.get(key)
+        if counts is None:
+            counts = self._counts[key] = [0] * (len(self.buckets) + 1)
+            self._sums[key] = 0
+
+        counts[bisect.bisect_left(self.buckets, value)] += 1
+        self._sums[key] += value
+
+    @contextmanager
+    def time(self, **labels: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def samples(self) -> Iterator[Sample]:
+        for key, counts in sorted(self._counts.items()):
+            total = 0
+            for bound, count in zip((*self.buckets, float("inf")), counts):
+                total += count
+                yield "_bucket", _format_labels(
+                    self.labels, key, (("le", _format_value(bound)),)), total
+
+            labels = _format_labels(self.labels, key)
+            yield "_sum", labels, self._sums[key]
+            yield "_count", labels, total
+
+
+class Registry:
+    """Named metrics, registering a name again returns the existing one."""
+
+    def __init__(self) -> None:
+        self._metrics: Dict[str, Metric] = {}
+
+    def _register(self, cls: Type[MetricType], name: str, *args,
+                  **kwargs) -> MetricType:
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = cls(name, *args, **kwargs)
+        elif not isinstance(metric, cls):
+            raise ValueError(f"Metric '{name}' is a {metric.kind}")
+
+        return metric
+
+    def counter(self, name: str, doc: str,
+                labels: Sequence[str] = ()) -> Counter:
+        return self._register(Counter, name, doc, labels)
+
+    def gauge(self, name: str, doc: str, labels: Sequence[str] = ()) -> Gauge:
+        return self._register(Gauge, name, doc, labels)
+
+    def histogram(self,
+                  name: str,
+                  doc: str,
+                  labels: Sequence[str] = (),
+                  buckets: Sequence[float] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(Histogram, name, doc, labels, buckets)
+
+    def render(self) -> str:
+        return "\n".join(self._metrics[name].render()
+                         for name in sorted(self._metrics)) + "\n"
+
+
+registry = Registry()
+
+command_seconds = registry.histogram("caligo_command_seconds",
+                                     "Time spent handling a command",
+                                     ("command",))
+command_errors = registry.counter("caligo_command_errors_total",
+                                  "Commands that raised an exception",
+                                  ("command",))
+listener_seconds = registry.histogram("caligo_listener_seconds",
+                                      "Time spent in event listeners",
+                                      ("event",))
+listeners_running = registry.gauge("caligo_listeners_running",
+                                   "Listener tasks still running", ("event",))
+db_seconds = registry.histogram("caligo_db_seconds", "MongoDB call latency",
+                                ("collection", "method"))
+telegram_seconds = registry.histogram("caligo_telegram_seconds",
+                                      "Telegram API call latency",
+                                      ("method",))
+floodwaits = registry.counter("caligo_floodwait_total",
+                              "FloodWait errors raised by the Telegram API",
+                              ("method",))
+floodwait_seconds = registry.counter("caligo_floodwait_seconds_total",
+                                     "Seconds requested by FloodWait errors",
+                                     ("method",))
+transfer_bytes = registry.counter("caligo_transfer_bytes_total",
+                                  "Bytes moved by file transfers",
+                                  ("service", "direction"))
+executor_queue = registry.gauge("caligo_executor_queue",
+                                "Calls waiting for a free executor worker",
+                                ("pool",))
+executor_in_flight = registry.gauge("caligo_executor_in_flight",
+                                    "Calls queued or running in an executor",
+                                    ("pool",))
+executor_wait_seconds = registry.histogram(
+    "caligo_executor_wait_seconds",
+    "Time calls waited for an executor worker", ("pool",))
+executor_seconds = registry.histogram("caligo_executor_seconds",
+                                      "Time calls ran in an executor",
+                                      ("pool",))
+loop_lag = registry.gauge("caligo_event_loop_lag_seconds",
+                          "How late the event loop woke up from a sleep")
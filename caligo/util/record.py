@@ -0,0 +1,230 @@
+"""
+Opt-in recording of incoming updates, sanitized for replaying them offline
+"""
+
+import functools
+import gzip
+import hashlib
+import os
+import re
+import time
+from pathlib import Path
+from typing import (
+    Any,
+    Callable,
+    Dict,
+    Iterator,
+    List,
+    Optional,
+    Pattern,
+    Sequence,
+)
+
+import pyrogram
+import ujson
+
+RECORD_VERSION = 1
+# Records written between two flushes of the log file
+FLUSH_EVERY = 100
+
+MEDIA_TYPES = ("animation", "audio", "document", "photo", "sticker", "video",
+               "video_note", "voice")
+
+# Leading inline keyword and callback data namespace kept unmasked
+_KEYWORD = re.compile(r"\w{1,32}(?=\s|$)")
+_CALLBACK = re.compile(r"[^\W\d_]{1,32}[_(]")
+_LETTER = re.compile(r"[^\W\d_]")
+_DIGIT = re.compile(r"\d")
+
+
+@functools.lru_cache(maxsize=8)
+def command_pattern(prefixes: Sequence[str]) -> Pattern[str]:
+    """Matches a leading command using one of the given prefixes.
+
+    A bot username after the command, like in "/start@bot", isn't included.
+    """
+
+    alternatives = "|".join(re.escape(prefix) for prefix in prefixes if prefix)
+    if not alternatives:
+        # Can't match anything
+        return re.compile(r"(?!)")
+
+    return re.compile(rf"(?:{alternatives})\w{{1,32}}(?=[\s@]|$)")
+
+
+def mask(text: Optional[str],
+         keep: Optional[Pattern[str]] = None) -> Optional[str]:
+    """Hides the text but keeps its shape and what `keep` matches upfront."""
+
+    if not text:
+        return text
+
+    match = keep.match(text) if keep is not None else None
+    end = match.end() if match else 0
+
+    return text[:end] + _DIGIT.sub("0", _LETTER.sub("x", text[end:]))
+
+
+class UpdateRecorder:
+    """Appends updates as gzipped JSON lines with their arrival time.
+
+    User and chat ids are replaced by salted hashes, the salt isn't stored so
+    they are only stable within one recording session. Texts are masked with
+    mask(), only keeping a leading command with one of the prefixes returned
+    by `prefixes` for the receiving client. Media are reduced to their type
+    and size.
+    """
+
+    path: Path
+    count: int
+
+    def __init__(self, path: Path, uid: int,
+                 prefixes: Callable[[pyrogram.Client], Sequence[str]]) -> None:
+        self.path = path
+        self.count = 0
+
+        self._uid = uid
+        self._prefixes = prefixes
+        self._salt = os.urandom(16)
+        self._start = time.monotonic()
+        self._pending = 0
+
+        path.parent.mkdir(parents=True, exist_ok=True)
+        # Sessions are appended as gzip members, read_log() joins them
+        self._file = gzip.open(path, "at", encoding="utf-8")
+        self._write({"v": RECORD_VERSION, "start": int(time.time())})
+
+    def _write(self, record: Dict[str, Any]) -> None:
+        self._file.write(ujson.dumps(record) + "\n")
+
+        self._pending += 1
+        if self._pending >= FLUSH_EVERY:
+            self.flush()
+
+    def flush(self) -> None:
+        self._file.flush()
+        self._pending = 0
+
+    def close(self) -> None:
+        if not self._file.closed:
+            self._file.close()
+
+    def _id(self, value: Optional[int]) -> Optional[int]:
+        if value is None:
+            return None
+        if value == self._uid:
+            return 0
+
+        digest = hashlib.blake2b(str(abs(value)).encode(),
+                                 digest_size=4,
+                                 key=self._salt).digest()
+        pseudonym = int.from_bytes(digest, "big") + 1
+        # Keep the id ranges so the chat kind can still be told apart
+        if value <= -1000000000000:
+            return -1000000000000 - pseudonym
+        return -pseudonym if value < 0 else pseudonym
+
+    def _user(self, user: Optional[pyrogram.types.User]) -> Dict[str, Any]:
+        if user is None:
+            return {}
+
+        return {"u": self._id(user.id), "ub": bool(user.is_bot)}
+
+    def _chat(self, chat: Optional[pyrogram.types.Chat]) -> Dict[str, Any]:
+        if chat is None:
+            return {}
+
+        return {"c": self._id(chat.id), "ct": chat.type}
+
+    def _message(self, client: pyrogram.Client,
+                 msg: pyrogram.types.Message) -> Dict[str, Any]:
+        record = {
+            "id": msg.message_id,
+            "out": bool(msg.outgoing),
+            **self._chat(msg.chat),
+            **self._user(msg.from_user),
+        }
+        if msg.text or msg.caption:
+            keep = command_pattern(tuple(self._prefixes(client)))
+            record["text"] = mask(msg.text or msg.caption, keep)
+            record["caption"] = msg.text is None
+        if msg.reply_to_message_id:
+            record["reply"] = msg.reply_to_message_id
+        if msg.new_chat_members:
+            record["joined"] = [self._id(u.id) for u in msg.new_chat_members]
+        if msg.left_chat_member:
+            record["left"] = self._id(msg.left_chat_member.id)
+
+        for media in MEDIA_TYPES:
+            value = getattr(msg, media, None)
+            if value is not None:
+                record["media"] = media
+                record["size"] = getattr(value, "file_size", None)
+                break
+
+        return record
+
+    def _record(self, kind: str, client: pyrogram.Client,
+                **data: Any) -> None:
+        self.count += 1
+        self._write({
+            "t": round(time.monotonic() - self._start, 4),
+            "k": kind,
+            "cl": "bot" if getattr(client, "is_bot", False) else "user",
+            **data,
+        })
+
+    async def on_message(self, client: pyrogram.Client,
+                         msg: pyrogram.types.Message) -> None:
+        self._record("edit" if msg.edit_date else "message", client,
+                     **self._message(client, msg))
+
+    async def on_deleted(self, client: pyrogram.Client,
+                         messages: List[pyrogram.types.Message]) -> None:
+        chat = messages[0].chat if messages else None
+        self._record("delete",
+                     client,
+                     ids=[msg.message_id for msg in messages],
+                     **self._chat(chat))
+
+    async def on_inline_query(self, client: pyrogram.Client,
+                              query: pyrogram.types.InlineQuery) -> None:
+        self._record("inline",
+                     client,
+                     query=mask(query.query, _KEYWORD),
+                     **self._user(query.from_user))
+
+    async def on_callback_query(self, client: pyrogram.Client,
+                                query: pyrogram.types.CallbackQuery) -> None:
+        record = {
+            "data": mask(query.data, _CALLBACK),
+            **self._user(query.from_user)
+        }
+        if query.message is not None:
+            record["id"] = query.message.message_id
+            record.update(self._chat(query.message.chat))
+        else:
+            record["inline"] = True
+
+        self._record("callback", client, **record)
+
+
+def read_log(path: Path) -> Iterator[Dict[str, Any]]:
+    """Yields the records of a log, sessions are made back to back."""
+
+    offset = 0.0
+    last = 0.0
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        for line in f:
+            record = ujson.loads(line)
+            if "v" in record:
+                if record["v"] != RECORD_VERSION:
+                    raise ValueError(
+                        f"Unsupported update log version {record['v']}")
+
+                offset = last
+                continue
+
+            record["t"] += offset
+            last = record["t"]
+            yield record
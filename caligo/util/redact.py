@@ -0,0 +1,72 @@
+import logging
+import re
+from typing import Iterable, Optional, Pattern, Tuple
+
+REDACTED = "[CONFIDENTIAL]"
+# Shorter values would redact unrelated text
+MIN_SECRET_LENGTH = 4
+
+
+class Redactor:
+    """Replaces every known secret in a single pass over the text.
+
+    The secrets are compiled into one regex alternation, longest first so
+    a secret containing another one is redacted whole.
+    """
+
+    secrets: Tuple[str, ...]
+    pattern: Optional[Pattern[str]]
+
+    def __init__(self, secrets: Iterable[Optional[str]] = ()) -> None:
+        self.secrets = ()
+        self.pattern = None
+
+        self.update(secrets)
+
+    def update(self, secrets: Iterable[Optional[str]]) -> bool:
+        """Recompiles the pattern, only if the secrets changed."""
+
+        values = tuple(
+            sorted({
+                secret for secret in secrets
+                if secret and len(secret) >= MIN_SECRET_LENGTH
+            },
+                   key=lambda secret: (-len(secret), secret)))
+        if values == self.secrets:
+            return False
+
+        self.secrets = values
+        self.pattern = (re.compile("|".join(map(re.escape, values)))
+                        if values else None)
+        return True
+
+    def redact(self, text: str) -> str:
+        if self.pattern is None or not text:
+            return text
+
+        return self.pattern.sub(REDACTED, text)
+
+
+class RedactFilter(logging.Filter):
+    """Logging filter redacting the formatted message and traceback."""
+
+    redactor: Redactor
+
+    def __init__(self, redactor: Redactor) -> None:
+        super().__init__()
+
+        self.redactor = redactor
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if self.redactor.pattern is None:
+            return True
+
+        record.msg = self.redactor.redact(record.getMessage())
+        record.args = ()
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(
+                record.exc_info)
+        if record.exc_text:
+            record.exc_text = self.redactor.redact(record.exc_text)
+
+        return True
@@ -1,10 +1,18 @@
 import asyncio
+import codecs
+import gzip
 import sys
-from typing import IO, Any, Optional, Sequence, Tuple, Union
+import tempfile
+from collections import deque
+from typing import IO, Any, Callable, Deque, Optional, Sequence, Tuple, Union
 
 ProcessData = Union[str, bytes]
 ProcessStream = Union[int, IO, None]
 
+# Output is handed over in whole lines, unless a line gets longer than this
+LINE_LIMIT = 4096
+READ_SIZE = 16384
+
 
 class FormatType:
     pass
@@ -89,3 +97,145 @@ async def run_command(*cmdline: ProcessData,
         proc = await _spawn_exec(cmdline, in_data, stdout, stderr, **kwargs)
 
     return await _get_proc_output(proc, in_data, timeout, text)
+
+
+class OutputBuffer:
+    """Text buffer keeping only the last `limit` characters in memory.
+
+    When `spill` is set everything written is also compressed to a temporary
+    gzip file, so the full output is available without holding it.
+    """
+
+    limit: int
+    written: int
+
+    def __init__(self, limit: int, *, spill: bool = False) -> None:
+        self.limit = limit
+        self.written = 0
+
+        self._chunks: Deque[str] = deque()
+        self._size = 0
+        self._spill_file: Optional[IO[bytes]] = None
+        self._gzip: Optional[gzip.GzipFile] = None
+        if spill:
+            self._spill_file = tempfile.TemporaryFile()
+            self._gzip = gzip.GzipFile(fileobj=self._spill_file, mode="wb")
+
+    @property
+    def truncated(self) -> int:
+        """Number of characters dropped from memory."""
+
+        return self.written - self._size
+
+    def write(self, text: str) -> int:
+        if not text:
+            return 0
+
+        self.written += len(text)
+        if self._gzip is not None:
+            self._gzip.write(text.encode())
+
+        self._chunks.append(text)
+        self._size += len(text)
+        while self._size - len(self._chunks[0]) >= self.limit:
+            self._size -= len(self._chunks.popleft())
+        if self._size > self.limit:
+            # Cut the oldest chunk so exactly `limit` characters remain
+            excess = self._size - self.limit
+            self._chunks[0] = self._chunks[0][excess:]
+            self._size -= excess
+
+        return len(text)
+
+    def flush(self) -> None:
+        pass
+
+    def tail(self, size: Optional[int] = None) -> str:
+        text = "".join(self._chunks)
+        return text if size is None else text[-size:]
+
+    def getvalue(self) -> str:
+        text = self.tail()
+        if self.truncated:
+            text = f"[{self.truncated} characters truncated]\n{text}"
+
+        return text
+
+    def spilled(self) -> Optional[IO[bytes]]:
+        """Finishes the gzip stream and returns its file, rewound."""
+
+        if self._gzip is None:
+            return None
+
+        if not self._gzip.closed:
+            self._gzip.close()
+        self._spill_file.seek(0)
+        return self._spill_file
+
+    def close(self) -> None:
+        if self._gzip is not None and not self._gzip.closed:
+            self._gzip.close()
+        if self._spill_file is not None:
+            self._spill_file.close()
+
+
+async def _read_lines(stream: asyncio.StreamReader,
+                      sink: Callable[[str], Any],
+                      transform: Optional[Callable[[str], str]] = None) -> None:
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    pending = ""
+    while True:
+        data = await stream.read(READ_SIZE)
+        pending += decoder.decode(data, final=not data)
+        if transform is not None:
+            pending = transform(pending)
+
+        end = pending.rfind("\n") + 1
+        if end == 0 and len(pending) >= LINE_LIMIT:
+            # Keep the last word whole, unless there's only one
+            end = max(pending.rfind(" "), pending.rfind("\t")) + 1
+            if end == 0:
+                end = len(pending)
+        if end:
+            sink(pending[:end])
+            pending = pending[end:]
+
+        if not data:
+            if pending:
+                sink(pending)
+            return
+
+
+async def stream_command(*cmdline: ProcessData,
+                         sink: Callable[[str], Any],
+                         transform: Optional[Callable[[str], str]] = None,
+                         timeout: Optional[int] = None,
+                         shell: bool = False,
+                         **kwargs: Any) -> Optional[int]:
+    """Runs the given command, passing its output to sink as it comes.
+
+    Stderr is merged into stdout and output is decoded in whole lines.
+    `transform` runs before the output is split, so it sees whole lines.
+    Returns the exit code, the process is killed on timeout.
+    """
+
+    if shell:
+        proc = await _spawn_shell(cmdline[0], None, asyncio.subprocess.PIPE,
+                                  asyncio.subprocess.STDOUT, **kwargs)
+    else:
+        proc = await _spawn_exec(cmdline, None, asyncio.subprocess.PIPE,
+                                 asyncio.subprocess.STDOUT, **kwargs)
+
+    async def communicate() -> Optional[int]:
+        await _read_lines(proc.stdout, sink, transform)
+        return await proc.wait()
+
+    try:
+        return await asyncio.wait_for(communicate(), timeout)
+    except BaseException:
+        try:
+            proc.kill()
+        except ProcessLookupError:
+            pass
+
+        raise
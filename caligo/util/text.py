@@ -1,8 +1,11 @@
+import random
 from typing import Any, Iterable, Mapping, Optional
 
 import emoji.unicode_codes
 
 ITEM_SEPARATOR = "\n    • "
+STRIKE_CHAR = "\u0336"
+CASE_FUNCS = (str.upper, str.lower)
 
 
 def join_list(items: Iterable[str]) -> str:
@@ -33,3 +36,22 @@ def join_map(
 
 def has_emoji(text: str) -> bool:
     return any(c in emoji.unicode_codes.UNICODE_EMOJI for c in text)
+
+
+def mock(text: str) -> str:
+    """Randomly flips the case of every character."""
+
+    funcs = random.choices(CASE_FUNCS, k=len(text))
+    return "".join(func(char) for func, char in zip(funcs, text))
+
+
+def strike(text: str) -> str:
+    """Puts a combining strike-through after every character."""
+
+    return STRIKE_CHAR.join(text) + STRIKE_CHAR
+
+
+def clap(text: str) -> str:
+    """Replaces the spaces of every line with clap emoji."""
+
+    return "\n".join("👏".join(line.split()) for line in text.split("\n"))
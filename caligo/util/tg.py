@@ -3,11 +3,12 @@ import io
 import uuid
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any, Optional, Tuple, Union
+from typing import Any, Awaitable, Callable, Optional, Tuple, TypeVar, Union
 
 import aiofile
 import bprint
 import pyrogram
+from pyrogram.errors import FloodWait
 
 from .. import command
 from .misc import human_readable_bytes as human
@@ -16,6 +17,10 @@ from .time import sec
 
 MESSAGE_CHAR_LIMIT = 4096
 TRUNCATION_SUFFIX = "... (truncated)"
+# Media up to this size is fetched without touching the disk
+MEMORY_DOWNLOAD_LIMIT = 10 * 1024 * 1024
+
+Result = TypeVar("Result")
 
 
 def mention_user(user: pyrogram.types.User) -> str:
@@ -60,6 +65,62 @@ def pretty_print_entity(entity) -> str:
                          skip_predicate=_bprint_skip_predicate)
 
 
+async def fetch_media(
+        client: pyrogram.Client,
+        msg: pyrogram.types.Message,
+        *,
+        limit: int = MEMORY_DOWNLOAD_LIMIT,
+        file_name: Optional[str] = None) -> Union[io.BytesIO, Path]:
+    """Returns media up to the limit in memory, larger media is saved to disk.
+
+    The in-memory path streams the chunks straight into the buffer with
+    Client.stream_media, older clients without it fall back to a
+    temporary file.
+    """
+
+    # media_utils pulls in the core package, import it late
+    from .media_utils import get_media
+
+    media = get_media(msg)
+    if media is None:
+        raise ValueError("Message doesn't contain any downloadable media")
+
+    size = getattr(media, "file_size", None)
+    if size is None or size > limit:
+        return Path(await client.download_media(msg, file_name=file_name))
+
+    buf = io.BytesIO()
+    if hasattr(client, "stream_media"):
+        async for chunk in client.stream_media(msg):
+            buf.write(chunk)
+    else:
+        path = Path(await client.download_media(msg))
+        try:
+            async with aiofile.async_open(path, "rb") as file:
+                buf.write(await file.read())
+        finally:
+            path.unlink()
+
+    buf.seek(0)
+    buf.name = getattr(media, "file_name", None) or "file"
+    return buf
+
+
+async def fetch_media_bytes(client: pyrogram.Client,
+                            msg: pyrogram.types.Message) -> bytes:
+    """Returns the full content of the given message media."""
+
+    media = await fetch_media(client, msg)
+    if isinstance(media, io.BytesIO):
+        return media.getvalue()
+
+    try:
+        async with aiofile.async_open(media, "rb") as file:
+            return await file.read()
+    finally:
+        media.unlink()
+
+
 async def download_file(ctx: command.Context,
                         msg: pyrogram.types.Message,
                         text: Optional[bool] = False) -> Path:
@@ -67,12 +128,8 @@ async def download_file(ctx: command.Context,
     downloadPath = ctx.bot.getConfig.downloadPath
 
     if text is True:
-        path = Path(await ctx.bot.client.download_media(msg))
-        async with aiofile.async_open(path, "r") as file:
-            text = await file.read()
-
-        path.unlink()
-        return text
+        content = await fetch_media_bytes(ctx.bot.client, msg)
+        return content.decode("utf-8", "replace")
 
     before = sec()
     last_update_time = None
@@ -178,3 +235,50 @@ async def get_text_input(
         return False, "__Reply to a message or provide text in command.__"
 
     return True, text
+
+
+async def flood_retry(func: Callable[..., Awaitable[Result]],
+                      *args: Any,
+                      retries: int = 3,
+                      **kwargs: Any) -> Result:
+    """Calls the given API method, sleeping through FloodWait errors."""
+
+    for attempt in range(retries + 1):
+        try:
+            return await func(*args, **kwargs)
+        except FloodWait as e:
+            if attempt == retries:
+                raise
+
+            await asyncio.sleep(e.x + 1)
+
+
+class StatusMessage:
+    """Command status that is edited at most once every `interval` seconds.
+
+    Updates arriving in between are dropped, so concurrent workers can
+    report freely without running into rate limits.
+    """
+
+    def __init__(self, ctx: command.Context, interval: float = 5) -> None:
+        self.ctx = ctx
+        self.interval = interval
+
+        self._last_update: Optional[datetime] = None
+        self._lock = asyncio.Lock()
+
+    async def update(self, text: str, force: bool = False) -> None:
+        now = datetime.now()
+        if not force and (self._lock.locked() or
+                          (self._last_update is not None and
+                           (now - self._last_update).total_seconds() <
+                           self.interval)):
+            return
+
+        async with self._lock:
+            self._last_update = now
+            try:
+                await self.ctx.respond(text)
+            except FloodWait:
+                # Never let a status edit fail the actual work
+                pass
@@ -0,0 +1,179 @@
+"""
+Lightweight async tracing of command invocations
+"""
+
+import time
+from collections import deque
+from contextlib import contextmanager
+from contextvars import ContextVar
+from types import SimpleNamespace
+from typing import Any, Deque, Dict, Iterator, List, Optional
+
+import aiohttp
+
+# Finished traces kept in memory
+TRACE_BUFFER = 50
+# Spans recorded in a single trace, the others are only counted
+MAX_TRACE_SPANS = 1000
+WATERFALL_WIDTH = 20
+
+
+class Span:
+    name: str
+    kind: str
+    start: float
+    end: Optional[float]
+    error: Optional[str]
+    children: List["Span"]
+
+    def __init__(self, name: str, kind: str, root: Optional["Span"]) -> None:
+        self.name = name
+        self.kind = kind
+        self.start = time.perf_counter()
+        self.end = None
+        self.error = None
+        self.children = []
+
+        self.root = root or self
+        # Only tracked on the root span
+        self.span_count = 1
+        self.dropped = 0
+
+    @property
+    def duration(self) -> float:
+        return (self.end or time.perf_counter()) - self.start
+
+    def finish(self, error: Optional[BaseException] = None) -> None:
+        self.end = time.perf_counter()
+        if error is not None:
+            self.error = type(error).__name__
+
+    def walk(self, depth: int = 0) -> Iterator[Any]:
+        yield depth, self
+        for child in self.children:
+            yield from child.walk(depth + 1)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "kind": self.kind,
+            "offset_ms": (self.start - self.root.start) * 1000,
+            "duration_ms": self.duration * 1000,
+            "error": self.error,
+            "children": [child.to_dict() for child in self.children],
+        }
+
+
+current_span: ContextVar[Optional[Span]] = ContextVar("current_span",
+                                                      default=None)
+traces: Deque[Span] = deque(maxlen=TRACE_BUFFER)
+
+
+def begin(name: str, kind: str = "") -> Optional[Span]:
+    """Starts a child of the current span, None when nothing is traced.
+
+    The span doesn't become the current one, see span() for that.
+    """
+
+    parent = current_span.get()
+    if parent is None:
+        return None
+
+    root = parent.root
+    if root.span_count >= MAX_TRACE_SPANS:
+        root.dropped += 1
+        return None
+
+    child = Span(name, kind, root)
+    root.span_count += 1
+    parent.children.append(child)
+    return child
+
+
+@contextmanager
+def span(name: str, kind: str = "") -> Iterator[Optional[Span]]:
+    child = begin(name, kind)
+    if child is None:
+        yield None
+        return
+
+    token = current_span.set(child)
+    try:
+        yield child
+    except BaseException as e:
+        child.finish(e)
+        raise
+    else:
+        child.finish()
+    finally:
+        current_span.reset(token)
+
+
+@contextmanager
+def trace(name: str, kind: str = "command") -> Iterator[Span]:
+    """Records a new trace, kept in the ring buffer once finished."""
+
+    root = Span(name, kind, None)
+    token = current_span.set(root)
+    try:
+        yield root
+    except BaseException as e:
+        root.finish(e)
+        raise
+    else:
+        root.finish()
+    finally:
+        current_span.reset(token)
+        traces.append(root)
+
+
+def waterfall(root: Span, max_lines: int = 60) -> str:
+    """Renders the spans of a trace as a text waterfall."""
+
+    total = max(root.duration, 1e-9)
+    lines = []
+    spans = list(root.walk())
+    for depth, item in spans[:max_lines]:
+        offset = item.start - root.start
+        begin_col = min(int(offset / total * WATERFALL_WIDTH),
+                        WATERFALL_WIDTH - 1)
+        length = max(1, round(item.duration / total * WATERFALL_WIDTH))
+        bar = (" " * begin_col + "█" * length)[:WATERFALL_WIDTH]
+        error = f" ⚠ {item.error}" if item.error else ""
+        lines.append(f"{bar:<{WATERFALL_WIDTH}} {offset * 1000:7.1f} "
+                     f"{item.duration * 1000:7.1f}ms {'  ' * depth}"
+                     f"{item.name}{error}")
+
+    hidden = len(spans) - max_lines + root.dropped
+    if hidden > 0:
+        lines.append(f"... {hidden} more spans")
+
+    return "\n".join(lines)
+
+
+async def _on_request_start(_: aiohttp.ClientSession, ctx: SimpleNamespace,
+                            params: aiohttp.TraceRequestStartParams) -> None:
+    ctx.span = begin(f"{params.method} {params.url.host}", "http")
+
+
+async def _on_request_end(_: aiohttp.ClientSession, ctx: SimpleNamespace,
+                          __: aiohttp.TraceRequestEndParams) -> None:
+    if getattr(ctx, "span", None) is not None:
+        ctx.span.finish()
+
+
+async def _on_request_exception(
+        _: aiohttp.ClientSession, ctx: SimpleNamespace,
+        params: aiohttp.TraceRequestExceptionParams) -> None:
+    if getattr(ctx, "span", None) is not None:
+        ctx.span.finish(params.exception)
+
+
+def http_trace_config() -> aiohttp.TraceConfig:
+    """aiohttp hooks recording a span for each request."""
+
+    config = aiohttp.TraceConfig()
+    config.on_request_start.append(_on_request_start)
+    config.on_request_end.append(_on_request_end)
+    config.on_request_exception.append(_on_request_exception)
+    return config
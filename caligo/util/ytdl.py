@@ -0,0 +1,175 @@
+"""
+youtube_dl downloads running in killable worker processes
+"""
+
+import asyncio
+import logging
+import multiprocessing
+from multiprocessing.connection import Connection
+from typing import Any, Callable, Dict, Optional, Set
+
+from .async_helpers import run_sync
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+ProgressFunc = Callable[[Dict[str, Any]], Any]
+
+# Only plain values of the progress dict are sent back to the bot
+PROGRESS_KEYS = (
+    "status",
+    "filename",
+    "downloaded_bytes",
+    "total_bytes",
+    "total_bytes_estimate",
+    "speed",
+    "eta",
+    "elapsed",
+)
+# Info of the downloaded media handed back when the job is done
+INFO_KEYS = (
+    "id",
+    "title",
+    "uploader",
+    "upload_date",
+    "duration",
+    "webpage_url",
+)
+
+
+class WorkerError(Exception):
+    """Raised when a download fails inside its worker process."""
+
+    kind: str
+
+    def __init__(self, kind: str, msg: str) -> None:
+        self.kind = kind
+        super().__init__(msg)
+
+
+def _download(url: str, options: Dict[str, Any], conn: Connection,
+              memory_limit: Optional[int]) -> None:
+    # Runs in the worker process, the limit also covers the ffmpeg merges
+    # youtube_dl starts from here. Post-processing runs from the bot with
+    # its own limit, see util.ffmpeg.
+    if memory_limit and resource is not None:
+        resource.setrlimit(resource.RLIMIT_AS, (memory_limit, memory_limit))
+
+    import youtube_dl
+
+    def hook(data: Dict[str, Any]) -> None:
+        conn.send(("progress", {key: data.get(key) for key in PROGRESS_KEYS}))
+
+    options = dict(options, progress_hooks=[hook])
+    try:
+        with youtube_dl.YoutubeDL(options) as ytdl:
+            info = ytdl.extract_info(url) or {}
+    except BaseException as e:  # skipcq: PYL-W0703
+        conn.send(("error", (type(e).__name__, str(e))))
+    else:
+        conn.send(("done", {key: info.get(key) for key in INFO_KEYS}))
+    finally:
+        conn.close()
+
+
+def _get_context() -> multiprocessing.context.BaseContext:
+    if "forkserver" in multiprocessing.get_all_start_methods():
+        ctx = multiprocessing.get_context("forkserver")
+        # Import once in the server instead of on every job
+        ctx.set_forkserver_preload(["youtube_dl", __name__])
+        return ctx
+
+    return multiprocessing.get_context("spawn")
+
+
+class DownloadPool:
+    """Fixed number of download slots, each job owning one worker process.
+
+    Progress events are streamed back through a pipe and handed to the
+    progress callback on the event loop. Cancelling the awaiting task kills
+    the worker right away.
+    """
+
+    size: int
+    memory_limit: Optional[int]
+
+    def __init__(self, size: int, memory_limit: Optional[int] = None) -> None:
+        self.size = size
+        self.memory_limit = memory_limit
+
+        self._ctx = _get_context()
+        self._slots = asyncio.Semaphore(size)
+        self._procs: Set[multiprocessing.process.BaseProcess] = set()
+
+    @property
+    def active(self) -> int:
+        return len(self._procs)
+
+    async def download(self,
+                       url: str,
+                       options: Dict[str, Any],
+                       progress: Optional[ProgressFunc] = None
+                      ) -> Dict[str, Any]:
+        async with self._slots:
+            recv, send = self._ctx.Pipe(duplex=False)
+            proc = self._ctx.Process(
+                target=_download,
+                args=(url, options, send, self.memory_limit),
+                daemon=True,
+            )
+            proc.start()
+            send.close()
+            self._procs.add(proc)
+
+            try:
+                return await self._communicate(recv, progress)
+            finally:
+                self._procs.discard(proc)
+                recv.close()
+                if proc.is_alive():
+                    proc.kill()
+                await run_sync(proc.join, 1)
+
+    @staticmethod
+    async def _communicate(recv: Connection,
+                           progress: Optional[ProgressFunc]) -> Dict[str, Any]:
+        loop = asyncio.get_event_loop()
+        readable = asyncio.Event()
+        # Woken up by the event loop when the worker sends something or exits
+        loop.add_reader(recv.fileno(), readable.set)
+        try:
+            while True:
+                readable.clear()
+                while recv.poll():
+                    try:
+                        event, data = recv.recv()
+                    except EOFError:
+                        raise WorkerError(
+                            "WorkerDied",
+                            "Worker exited unexpectedly (out of memory?)"
+                        ) from None
+
+                    if event == "progress":
+                        if progress is not None:
+                            try:
+                                progress(data)
+                            except Exception as e:  # skipcq: PYL-W0703
+                                logging.getLogger(__name__).warning(
+                                    "Error in progress callback", exc_info=e)
+                    elif event == "error":
+                        raise WorkerError(*data)
+                    elif event == "done":
+                        return data
+
+                await readable.wait()
+        finally:
+            loop.remove_reader(recv.fileno())
+
+    def close(self) -> None:
+        """Kill every running worker."""
+
+        for proc in list(self._procs):
+            if proc.is_alive():
+                proc.kill()
@@ -0,0 +1,30 @@
+import pytest
+
+pytest.importorskip("pyrogram")
+pytest.importorskip("ujson")
+
+from caligo.util.record import command_pattern, mask  # noqa: E402
+
+USER = command_pattern((".",))
+BOT = command_pattern(("!", "/"))
+
+
+def test_keeps_command() -> None:
+    assert mask(".help me", USER) == ".help xx"
+    assert mask("/start@bot now", BOT) == "/start@xxx xxx"
+
+
+@pytest.mark.parametrize("text, masked", [
+    ("@johnsmith", "@xxxxxxxxx"),
+    ("#secretproject", "#xxxxxxxxxxxxx"),
+    ("+15551234567", "+00000000000"),
+    ("@john hi", "@xxxx xx"),
+])
+def test_masks_other_leading_tokens(text: str, masked: str) -> None:
+    assert mask(text, USER) == masked
+    assert mask(text, BOT) == masked
+
+
+def test_other_prefix_is_masked() -> None:
+    assert mask("!ban 42", USER) == "!xxx 00"
+    assert mask(".help", BOT) == ".xxxx"